@@ -31,9 +31,7 @@ class SatoshiSignatureForge:
         if t == 0:
             return {"success": False, "reason": "t = 0"}
         # 计算点 s*G + t*P
-        point1 = self.sm2.point_multiply(s, self.sm2.G)
-        point2 = self.sm2.point_multiply(t, self.satoshi_public_key)
-        result_point = self.sm2.point_add(point1, point2)
+        result_point = self.sm2.double_scalar_multiply(s, t, self.satoshi_public_key)
         if result_point.is_infinity:
             return {"success": False, "reason": "结果点为无穷远点"}
         # 计算对应的消息哈希
@@ -135,7 +133,7 @@ class SatoshiSignatureForge:
         small_order_points = []
         # 检查一些小的倍数
         for i in range(2, 100):
-            test_point = self.sm2.point_multiply(i, self.sm2.G)
+            test_point = self.sm2.base_point_multiply(i)
             if test_point == self.sm2.O:
                 # 找到了阶为i的点
                 small_order_points.append(i)
@@ -166,7 +164,7 @@ class SatoshiSignatureForge:
         found_key = None
         for i in range(search_space):
             candidate_key = partial_key | i
-            candidate_public = self.sm2.point_multiply(candidate_key, self.sm2.G)
+            candidate_public = self.sm2.base_point_multiply(candidate_key)
             if candidate_public == self.satoshi_public_key:
                 found_key = candidate_key
                 break
@@ -191,9 +189,7 @@ class SatoshiSignatureForge:
         t = (r + s) % self.sm2.n
         if t == 0:
             return False
-        point1 = self.sm2.point_multiply(s, self.sm2.G)
-        point2 = self.sm2.point_multiply(t, public_key)
-        point = self.sm2.point_add(point1, point2)
+        point = self.sm2.double_scalar_multiply(s, t, public_key)
         if point.is_infinity:
             return False
         R = (e + point.x) % self.sm2.n
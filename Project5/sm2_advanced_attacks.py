@@ -8,92 +8,53 @@ import hashlib
 import random
 import math
 import time
-from sm2_base import SM2, Point
-from typing import List, Tuple, Dict
+from sm2_base import SM2, SM2Montgomery, Point
+from typing import Callable, List, Tuple, Dict, Optional
+from sm2_dlog import parallel_pollard_rho, baby_step_giant_step, pohlig_hellman, factorize, point_order, crt
+from sm2_toy_curves import ToyCurve, curve_order, quadratic_twist, random_point
+from sm2_lattice import hnp_recover_private_key, leaky_signatures, benchmark_hnp
+from sm2_timing import leakage_test
 class SM2AdvancedAttacks(SM2):
     """SM2高级攻击技术类"""
     def __init__(self):
         super().__init__()
         self.attack_logs = []
-    def pollards_rho_attack(self, target_point: Point, max_iterations: int = 10000) -> int:
-        """Pollard's rho算法攻击椭圆曲线离散对数"""
+    def pollards_rho_attack(self, target_point: Point, max_iterations: int = 10000,
+                            curve: Optional[SM2] = None, workers: int = 1) -> Optional[int]:
+        """Pollard's rho算法攻击椭圆曲线离散对数（r-加法游走 + 可区分点，多进程分片）
+        curve默认为本曲线；256位SM2曲线上不可行，演示时传入小规模测试曲线
+        """
         print("=== Pollard's Rho 离散对数攻击 ===")
-        # 初始化
-        x1 = random.randint(1, self.n - 1)
-        x2 = x1
-        P1 = self.point_multiply(x1, self.G)
-        P2 = P1
-        for i in range(max_iterations):
-            # 龟兔赛跑算法
-            # 乌龟走一步
-            if P1.x % 3 == 0:
-                P1 = self.point_add(P1, self.G)
-                x1 = (x1 + 1) % self.n
-            elif P1.x % 3 == 1:
-                P1 = self.point_add(P1, target_point)
-                # 这里需要已知target_point的离散对数，实际攻击中这是未知的
-            else:
-                P1 = self.point_double(P1)
-                x1 = (2 * x1) % self.n
-            # 兔子走两步
-            for _ in range(2):
-                if P2.x % 3 == 0:
-                    P2 = self.point_add(P2, self.G)
-                    x2 = (x2 + 1) % self.n
-                elif P2.x % 3 == 1:
-                    P2 = self.point_add(P2, target_point)
-                else:
-                    P2 = self.point_double(P2)
-                    x2 = (2 * x2) % self.n
-            # 检查是否碰撞
-            if P1 == P2:
-                print(f"在第 {i} 次迭代后找到碰撞")
-                # 在实际攻击中，这里需要解线性同余方程
-                return x1  # 简化返回
-        print("Pollard's rho攻击未在指定迭代次数内成功")
-        return None
-    def baby_step_giant_step(self, target_point: Point, max_bound: int = 1000) -> int:
-        """大步小步算法攻击"""
+        result = parallel_pollard_rho(curve or self, target_point, workers=workers, max_steps=max_iterations)
+        self.attack_logs.append(("pollards_rho", result))
+        if result["log"] is None:
+            print(f"Pollard's rho攻击未在 {result['steps']} 步内成功")
+            return None
+        print(f"在第 {result['steps']} 步后找到碰撞（{result['distinguished_points']} 个可区分点）")
+        print(f"速度: 总计 {result['steps_per_sec']:.0f} 步/秒，{len(result['workers'])} 个进程")
+        return result["log"]
+    def baby_step_giant_step(self, target_point: Point, max_bound: int = 1000, low: int = 0,
+                             curve: Optional[SM2] = None) -> Optional[int]:
+        """大步小步算法攻击：在区间 [low, low + max_bound) 内搜索私钥（适用于泄露高位的私钥）"""
         print("=== Baby-Step Giant-Step 攻击 ===")
-        m = int(math.sqrt(max_bound)) + 1
-        # Baby steps: 存储 j*G 对于 j = 0, 1, ..., m-1
-        baby_steps = {}
-        current_point = self.O
-        for j in range(m):
-            baby_steps[f"{current_point.x}_{current_point.y}"] = j
-            current_point = self.point_add(current_point, self.G)
-        # Giant steps: 计算 target_point - i*m*G 对于 i = 0, 1, ..., m-1
-        gamma = self.point_multiply(m, self.G)
-        y = target_point
-        for i in range(m):
-            key = f"{y.x}_{y.y}"
-            if key in baby_steps:
-                result = i * m + baby_steps[key]
-                print(f"找到离散对数: {result}")
-                return result
-            y = self.point_add(y, Point(gamma.x, self.p - gamma.y))  # y - gamma
-        print("Baby-Step Giant-Step攻击失败")
-        return None
-    def timing_attack_simulation(self, private_key: int) -> Dict:
-        """时序攻击模拟"""
+        result = baby_step_giant_step(curve or self, target_point, low, low + max_bound)
+        if result["log"] is None:
+            print("Baby-Step Giant-Step攻击失败")
+            return None
+        print(f"找到离散对数: {result['log']}（小步表 {result['table_bytes']} 字节，大步 {result['giant_steps']} 次）")
+        return result["log"]
+    def timing_attack_simulation(self, private_key: int, samples: int = 400, workers: int = 1) -> Dict:
+        """时序攻击：以私钥为固定标量，与随机标量交错计时本实现的点乘，Welch t检验判断是否泄露"""
         print("=== 时序攻击模拟 ===")
-        # 模拟不同私钥位导致的时序差异
-        timing_data = []
-        message = b"Timing attack test"
-        for _ in range(100):
-            start_time = time.time()
-            # 模拟签名过程（这里实际调用签名函数）
-            signature = self.sign(message, private_key)
-            end_time = time.time()
-            timing_data.append(end_time - start_time)
-        # 分析时序数据
-        avg_time = sum(timing_data) / len(timing_data)
-        variance = sum((t - avg_time) ** 2 for t in timing_data) / len(timing_data)
+        leakage = leakage_test(type(self), "point_multiply", samples, workers, batch=200, fixed_scalar=private_key)
+        print(f"{leakage['samples']}个样本：固定私钥均值 {leakage['fixed_mean_ns'] / 1e6:.3f}ms，"
+              f"随机标量均值 {leakage['random_mean_ns'] / 1e6:.3f}ms，最大|t| = {leakage['max_t']:.2f}")
         result = {
-            "average_time": avg_time,
-            "variance": variance,
-            "timing_data": timing_data[:10],  # 只保存前10个样本
-            "vulnerability": "时序差异可能泄露私钥信息"
+            "average_time": (leakage["fixed_mean_ns"] + leakage["random_mean_ns"]) / 2e9,
+            "max_t": leakage["max_t"],
+            "leakage_detected": leakage["leaky"],
+            "leakage_test": leakage,
+            "vulnerability": "点乘耗时依赖标量，时序差异可能泄露私钥信息"
         }
         self.attack_logs.append(("timing_attack", result))
         return result
@@ -122,168 +83,245 @@ class SM2AdvancedAttacks(SM2):
         }
         self.attack_logs.append(("fault_injection", result))
         return result
-    def power_analysis_simulation(self, private_key: int) -> Dict:
-        """功耗分析攻击模拟"""
+    def power_analysis_simulation(self, private_key: int, traces: int = 1000, bits: int = 16,
+                                  noise: float = 16.0) -> Dict:
+        """功耗分析：模拟蒙哥马利阶梯点乘（已知随机输入点、固定私钥）的汉明重量泄露轨迹，
+        用CPA与DPA逐位恢复私钥最高位之后的bits位（轨迹模拟与分析依赖NumPy）
+        """
         print("=== 功耗分析攻击模拟 ===")
-        # 模拟不同操作的功耗特征
-        power_traces = []
-        # 模拟点乘运算的功耗轨迹
-        for bit in format(private_key, 'b'):
-            if bit == '1':
-                # 模拟点加法操作的功耗
-                power_trace = [random.uniform(2.0, 3.0) for _ in range(100)]
-            else:
-                # 模拟点倍数操作的功耗
-                power_trace = [random.uniform(1.0, 2.0) for _ in range(100)]
-            power_traces.append(power_trace)
-        # 简单的差分功耗分析
-        avg_power_for_1 = []
-        avg_power_for_0 = []
-        for i, bit in enumerate(format(private_key, 'b')):
-            if bit == '1':
-                avg_power_for_1.extend(power_traces[i])
-            else:
-                avg_power_for_0.extend(power_traces[i])
+        from sm2_power import simulate_traces, recover_ladder_bits, top_bits
+        start_time = time.time()
+        trace_set = simulate_traces(SM2Montgomery, private_key, traces, samples=2 + 2 * bits, noise=noise)
+        simulated = time.time() - start_time
+        expected = top_bits(private_key, bits)
+        cpa_result = recover_ladder_bits(trace_set, bits, self, method="cpa")
+        dpa_result = recover_ladder_bits(trace_set, bits, self, method="dpa")
+        cpa_correct = sum(a == b for a, b in zip(cpa_result["bits"], expected))
+        dpa_correct = sum(a == b for a, b in zip(dpa_result["bits"], expected))
+        print(f"{traces}条轨迹（模拟 {simulated:.2f}s）：CPA恢复 {cpa_correct}/{bits} 位（{cpa_result['elapsed']:.2f}s），"
+              f"DPA恢复 {dpa_correct}/{bits} 位（{dpa_result['elapsed']:.2f}s）")
         result = {
-            "private_key_bits": format(private_key, 'b'),
-            "avg_power_1": sum(avg_power_for_1) / len(avg_power_for_1) if avg_power_for_1 else 0,
-            "avg_power_0": sum(avg_power_for_0) / len(avg_power_for_0) if avg_power_for_0 else 0,
-            "power_difference": abs(sum(avg_power_for_1) / len(avg_power_for_1) - sum(avg_power_for_0) / len(avg_power_for_0)) if avg_power_for_1 and avg_power_for_0 else 0,
-            "vulnerability": "功耗差异可能泄露私钥位信息"
+            "traces": traces,
+            "noise": noise,
+            "expected_bits": "".join(map(str, expected)),
+            "cpa_bits": "".join(map(str, cpa_result["bits"])),
+            "dpa_bits": "".join(map(str, dpa_result["bits"])),
+            "cpa_correct_bits": cpa_correct,
+            "dpa_correct_bits": dpa_correct,
+            "simulation_time": simulated,
+            "analysis_time": cpa_result["elapsed"] + dpa_result["elapsed"],
+            "vulnerability": "点乘中间值的功耗与私钥位相关，CPA可逐位恢复私钥"
         }
         self.attack_logs.append(("power_analysis", result))
         return result
-    def lattice_attack_simulation(self) -> Dict:
-        """格攻击模拟（针对偏移随机数）"""
-        print("=== 格攻击模拟 ===")
-        # 模拟使用偏移随机数的签名
-        private_key, public_key = self.generate_keypair()
-        signatures = []
-        messages = []
-        # 生成多个使用偏移随机数的签名
-        bias = 1 << 200  # 模拟随机数的偏移
-        for i in range(5):
-            message = f"Message {i}".encode()
-            messages.append(message)
-            # 模拟偏移的随机数k
-            k_biased = bias + random.randint(1, 1 << 50)
-            # 手动计算签名（使用偏移的k）
-            e = int.from_bytes(self.sm3_hash(message), 'big')
-            point = self.point_multiply(k_biased, self.G)
-            x1 = point.x
-            r = (e + x1) % self.n
-            if r == 0:
-                continue
-            d_inv = self.mod_inverse(1 + private_key, self.n)
-            s = (d_inv * (k_biased - r * private_key)) % self.n
-            if s == 0:
-                continue
-            signatures.append((r, s))
+    def lattice_attack_simulation(self, leaked_bits: int = 32, num_signatures: int = 12,
+                                  seed: Optional[int] = None) -> Dict:
+        """格攻击：随机数高leaked_bits位恒为0的签名构成隐藏数问题（HNP），LLL约化后恢复私钥，
+        并按泄露位数 × 签名数量统计成功率与耗时
+        """
+        print("=== 格攻击（HNP）===")
+        rng = random.Random(seed)
+        private_key = rng.randrange(1, self.n)
+        public_key = self.public_key_of(private_key)
+        # 偏移的随机数：k < 2^(256 - leaked_bits)
+        samples = leaky_signatures(self, private_key, num_signatures, leaked_bits, biased=True,
+                                   seed=rng.getrandbits(32))
+        recovery = hnp_recover_private_key(self, samples, self.n.bit_length() - leaked_bits, public_key)
+        print(f"{num_signatures}个签名、随机数高{leaked_bits}位为0：{recovery['dimension']}维格，"
+              f"{'成功恢复私钥' if recovery['private_key'] == private_key else '未能恢复私钥'}，"
+              f"耗时 {recovery['elapsed']:.3f}s")
+        sweep = benchmark_hnp((32, 16), {32: (8, 10), 16: (16, 20)}, trials=1, seed=rng.getrandbits(32))
+        for row in sweep:
+            print(f"  泄露{row['leaked_bits']}位 × {row['signatures']}个签名：成功率 {row['success_rate']:.0%}，"
+                  f"平均耗时 {row['avg_time']:.3f}s")
         result = {
-            "num_signatures": len(signatures),
-            "bias_detected": len(signatures) >= 3,  # 简化的检测
-            "vulnerability": "随机数偏移可能通过格攻击恢复私钥",
-            "recommendation": "使用真正的随机数生成器"
+            "num_signatures": num_signatures,
+            "leaked_bits": leaked_bits,
+            "dimension": recovery["dimension"],
+            "recovered_key": recovery["private_key"],
+            "attack_successful": recovery["private_key"] == private_key,
+            "elapsed": recovery["elapsed"],
+            "sweep": sweep,
+            "vulnerability": "随机数偏移或高位泄露时可通过格攻击恢复私钥",
+            "recommendation": "使用真正的随机数生成器，随机数在[1, n-1]内均匀分布"
         }
         self.attack_logs.append(("lattice_attack", result))
         return result
-    def invalid_curve_attack(self) -> Dict:
-        """无效曲线攻击模拟"""
+    def invalid_curve_attack(self, victim: Optional[ToyCurve] = None, smooth_bound: int = 1 << 20,
+                             seed: Optional[int] = None) -> Dict:
+        """无效曲线攻击：向不验证输入点的ECDH预言机发送弱曲线 y^2 = x^3 + ax + b' 上的小阶点，
+        每次查询用Pohlig-Hellman得到 d mod ord(P)，CRT合并后恢复私钥
+        点运算公式与b无关，预言机会在弱曲线上计算 d*P；256位曲线上无法计算弱曲线的阶，默认在44位测试曲线上演示
+        """
         print("=== 无效曲线攻击模拟 ===")
-        # 构造一个无效的椭圆曲线点
-        # 这个点不在原始曲线上，但在一个相关的弱曲线上
-        # 找一个不在曲线上的点
-        invalid_point = None
-        for x in range(1, 100):
-            y_squared = (pow(x, 3, self.p) + self.a * x + self.b) % self.p
-            # 检查是否为平方剩余
-            if pow(y_squared, (self.p - 1) // 2, self.p) != 1:
-                # 找到一个不在曲线上的x坐标
-                # 构造一个"有效"的y坐标（实际上在错误的曲线上）
-                invalid_y = random.randint(1, self.p - 1)
-                invalid_point = Point(x, invalid_y)
-                break
-        if invalid_point:
-            # 尝试使用无效点进行运算
-            try:
-                result_point = self.point_multiply(123, invalid_point)
-                attack_successful = True
-            except:
-                attack_successful = False
-        else:
-            attack_successful = False
+        start_time = time.time()
+        rng = random.Random(seed)
+        victim = victim or ToyCurve.from_bits(44)
+        secret = rng.randrange(1, victim.n)
+        public_key = victim.base_point_multiply(secret)
+        def oracle(P: Point) -> Point:
+            # 未验证输入点的ECDH：直接计算 d*P
+            return victim.point_multiply(secret, P)
+        residues, moduli = [], []
+        queries = 0
+        rejected_by_validation = True
+        while math.prod(moduli) < victim.n:
+            weak = ToyCurve(victim.p, victim.a, rng.randrange(1, victim.p), 1, 0, 0)
+            if weak.b == victim.b:
+                continue
+            order = curve_order(weak, rng.getrandbits(32))
+            # 只使用尚未覆盖的小素数幂，保证各模数两两互素
+            useful = {q: e for q, e in factorize(order).items()
+                      if q <= smooth_bound and all(m % q for m in moduli)}
+            subgroup = math.prod(q ** e for q, e in useful.items())
+            if subgroup == 1:
+                continue
+            P = weak.point_multiply(order // subgroup, random_point(weak, rng))
+            if P.is_infinity:
+                continue
+            point_ord = point_order(weak, P, subgroup, useful)
+            rejected_by_validation &= not victim.is_on_curve(P)
+            queries += 1
+            solved = pohlig_hellman(weak, oracle(P), base=P, order=point_ord, factors=factorize(point_ord))
+            residues.append(solved["residue"])
+            moduli.append(solved["modulus"])
+            print(f"  查询{queries}: b'={weak.b:#x}, 点阶={point_ord}, d mod {point_ord} = {solved['residue']}")
+        recovered, modulus = crt(residues, moduli)
+        recovered %= victim.n
+        attack_successful = victim.base_point_multiply(recovered) == public_key
+        print(f"恢复私钥: {recovered}, 成功: {attack_successful}, 共 {queries} 次查询")
         result = {
-            "invalid_point_found": invalid_point is not None,
+            "curve_bits": victim.n.bit_length(),
+            "queries": queries,
+            "recovered_private_key": recovered,
             "attack_successful": attack_successful,
+            "rejected_by_validation": rejected_by_validation,
+            "time": time.time() - start_time,
             "vulnerability": "无效曲线攻击可能绕过点验证",
             "recommendation": "始终验证点是否在正确的曲线上"
         }
         self.attack_logs.append(("invalid_curve", result))
         return result
-    def twist_attack_simulation(self) -> Dict:
-        """扭曲攻击模拟"""
+    def twist_attack_simulation(self, victim: Optional[ToyCurve] = None, seed: Optional[int] = None) -> Dict:
+        """扭曲攻击：只用x坐标的ECDH预言机不检查x是否在曲线上，扭曲上的x会在扭曲群中计算，
+        扭曲群阶光滑时用Pohlig-Hellman求出 ±d mod ord(P')，再用公钥筛选候选值
+        默认使用扭曲群阶为 5*11*29*449*14171419 的44位测试曲线
+        """
         print("=== 扭曲攻击模拟 ===")
-        # 构造椭圆曲线的二次扭曲
-        # 对于曲线 y^2 = x^3 + ax + b，其扭曲为 dy^2 = x^3 + ax + b
-        # 这里我们简化处理
-        d = 2  # 非平方剩余
-        twist_points = []
-        # 寻找扭曲曲线上的点
-        for x in range(1, 50):
-            # 在扭曲曲线上：d * y^2 = x^3 + a*x + b
-            rhs = (pow(x, 3, self.p) + self.a * x + self.b) % self.p
-            # 检查 rhs/d 是否为平方剩余
-            rhs_d = (rhs * self.mod_inverse(d, self.p)) % self.p
-            if pow(rhs_d, (self.p - 1) // 2, self.p) == 1:
-                y = pow(rhs_d, (self.p + 1) // 4, self.p)
-                twist_point = Point(x, y)
-                twist_points.append(twist_point)
-                if len(twist_points) >= 5:
-                    break
+        start_time = time.time()
+        rng = random.Random(seed)
+        victim = victim or ToyCurve.from_bits(44)
+        twist, d = quadratic_twist(victim, rng.getrandbits(32))
+        d_inv = pow(d, -1, victim.p)
+        secret = rng.randrange(1, victim.n)
+        public_key = victim.base_point_multiply(secret)
+        def oracle(x: int) -> Optional[int]:
+            # x-only阶梯：x在原曲线上则在原曲线计算，否则等价于在扭曲上计算
+            P = victim.lift_x(x, 0)
+            if P is not None:
+                return victim.point_multiply(secret, P).x
+            R = twist.point_multiply(secret, twist.lift_x(x * d % victim.p, 0))
+            return None if R.is_infinity else R.x * d_inv % victim.p
+        base = twist.G
+        order = point_order(twist, base, twist.n)
+        x_query = base.x * d_inv % victim.p
+        x_result = oracle(x_query)
+        solved = pohlig_hellman(twist, twist.lift_x(x_result * d % victim.p, 0), base=base, order=order)
+        # x坐标只确定 ±R，d ≡ ±log (mod order)
+        candidates = []
+        for residue in {solved["log"], (order - solved["log"]) % order}:
+            candidates.extend(range(residue, victim.n, order))
+        recovered = next((c for c in candidates if victim.base_point_multiply(c) == public_key), None)
+        attack_successful = recovered == secret
+        print(f"扭曲群阶分解: {factorize(twist.n)}, 候选 {len(candidates)} 个, 恢复成功: {attack_successful}")
         result = {
-            "twist_points_found": len(twist_points),
-            "sample_twist_points": [(p.x, p.y) for p in twist_points[:3]],
+            "twist_order": twist.n,
+            "twist_order_factors": factorize(twist.n),
+            "query_on_curve": victim.lift_x(x_query, 0) is not None,
+            "candidates": len(candidates),
+            "recovered_private_key": recovered,
+            "attack_successful": attack_successful,
+            "time": time.time() - start_time,
             "vulnerability": "扭曲攻击可能利用扭曲曲线的弱点",
             "recommendation": "验证输入点确实在目标曲线上"
         }
         self.attack_logs.append(("twist_attack", result))
         return result
-    def small_subgroup_attack(self) -> Dict:
-        """小子群攻击模拟"""
+    def small_subgroup_attack(self, weak_curve: Optional[ToyCurve] = None, smooth_bound: int = 1 << 24,
+                              seed: Optional[int] = None) -> Dict:
+        """小子群攻击：群阶只含小素因子的弱曲线上，Pohlig-Hellman在各素数幂子群内分别求对数后CRT合并
+        未指定弱曲线时在44位测试曲线的素域上搜索一条群阶为smooth_bound-光滑的曲线
+        """
         print("=== 小子群攻击模拟 ===")
-        # 寻找椭圆曲线的小子群
-        small_order_elements = []
-        # 检查小阶元素
-        for order in [2, 3, 4, 5, 6, 7, 8]:
-            # 尝试找到阶为order的点
-            for attempt in range(100):
-                x = random.randint(1, self.p - 1)
-                y_squared = (pow(x, 3, self.p) + self.a * x + self.b) % self.p
-                if pow(y_squared, (self.p - 1) // 2, self.p) == 1:
-                    y = pow(y_squared, (self.p + 1) // 4, self.p)
-                    test_point = Point(x, y)
-                    # 检查点的阶
-                    current = test_point
-                    for i in range(1, order + 1):
-                        if current == self.O:
-                            if i == order:
-                                small_order_elements.append((test_point, order))
-                            break
-                        current = self.point_add(current, test_point)
-                    if len(small_order_elements) >= 3:
-                        break
-                if len(small_order_elements) >= 3:
+        start_time = time.time()
+        rng = random.Random(seed)
+        if weak_curve is None:
+            field_curve = ToyCurve.from_bits(44)
+            while True:
+                weak_curve = ToyCurve(field_curve.p, field_curve.a, rng.randrange(1, field_curve.p), 1, 0, 0)
+                weak_curve.n = curve_order(weak_curve, rng.getrandbits(32))
+                if max(factorize(weak_curve.n)) <= smooth_bound:
                     break
+        group_order = weak_curve.n
+        generator = random_point(weak_curve, rng)
+        order = point_order(weak_curve, generator, group_order)
+        secret = rng.randrange(1, order)
+        public_key = weak_curve.point_multiply(secret, generator)
+        solved = pohlig_hellman(weak_curve, public_key, base=generator, order=order)
+        attack_successful = solved["log"] == secret
+        for subgroup in solved["subgroups"]:
+            print(f"  子群 {subgroup['prime']}^{subgroup['exponent']}: d mod = {subgroup['residue']}"
+                  f" ({subgroup['elapsed'] * 1000:.1f}ms)")
+        print(f"恢复私钥: {solved['log']}, 成功: {attack_successful}")
         result = {
-            "small_order_elements": len(small_order_elements),
-            "elements_info": [(f"Point({e[0].x}, {e[0].y})", e[1]) for e in small_order_elements],
+            "group_order": group_order,
+            "order_factors": factorize(group_order),
+            "generator_order": order,
+            "recovered_private_key": solved["log"],
+            "attack_successful": attack_successful,
+            "time": time.time() - start_time,
             "vulnerability": "小子群攻击可能泄露私钥的部分信息",
             "recommendation": "使用安全的曲线参数避免小子群"
         }
         self.attack_logs.append(("small_subgroup", result))
         return result
+    def pollards_rho_demo(self) -> Dict:
+        """在阶为32位素数的测试曲线上用Pollard's Rho求解离散对数"""
+        toy_curve = ToyCurve.from_bits(32)
+        small_private_key = random.randint(1, toy_curve.n - 1)
+        small_public_key = toy_curve.base_point_multiply(small_private_key)
+        recovered_key = self.pollards_rho_attack(small_public_key, 1 << 22, curve=toy_curve)
+        return {
+            "target_private_key": small_private_key,
+            "recovered_key": recovered_key,
+            "attack_successful": recovered_key == small_private_key if recovered_key else False
+        }
+    def baby_step_giant_step_demo(self) -> Dict:
+        """私钥高位泄露、剩余32位未知时用BSGS恢复私钥"""
+        small_private_key2 = random.randint(1, self.n - 1)
+        small_public_key2 = self.base_point_multiply(small_private_key2)
+        leaked_low = small_private_key2 >> 32 << 32
+        recovered_key2 = self.baby_step_giant_step(small_public_key2, 1 << 32, low=leaked_low)
+        return {
+            "target_private_key": small_private_key2,
+            "recovered_key": recovered_key2,
+            "attack_successful": recovered_key2 == small_private_key2 if recovered_key2 else False
+        }
+    def attack_scenarios(self, private_key: int) -> Dict[str, Tuple[str, Callable[[], Dict]]]:
+        """全部高级攻击场景：名称 -> (标题, 无参调用)，需要密钥的场景共用private_key"""
+        return {
+            "timing_attack": ("时序攻击模拟", lambda: self.timing_attack_simulation(private_key)),
+            "fault_injection": ("故障注入攻击模拟", lambda: self.fault_injection_simulation(b"Test message", private_key)),
+            "power_analysis": ("功耗分析攻击模拟", lambda: self.power_analysis_simulation(private_key)),
+            "lattice_attack": ("格攻击模拟", self.lattice_attack_simulation),
+            "invalid_curve": ("无效曲线攻击模拟", self.invalid_curve_attack),
+            "twist_attack": ("扭曲攻击模拟", self.twist_attack_simulation),
+            "small_subgroup": ("小子群攻击模拟", self.small_subgroup_attack),
+            "pollards_rho": ("Pollard's Rho攻击（32位测试曲线）", self.pollards_rho_demo),
+            "baby_step_giant_step": ("Baby-Step Giant-Step攻击（泄露高位，剩余32位未知）", self.baby_step_giant_step_demo),
+        }
     def run_all_advanced_attacks(self) -> Dict:
-        """运行所有高级攻击"""
+        """运行所有高级攻击（串行；并行运行见 sm2_suite.run_suite）"""
         print("🔥 开始SM2高级攻击技术演示")
         print("⚠️  这些攻击仅用于安全研究和教育目的！")
         print("=" * 60)
@@ -291,51 +329,13 @@ class SM2AdvancedAttacks(SM2):
         # 生成测试密钥
         test_private_key, test_public_key = self.generate_keypair()
         print(f"测试私钥: {test_private_key}")
-        print(f"测试公钥: ({test_public_key.x}, {test_public_key.y})")
+        print(f"测试公钥: {self.encode_point(test_public_key).hex()}")
         print()
         # 运行各种攻击
-        print("1. 时序攻击模拟...")
-        results["timing_attack"] = self.timing_attack_simulation(test_private_key)
-        print()
-        print("2. 故障注入攻击模拟...")
-        results["fault_injection"] = self.fault_injection_simulation(b"Test message", test_private_key)
-        print()
-        print("3. 功耗分析攻击模拟...")
-        results["power_analysis"] = self.power_analysis_simulation(test_private_key)
-        print()
-        print("4. 格攻击模拟...")
-        results["lattice_attack"] = self.lattice_attack_simulation()
-        print()
-        print("5. 无效曲线攻击模拟...")
-        results["invalid_curve"] = self.invalid_curve_attack()
-        print()
-        print("6. 扭曲攻击模拟...")
-        results["twist_attack"] = self.twist_attack_simulation()
-        print()
-        print("7. 小子群攻击模拟...")
-        results["small_subgroup"] = self.small_subgroup_attack()
-        print()
-        print("8. Pollard's Rho攻击（小范围测试）...")
-        # 为了演示，我们使用一个小的私钥
-        small_private_key = random.randint(1, 10000)
-        small_public_key = self.point_multiply(small_private_key, self.G)
-        recovered_key = self.pollards_rho_attack(small_public_key, 1000)
-        results["pollards_rho"] = {
-            "target_private_key": small_private_key,
-            "recovered_key": recovered_key,
-            "attack_successful": recovered_key == small_private_key if recovered_key else False
-        }
-        print()
-        print("9. Baby-Step Giant-Step攻击（小范围测试）...")
-        small_private_key2 = random.randint(1, 1000)
-        small_public_key2 = self.point_multiply(small_private_key2, self.G)
-        recovered_key2 = self.baby_step_giant_step(small_public_key2, 1000)
-        results["baby_step_giant_step"] = {
-            "target_private_key": small_private_key2,
-            "recovered_key": recovered_key2,
-            "attack_successful": recovered_key2 == small_private_key2 if recovered_key2 else False
-        }
-        print()
+        for i, (name, (title, attack)) in enumerate(self.attack_scenarios(test_private_key).items(), 1):
+            print(f"{i}. {title}...")
+            results[name] = attack()
+            print()
         print("=" * 60)
         print("所有高级攻击演示完成")
         return results
@@ -370,8 +370,8 @@ class SM2AdvancedAttacks(SM2):
 - **可行性**: 低，需要巨大的存储空间
 - **防护**: 使用足够大的椭圆曲线参数
 #### 2.3 格攻击
-- **原理**: 利用格基约化算法攻击偏移的随机数
-- **可行性**: 高，当随机数生成存在偏移时
+- **原理**: 随机数偏移或高位泄露时签名构成隐藏数问题，用LLL/BKZ格基约化求解
+- **可行性**: 高，每个签名泄露32位时约10个签名即可恢复私钥，泄露8位时约40个签名
 - **防护**: 使用真正的随机数生成器
 ### 3. 实现攻击
 #### 3.1 无效曲线攻击
@@ -4,23 +4,110 @@ SM2椭圆曲线公钥密码算法的Python实现
 作者: ESFJ-MoZhu
 日期: 2025-07-20
 """
-import hashlib
+import hmac
 import random
-from typing import Tuple, Optional
-class Point:
-    """椭圆曲线上的点"""
-    def __init__(self, x: Optional[int], y: Optional[int]):
-        self.x = x
-        self.y = y
-        self.is_infinity = (x is None and y is None)
-    def __eq__(self, other):
-        if self.is_infinity and other.is_infinity:
-            return True
-        return self.x == other.x and self.y == other.y
+import secrets
+import threading
+from collections import OrderedDict, namedtuple
+from typing import Tuple, Optional, Dict, List, Callable, Iterator
+from sm2_field import SM2Field, CountingSM2Field
+from sm3 import SM3
+# GM/T 0003 默认用户身份标识
+DEFAULT_USER_ID = b"1234567812345678"
+# Z_A 杂凑状态缓存与（每个实例的）私钥对应公钥缓存的容量
+ZA_CACHE_SIZE = 1024
+PUBLIC_KEY_CACHE_SIZE = 256
+_za_states: OrderedDict = OrderedDict()
+_digest_cache_lock = threading.Lock()
+# 固定基点表的窗口宽度：表中第i行存放 j * 2^(w*i) * G (j = 1..2^w-1)
+FIXED_BASE_WINDOW = 6
+# 进程级共享的固定基点表，按曲线参数索引，首次使用时才构建
+_fixed_base_tables: Dict[tuple, List[list]] = {}
+_fixed_base_lock = threading.Lock()
+# 公钥预计算表的窗口宽度（每张表 ceil(256/4) * 15 个点）
+PUBLIC_KEY_TABLE_WINDOW = 4
+class PublicKeyTableCache:
+    """按公钥坐标索引的有界LRU预计算表缓存
+    尚未建表的公钥只在独立的有界门卫（doorkeeper）中计数，一次性或攻击者选择的点再多也只会挤掉门卫中的计数，
+    不会淘汰热点验证公钥已构建的表
+    """
+    def __init__(self, capacity: int = 64, min_uses: int = 2, doorkeeper_capacity: int = 1024):
+        # min_uses: 公钥被使用多少次后才构建预计算表，避免为一次性公钥付出建表开销
+        self.capacity = capacity
+        self.min_uses = min_uses
+        self.doorkeeper_capacity = doorkeeper_capacity
+        self._entries: OrderedDict = OrderedDict()
+        self._doorkeeper: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # 门卫放行后实际构建的表数（累计，含已被淘汰的表）
+        self.builds = 0
+    def get(self, key: tuple, builder: Callable[[], list]) -> Optional[list]:
+        """查找预计算表；未命中时在门卫中记录使用次数，达到min_uses后调用builder建表"""
+        with self._lock:
+            table = self._entries.get(key)
+            if table is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return table
+            self.misses += 1
+            uses = self._doorkeeper.pop(key, 0) + 1
+            if uses < self.min_uses:
+                self._doorkeeper[key] = uses
+                while len(self._doorkeeper) > self.doorkeeper_capacity:
+                    self._doorkeeper.popitem(last=False)
+                return None
+        table = builder()
+        with self._lock:
+            self._entries[key] = table
+            self.builds += 1
+            self._evict()
+        return table
+    def _evict(self):
+        """超出容量时淘汰最久未使用的表"""
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    def resize(self, capacity: int):
+        """调整缓存容量"""
+        with self._lock:
+            self.capacity = capacity
+            self._evict()
+    def clear(self):
+        """清空缓存、门卫和计数"""
+        with self._lock:
+            self._entries.clear()
+            self._doorkeeper.clear()
+            self.hits = self.misses = self.evictions = self.builds = 0
+    def stats(self) -> Dict[str, int]:
+        """缓存统计信息：entries为当前缓存的表数，tables为门卫放行后累计构建的表数"""
+        with self._lock:
+            return {"capacity": self.capacity, "entries": len(self._entries), "tables": self.builds,
+                    "doorkeeper": len(self._doorkeeper), "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions}
+# 进程级共享的公钥预计算表缓存
+PUBLIC_KEY_TABLE_CACHE = PublicKeyTableCache()
+class Point(namedtuple("_PointCoordinates", "x y")):
+    """椭圆曲线上的点（基于元组的不可变类型，可哈希，可直接作为字典键）"""
+    __slots__ = ()
+    is_infinity = False
+    def __new__(cls, x: Optional[int], y: Optional[int]):
+        if x is None and y is None:
+            return INFINITY
+        return tuple.__new__(cls, (x, y))
     def __str__(self):
         if self.is_infinity:
             return "O(无穷远点)"
         return f"({self.x}, {self.y})"
+    def __repr__(self):
+        return f"Point({self.x}, {self.y})"
+class _Infinity(Point):
+    """无穷远点，全局唯一"""
+    __slots__ = ()
+    is_infinity = True
+INFINITY = tuple.__new__(_Infinity, (None, None))
 class SM2:
     """SM2椭圆曲线公钥密码算法实现"""
     def __init__(self):
@@ -35,18 +122,37 @@ class SM2:
         self.G = Point(self.gx, self.gy)
         # 无穷远点
         self.O = Point(None, None)
+        # 素域运算层
+        self.field = SM2Field(self.p)
+        # 公钥预计算表缓存，设为None可关闭
+        self.public_key_cache: Optional[PublicKeyTableCache] = PUBLIC_KEY_TABLE_CACHE
+        # 私钥 -> 公钥缓存，只属于本实例，可用clear_private_key_cache清空
+        self._public_keys: OrderedDict = OrderedDict()
+        self._public_keys_lock = threading.Lock()
+    def set_operation_counting(self, enabled: bool):
+        """开启或关闭素域运算计数
+        热点路径的雅可比坐标公式直接内联 % p（经由素域运算层的方法调用会使点乘慢约一半）；开启计数时本实例改用
+        _field_* 中经由素域运算层的同一组公式，使签名、验证、密钥生成的计数完整（批量公钥计算与共Z阶梯的内联公式不计入）。
+        两组公式须同步修改，test_counting_formulas_match 在随机输入上逐项比对二者的结果
+        """
+        self.field = CountingSM2Field(self.p) if enabled else SM2Field(self.p)
+        for name in ("_jacobian_double", "_jacobian_add_affine", "_jacobian_add", "_from_jacobian", "_batch_to_affine"):
+            if enabled:
+                setattr(self, name, getattr(self, "_field" + name))
+            else:
+                self.__dict__.pop(name, None)
+    def operation_counts(self) -> Dict[str, int]:
+        """返回素域运算计数（未开启计数时为空）"""
+        return dict(getattr(self.field, "counts", {}))
     def mod_inverse(self, a: int, m: int) -> int:
         """计算模逆元素"""
-        if a < 0:
-            a = (a % m + m) % m
-        # 扩展欧几里得算法
-        old_r, r = a, m
-        old_s, s = 1, 0
-        while r != 0:
-            quotient = old_r // r
-            old_r, r = r, old_r - quotient * r
-            old_s, s = s, old_s - quotient * s
-        return old_s % m if old_r == 1 else None
+        if m == self.p:
+            return self.field.inv(a % m)
+        # pow(a, -1, m) 由C实现，比Python层的扩展欧几里得算法快
+        try:
+            return pow(a, -1, m)
+        except ValueError:
+            return None
     def point_add(self, P: Point, Q: Point) -> Point:
         """椭圆曲线上的点加法运算"""
         if P.is_infinity:
@@ -61,18 +167,314 @@ class SM2:
                 # P + (-P) = O
                 return self.O
         # 不同点相加
-        s = ((Q.y - P.y) * self.mod_inverse(Q.x - P.x, self.p)) % self.p
-        x3 = (s * s - P.x - Q.x) % self.p
-        y3 = (s * (P.x - x3) - P.y) % self.p
+        F = self.field
+        s = F.mul(F.sub(Q.y, P.y), F.inv(F.sub(Q.x, P.x)))
+        x3 = F.sub(F.sub(F.sqr(s), P.x), Q.x)
+        y3 = F.sub(F.mul(s, F.sub(P.x, x3)), P.y)
         return Point(x3, y3)
     def point_double(self, P: Point) -> Point:
         """椭圆曲线上的点倍数运算"""
         if P.is_infinity:
             return P
-        s = ((3 * P.x * P.x + self.a) * self.mod_inverse(2 * P.y, self.p)) % self.p
-        x3 = (s * s - 2 * P.x) % self.p
-        y3 = (s * (P.x - x3) - P.y) % self.p
+        if P.y == 0:
+            return self.O
+        F = self.field
+        x2 = F.sqr(P.x)
+        s = F.mul(F.add(F.add(F.add(x2, x2), x2), self.a), F.inv(F.add(P.y, P.y)))
+        x3 = F.sub(F.sqr(s), F.add(P.x, P.x))
+        y3 = F.sub(F.mul(s, F.sub(P.x, x3)), P.y)
         return Point(x3, y3)
+    def _jacobian_double(self, X1: int, Y1: int, Z1: int) -> Tuple[int, int, int]:
+        """雅可比坐标下的倍点运算，Z=0表示无穷远点"""
+        if Z1 == 0 or Y1 == 0:
+            return 1, 1, 0
+        p = self.p
+        YY = Y1 * Y1 % p
+        S = 4 * X1 * YY % p
+        ZZ = Z1 * Z1 % p
+        if self.a == p - 3:
+            # a = -3 时 M = 3(X - Z^2)(X + Z^2)
+            M = 3 * (X1 - ZZ) * (X1 + ZZ) % p
+        else:
+            M = (3 * X1 * X1 + self.a * ZZ * ZZ) % p
+        X3 = (M * M - 2 * S) % p
+        Y3 = (M * (S - X3) - 8 * YY * YY) % p
+        Z3 = 2 * Y1 * Z1 % p
+        return X3, Y3, Z3
+    def _jacobian_add_affine(self, X1: int, Y1: int, Z1: int, x2: int, y2: int) -> Tuple[int, int, int]:
+        """雅可比坐标点与仿射坐标点的混合加法"""
+        if Z1 == 0:
+            return x2, y2, 1
+        p = self.p
+        Z1Z1 = Z1 * Z1 % p
+        H = (x2 * Z1Z1 - X1) % p
+        r = (y2 * Z1 * Z1Z1 - Y1) % p
+        if H == 0:
+            if r == 0:
+                return self._jacobian_double(x2, y2, 1)
+            return 1, 1, 0
+        HH = H * H % p
+        HHH = H * HH % p
+        V = X1 * HH % p
+        X3 = (r * r - HHH - 2 * V) % p
+        Y3 = (r * (V - X3) - Y1 * HHH) % p
+        Z3 = Z1 * H % p
+        return X3, Y3, Z3
+    def _jacobian_add(self, X1: int, Y1: int, Z1: int, X2: int, Y2: int, Z2: int) -> Tuple[int, int, int]:
+        """雅可比坐标下的一般点加"""
+        if Z1 == 0:
+            return X2, Y2, Z2
+        if Z2 == 0:
+            return X1, Y1, Z1
+        p = self.p
+        Z1Z1 = Z1 * Z1 % p
+        Z2Z2 = Z2 * Z2 % p
+        U1 = X1 * Z2Z2 % p
+        S1 = Y1 * Z2 * Z2Z2 % p
+        H = (X2 * Z1Z1 - U1) % p
+        r = (Y2 * Z1 * Z1Z1 - S1) % p
+        if H == 0:
+            if r == 0:
+                return self._jacobian_double(X1, Y1, Z1)
+            return 1, 1, 0
+        HH = H * H % p
+        HHH = H * HH % p
+        V = U1 * HH % p
+        X3 = (r * r - HHH - 2 * V) % p
+        Y3 = (r * (V - X3) - S1 * HHH) % p
+        Z3 = Z1 * Z2 * H % p
+        return X3, Y3, Z3
+    def _from_jacobian(self, X: int, Y: int, Z: int) -> Point:
+        """雅可比坐标转换为仿射坐标（一次求逆）"""
+        if Z == 0:
+            return self.O
+        z_inv = self.field.inv(Z)
+        z_inv2 = z_inv * z_inv % self.p
+        return Point(X * z_inv2 % self.p, Y * z_inv2 * z_inv % self.p)
+    def _batch_to_affine(self, points: List[Tuple[int, int, int]]) -> List[Optional[Tuple[int, int]]]:
+        """批量将雅可比坐标点转换为仿射坐标，共用一次求逆，无穷远点返回None"""
+        p = self.p
+        z_invs = self.field.batch_inv([Z for _, _, Z in points])
+        result = []
+        for (X, Y, _), z_inv in zip(points, z_invs):
+            if z_inv is None:
+                result.append(None)
+                continue
+            z_inv2 = z_inv * z_inv % p
+            result.append((X * z_inv2 % p, Y * z_inv2 * z_inv % p))
+        return result
+    def _field_jacobian_double(self, X1: int, Y1: int, Z1: int) -> Tuple[int, int, int]:
+        """_jacobian_double 经由素域运算层的版本（用于运算计数），乘以小常数不计为模乘"""
+        if Z1 == 0 or Y1 == 0:
+            return 1, 1, 0
+        F, p = self.field, self.p
+        YY = F.sqr(Y1)
+        S = 4 * F.mul(X1, YY) % p
+        ZZ = F.sqr(Z1)
+        if self.a == p - 3:
+            M = 3 * F.mul(F.sub(X1, ZZ), F.add(X1, ZZ)) % p
+        else:
+            M = F.add(3 * F.sqr(X1) % p, F.mul(self.a, F.sqr(ZZ)))
+        X3 = F.sub(F.sqr(M), 2 * S % p)
+        Y3 = F.sub(F.mul(M, F.sub(S, X3)), 8 * F.sqr(YY) % p)
+        return X3, Y3, 2 * F.mul(Y1, Z1) % p
+    def _field_jacobian_add_affine(self, X1: int, Y1: int, Z1: int, x2: int, y2: int) -> Tuple[int, int, int]:
+        """_jacobian_add_affine 经由素域运算层的版本（用于运算计数）"""
+        if Z1 == 0:
+            return x2, y2, 1
+        F = self.field
+        Z1Z1 = F.sqr(Z1)
+        H = F.sub(F.mul(x2, Z1Z1), X1)
+        r = F.sub(F.mul(y2, F.mul(Z1, Z1Z1)), Y1)
+        if H == 0:
+            if r == 0:
+                return self._jacobian_double(x2, y2, 1)
+            return 1, 1, 0
+        HH = F.sqr(H)
+        HHH = F.mul(H, HH)
+        V = F.mul(X1, HH)
+        X3 = F.sub(F.sub(F.sqr(r), HHH), F.add(V, V))
+        Y3 = F.sub(F.mul(r, F.sub(V, X3)), F.mul(Y1, HHH))
+        return X3, Y3, F.mul(Z1, H)
+    def _field_jacobian_add(self, X1: int, Y1: int, Z1: int, X2: int, Y2: int, Z2: int) -> Tuple[int, int, int]:
+        """_jacobian_add 经由素域运算层的版本（用于运算计数）"""
+        if Z1 == 0:
+            return X2, Y2, Z2
+        if Z2 == 0:
+            return X1, Y1, Z1
+        F = self.field
+        Z1Z1 = F.sqr(Z1)
+        Z2Z2 = F.sqr(Z2)
+        U1 = F.mul(X1, Z2Z2)
+        S1 = F.mul(Y1, F.mul(Z2, Z2Z2))
+        H = F.sub(F.mul(X2, Z1Z1), U1)
+        r = F.sub(F.mul(Y2, F.mul(Z1, Z1Z1)), S1)
+        if H == 0:
+            if r == 0:
+                return self._jacobian_double(X1, Y1, Z1)
+            return 1, 1, 0
+        HH = F.sqr(H)
+        HHH = F.mul(H, HH)
+        V = F.mul(U1, HH)
+        X3 = F.sub(F.sub(F.sqr(r), HHH), F.add(V, V))
+        Y3 = F.sub(F.mul(r, F.sub(V, X3)), F.mul(S1, HHH))
+        return X3, Y3, F.mul(F.mul(Z1, Z2), H)
+    def _field_from_jacobian(self, X: int, Y: int, Z: int) -> Point:
+        """_from_jacobian 经由素域运算层的版本（用于运算计数）"""
+        if Z == 0:
+            return self.O
+        F = self.field
+        z_inv = F.inv(Z)
+        z_inv2 = F.sqr(z_inv)
+        return Point(F.mul(X, z_inv2), F.mul(F.mul(Y, z_inv2), z_inv))
+    def _field_batch_to_affine(self, points: List[Tuple[int, int, int]]) -> List[Optional[Tuple[int, int]]]:
+        """_batch_to_affine 经由素域运算层的版本（用于运算计数）"""
+        F = self.field
+        result = []
+        for (X, Y, _), z_inv in zip(points, F.batch_inv([Z for _, _, Z in points])):
+            if z_inv is None:
+                result.append(None)
+                continue
+            z_inv2 = F.sqr(z_inv)
+            result.append((F.mul(X, z_inv2), F.mul(F.mul(Y, z_inv2), z_inv)))
+        return result
+    def _curve_key(self) -> tuple:
+        """曲线参数元组，用于索引进程级共享的预计算表"""
+        return (self.p, self.a, self.b, self.n, self.G.x, self.G.y)
+    def _build_fixed_base_table(self, P: Point, window: int) -> List[list]:
+        """构建点P的固定基点表，第i行为 j * 2^(window*i) * P 的仿射坐标
+        各行基点与全部表项都在雅可比坐标下计算，再各用一次批量求逆归一化
+        """
+        rows = (self.n.bit_length() + window - 1) // window
+        size = 1 << window
+        # 各行基点 2^(window*i) * P
+        bases = [(P.x, P.y, 1)]
+        for _ in range(rows - 1):
+            X, Y, Z = bases[-1]
+            for _ in range(window):
+                X, Y, Z = self._jacobian_double(X, Y, Z)
+            bases.append((X, Y, Z))
+        affine_bases = self._batch_to_affine(bases)
+        entries = []
+        for base in affine_bases:
+            if base is None:
+                entries.extend([(1, 1, 0)] * (size - 1))
+                continue
+            X, Y, Z = base[0], base[1], 1
+            entries.append((X, Y, Z))
+            for _ in range(2, size):
+                X, Y, Z = self._jacobian_add_affine(X, Y, Z, base[0], base[1])
+                entries.append((X, Y, Z))
+        affine_entries = self._batch_to_affine(entries)
+        return [[None] + affine_entries[i * (size - 1):(i + 1) * (size - 1)] for i in range(rows)]
+    def fixed_base_table(self) -> List[list]:
+        """获取基点G的共享固定基点表（每个进程只构建一次）"""
+        key = self._curve_key()
+        table = _fixed_base_tables.get(key)
+        if table is None:
+            with _fixed_base_lock:
+                table = _fixed_base_tables.get(key)
+                if table is None:
+                    table = self._build_fixed_base_table(self.G, FIXED_BASE_WINDOW)
+                    _fixed_base_tables[key] = table
+        return table
+    def precomputed_table(self, P: Point) -> Optional[List[list]]:
+        """按坐标查找点P的固定基点表：G使用共享表，其余点查询公钥缓存（只应由验证路径调用）"""
+        if P.is_infinity:
+            return None
+        if P.x == self.gx and P.y == self.gy:
+            return self.fixed_base_table()
+        if self.public_key_cache is None:
+            return None
+        return self.public_key_cache.get(self._curve_key() + (P.x, P.y),
+                                         lambda: self._build_fixed_base_table(P, PUBLIC_KEY_TABLE_WINDOW))
+    def _comb_accumulate(self, X: int, Y: int, Z: int, k: int, table: List[list]) -> Tuple[int, int, int]:
+        """把 k*P 累加到雅可比坐标点上，P的固定基点表逐窗口查表，无需倍点"""
+        window = len(table[0]).bit_length() - 1
+        mask = (1 << window) - 1
+        i = 0
+        while k:
+            digit = k & mask
+            if digit:
+                entry = table[i][digit]
+                if entry is not None:
+                    X, Y, Z = self._jacobian_add_affine(X, Y, Z, entry[0], entry[1])
+            k >>= window
+            i += 1
+        return X, Y, Z
+    def fixed_base_multiply(self, k: int) -> Point:
+        """使用固定基点表计算 k*G，只需逐窗口查表相加，无需倍点"""
+        k %= self.n
+        if k == 0:
+            return self.O
+        return self._from_jacobian(*self._comb_accumulate(1, 1, 0, k, self.fixed_base_table()))
+    def base_point_multiply(self, k: int) -> Point:
+        """基点标量乘法 k*G，供密钥生成与签名使用"""
+        return self.fixed_base_multiply(k)
+    def _window_table(self, P: Point, window: int) -> list:
+        """变基点窗口表 [None, P, 2P, ..., (2^window-1)P] 的仿射坐标（批量归一化）"""
+        entries = [(P.x, P.y, 1)]
+        for _ in range(2, 1 << window):
+            entries.append(self._jacobian_add_affine(*entries[-1], P.x, P.y))
+        return [None] + self._batch_to_affine(entries)
+    def double_scalar_multiply(self, u: int, v: int, Q: Point, window: int = 4, use_cache: bool = False) -> Point:
+        """Straus交错双标量乘法 u*G + v*Q，两个标量共用一条倍点链
+        G的窗口直接取自共享固定基点表的第0行，Q的窗口表每次调用构建；
+        use_cache只由验证路径开启，此时查询（并可能建立）Q的公钥预计算表
+        """
+        u %= self.n
+        v %= self.n
+        if Q.is_infinity or v == 0:
+            return self.fixed_base_multiply(u)
+        q_fixed = self.precomputed_table(Q) if use_cache else None
+        if q_fixed is not None:
+            # 热点公钥已有固定基点表，两个标量都无需倍点
+            X, Y, Z = self._comb_accumulate(1, 1, 0, u, self.fixed_base_table())
+            return self._from_jacobian(*self._comb_accumulate(X, Y, Z, v, q_fixed))
+        return self._straus([(u, self.fixed_base_table()[0], FIXED_BASE_WINDOW),
+                             (v, self._window_table(Q, window), window)])
+    def _straus(self, terms: List[Tuple[int, list, int]]) -> Point:
+        """Straus交错多标量乘法 sum(k_i * P_i)，terms为 (k_i, P_i的窗口表, 窗口宽度)，全部标量共用一条倍点链"""
+        X, Y, Z = 1, 1, 0
+        for i in range(max(k.bit_length() for k, _, _ in terms) - 1, -1, -1):
+            X, Y, Z = self._jacobian_double(X, Y, Z)
+            # 第i位是窗口起点时加上对应窗口的预计算点
+            for k, table, window in terms:
+                if i % window == 0:
+                    digit = (k >> i) & ((1 << window) - 1)
+                    if digit and table[digit] is not None:
+                        X, Y, Z = self._jacobian_add_affine(X, Y, Z, *table[digit])
+        return self._from_jacobian(X, Y, Z)
+    def double_base_multiply(self, u: int, P: Point, v: int, Q: Point, window: int = 4) -> Point:
+        """两个变基点的Straus交错乘法 u*P + v*Q，共用一条倍点链，不查询公钥预计算表缓存"""
+        terms = [(k % self.n, self._window_table(R, window), window)
+                 for k, R in ((u, P), (v, Q)) if not R.is_infinity and k % self.n]
+        return self._straus(terms) if terms else self.O
+    def fixed_window_multiply(self, k: int, P: Point, window: int = 4) -> Point:
+        """固定窗口标量乘法：标量补齐到n的位长，每个窗口固定做window次倍点，不查询也不写入公钥预计算表缓存"""
+        k %= self.n
+        if k == 0 or P.is_infinity:
+            return self.O
+        table = self._window_table(P, window)
+        mask = (1 << window) - 1
+        X, Y, Z = 1, 1, 0
+        for shift in range((self.n.bit_length() + window - 1) // window * window - window, -1, -window):
+            for _ in range(window):
+                X, Y, Z = self._jacobian_double(X, Y, Z)
+            digit = (k >> shift) & mask
+            if digit and table[digit] is not None:
+                X, Y, Z = self._jacobian_add_affine(X, Y, Z, *table[digit])
+        return self._from_jacobian(X, Y, Z)
+    def secret_scalar_multiply(self, k: int, P: Point) -> Point:
+        """秘密标量（私钥）参与的点乘：基点走共享固定基点表，其余点走固定窗口法，
+        不经过wNAF/Straus路径，也不把（可能由攻击者提供的）点放入公钥预计算表缓存
+        """
+        if P.x == self.gx and P.y == self.gy:
+            return self.fixed_base_multiply(k)
+        return self.fixed_window_multiply(k, P)
+    def variable_base_multiply(self, k: int, P: Point) -> Point:
+        """变基点标量乘法：窗口法（wNAF后端为wNAF），不查询公钥预计算表缓存"""
+        return self.double_scalar_multiply(0, k, P)
     def point_multiply(self, k: int, P: Point) -> Point:
         """椭圆曲线上的标量乘法运算 k*P"""
         if k == 0:
@@ -92,59 +494,410 @@ class SM2:
         # 私钥：随机数 d ∈ [1, n-1]
         d = random.randint(1, self.n - 1)
         # 公钥：P = d * G
-        P = self.point_multiply(d, self.G)
+        P = self.base_point_multiply(d)
         return d, P
+    def public_keys_from_private(self, private_keys: List[int]) -> List[Point]:
+        """批量计算公钥 d_i * G
+        按固定基点表逐窗口推进，每一轮所有密钥的仿射加法共用一次批量求逆
+        """
+        p = self.p
+        table = self.fixed_base_table()
+        window = len(table[0]).bit_length() - 1
+        mask = (1 << window) - 1
+        scalars = [d % self.n for d in private_keys]
+        acc: List[Optional[Tuple[int, int]]] = [None] * len(scalars)
+        for i, row in enumerate(table):
+            shift = window * i
+            pending = []
+            dens = []
+            for j, k in enumerate(scalars):
+                digit = (k >> shift) & mask
+                if not digit:
+                    continue
+                current = acc[j]
+                entry = row[digit]
+                if current is None:
+                    acc[j] = entry
+                elif current[0] == entry[0]:
+                    # 相同x坐标（倍点或互逆）极少出现，走通用点加
+                    Q = self.point_add(Point(*current), Point(*entry))
+                    acc[j] = None if Q.is_infinity else (Q.x, Q.y)
+                else:
+                    pending.append((j, entry))
+                    dens.append(entry[0] - current[0])
+            for (j, (x2, y2)), den_inv in zip(pending, self.field.batch_inv(dens)):
+                x1, y1 = acc[j]
+                lam = (y2 - y1) * den_inv % p
+                x3 = (lam * lam - x1 - x2) % p
+                acc[j] = (x3, (lam * (x1 - x3) - y1) % p)
+        return [self.O if xy is None else Point(*xy) for xy in acc]
+    def generate_keypairs(self, count: int) -> List[Tuple[int, Point]]:
+        """批量生成SM2密钥对"""
+        private_keys = [random.randint(1, self.n - 1) for _ in range(count)]
+        return list(zip(private_keys, self.public_keys_from_private(private_keys)))
     def sm3_hash(self, data: bytes) -> bytes:
-        """SM3哈希函数的简化实现（这里用SHA256代替，实际应用中应使用真正的SM3）"""
-        return hashlib.sha256(data).digest()
-    def sign(self, message: bytes, private_key: int) -> Tuple[int, int]:
-        """SM2数字签名算法"""
-        # 这里简化了Za的计算，实际应用中需要包含用户身份信息
-        e = int.from_bytes(self.sm3_hash(message), 'big')
+        """SM3杂凑函数"""
+        return SM3(data).digest()
+    def _coordinate_bytes(self, value: int) -> bytes:
+        """域元素按p的字节长度编码为大端字节串"""
+        return value.to_bytes((self.p.bit_length() + 7) // 8, 'big')
+    def _za_entry(self, public_key: Point, user_id: bytes) -> Tuple[bytes, SM3]:
+        """返回 (Z_A, 已吸收Z_A的SM3状态)，按(用户身份, 公钥)缓存，状态使用前需copy()"""
+        key = self._curve_key() + (user_id, public_key.x, public_key.y)
+        with _digest_cache_lock:
+            entry = _za_states.get(key)
+            if entry is not None:
+                _za_states.move_to_end(key)
+                return entry
+        entl = (len(user_id) * 8).to_bytes(2, 'big')
+        za = SM3(entl + user_id + b"".join(self._coordinate_bytes(v) for v in (
+            self.a, self.b, self.gx, self.gy, public_key.x, public_key.y))).digest()
+        entry = (za, SM3(za))
+        with _digest_cache_lock:
+            _za_states[key] = entry
+            while len(_za_states) > ZA_CACHE_SIZE:
+                _za_states.popitem(last=False)
+        return entry
+    def compute_za(self, public_key: Point, user_id: bytes = DEFAULT_USER_ID) -> bytes:
+        """Z_A = SM3(ENTL || ID || a || b || xG || yG || xA || yA)"""
+        return self._za_entry(public_key, user_id)[0]
+    def message_digest(self, message: bytes, public_key: Point, user_id: bytes = DEFAULT_USER_ID) -> int:
+        """计算 e = SM3(Z_A || M)，从缓存的Z_A状态复制后只压缩消息本身"""
+        h = self._za_entry(public_key, user_id)[1].copy()
+        h.update(message)
+        return int.from_bytes(h.digest(), 'big')
+    def public_key_of(self, private_key: int) -> Point:
+        """私钥对应的公钥 d*G（走秘密标量路径），结果缓存在本实例中"""
+        with self._public_keys_lock:
+            public_key = self._public_keys.get(private_key)
+            if public_key is not None:
+                self._public_keys.move_to_end(private_key)
+                return public_key
+        public_key = self.secret_scalar_multiply(private_key, self.G)
+        with self._public_keys_lock:
+            self._public_keys[private_key] = public_key
+            while len(self._public_keys) > PUBLIC_KEY_CACHE_SIZE:
+                self._public_keys.popitem(last=False)
+        return public_key
+    def clear_private_key_cache(self):
+        """清空本实例中按私钥缓存的公钥"""
+        with self._public_keys_lock:
+            self._public_keys.clear()
+    def sign(self, message: bytes, private_key: int, user_id: bytes = DEFAULT_USER_ID,
+             pool=None) -> Tuple[int, int]:
+        """SM2数字签名算法，提供预计算池时k*G取自池中（离线/在线签名）"""
+        r, s, _ = self.sign_recoverable(message, private_key, user_id, pool)
+        return r, s
+    def sign_recoverable(self, message: bytes, private_key: int,
+                         user_id: bytes = DEFAULT_USER_ID, pool=None) -> Tuple[int, int, int]:
+        """SM2签名并附带R点y坐标的奇偶位v，返回 (r, s, v)，便于批量验证"""
+        # e = SM3(Z_A || M)，Z_A包含用户身份与公钥
+        e = self.message_digest(message, self.public_key_of(private_key), user_id)
+        d_inv = self.mod_inverse(1 + private_key, self.n)
         while True:
-            # 生成随机数k
-            k = random.randint(1, self.n - 1)
-            # 计算椭圆曲线点 (x1, y1) = k * G
-            point = self.point_multiply(k, self.G)
+            if pool is not None:
+                # 离线阶段已预计算 (k, k*G)，每个k只会被取出一次，在线阶段只剩模运算
+                k, point = pool.take()
+            else:
+                # 生成随机数k
+                k = random.randint(1, self.n - 1)
+                # 计算椭圆曲线点 (x1, y1) = k * G
+                point = self.base_point_multiply(k)
             x1 = point.x
             # 计算 r = (e + x1) mod n
             r = (e + x1) % self.n
             if r == 0 or r + k == self.n:
                 continue
             # 计算 s = (1 + private_key)^(-1) * (k - r * private_key) mod n
-            d_inv = self.mod_inverse(1 + private_key, self.n)
             s = (d_inv * (k - r * private_key)) % self.n
             if s == 0:
                 continue
-            return r, s
-    def verify(self, message: bytes, signature: Tuple[int, int], public_key: Point) -> bool:
+            return r, s, point.y & 1
+    def verify(self, message: bytes, signature: Tuple[int, int], public_key: Point,
+               user_id: bytes = DEFAULT_USER_ID) -> bool:
         """SM2数字签名验证算法"""
-        r, s = signature
+        r, s = signature[0], signature[1]
         # 检查签名参数范围
         if not (1 <= r < self.n and 1 <= s < self.n):
             return False
-        # 计算消息哈希值
-        e = int.from_bytes(self.sm3_hash(message), 'big')
+        # 计算消息哈希值 e = SM3(Z_A || M)
+        e = self.message_digest(message, public_key, user_id)
         # 计算 t = (r + s) mod n
         t = (r + s) % self.n
         if t == 0:
             return False
-        # 计算椭圆曲线点 (x1, y1) = s * G + t * public_key
-        point1 = self.point_multiply(s, self.G)
-        point2 = self.point_multiply(t, public_key)
-        point = self.point_add(point1, point2)
+        # 计算椭圆曲线点 (x1, y1) = s * G + t * public_key（共用一条倍点链，热点公钥走缓存的预计算表）
+        point = self.double_scalar_multiply(s, t, public_key, use_cache=True)
         if point.is_infinity:
             return False
         # 计算 R = (e + x1) mod n
         R = (e + point.x) % self.n
         return R == r
+    def generate_ephemeral_key(self, pool=None) -> Tuple[int, Point]:
+        """生成密钥交换用的临时密钥对 (r, R = r*G)，提供预计算池时从池中取用"""
+        if pool is not None:
+            return pool.take()
+        r = secrets.randbelow(self.n - 1) + 1
+        return r, self.base_point_multiply(r)
+    def _x_bar(self, x: int) -> int:
+        """x̄ = 2^w + (x & (2^w - 1))，w = ceil(ceil(log2 n) / 2) - 1"""
+        w = (self.n.bit_length() + 1) // 2 - 1
+        return (1 << w) + (x & ((1 << w) - 1))
+    def key_exchange(self, initiator: bool, private_key: int, public_key: Point,
+                     ephemeral: Tuple[int, Point], peer_public_key: Point, peer_ephemeral: Point,
+                     klen: int = 16, user_id: bytes = DEFAULT_USER_ID,
+                     peer_user_id: bytes = DEFAULT_USER_ID) -> Tuple[bytes, bytes, bytes]:
+        """SM2密钥交换协议 (GM/T 0003.3)
+        返回 (共享密钥K, 本方确认值, 期望收到的对方确认值)，
+        发起方A的确认值为S_A(0x03)，响应方B的确认值为S_B(0x02)
+        """
+        r, R = ephemeral
+        if not self.is_on_curve(peer_ephemeral):
+            raise ValueError("对方临时公钥不在椭圆曲线上")
+        t = (private_key + self._x_bar(R.x) * r) % self.n
+        x_bar_peer = self._x_bar(peer_ephemeral.x)
+        # U = t * P_peer + (t * x̄ mod n) * R_peer，余因子h = 1；一条交错倍点链，对方的点不进入公钥预计算表缓存
+        U = self.double_base_multiply(t, peer_public_key, t * x_bar_peer, peer_ephemeral)
+        if U.is_infinity:
+            raise ValueError("协商失败：U为无穷远点")
+        if initiator:
+            za, zb = self.compute_za(public_key, user_id), self.compute_za(peer_public_key, peer_user_id)
+            R_A, R_B = R, peer_ephemeral
+        else:
+            za, zb = self.compute_za(peer_public_key, peer_user_id), self.compute_za(public_key, user_id)
+            R_A, R_B = peer_ephemeral, R
+        xu, yu = self._coordinate_bytes(U.x), self._coordinate_bytes(U.y)
+        key = self.kdf(xu + yu + za + zb, klen)
+        inner = self.sm3_hash(xu + za + zb + b"".join(
+            self._coordinate_bytes(v) for v in (R_A.x, R_A.y, R_B.x, R_B.y)))
+        s_b = self.sm3_hash(b"\x02" + yu + inner)
+        s_a = self.sm3_hash(b"\x03" + yu + inner)
+        return (key, s_a, s_b) if initiator else (key, s_b, s_a)
+    def lift_x(self, x: int, parity: int) -> Optional[Point]:
+        """由x坐标和y的奇偶位恢复曲线点，x不对应曲线点时返回None"""
+        if not 0 <= x < self.p:
+            return None
+        F = self.field
+        y = F.sqrt(F.add(F.mul(F.add(F.sqr(x), self.a), x), self.b))
+        if y is None:
+            return None
+        if (y & 1) != parity:
+            y = F.neg(y)
+        return Point(x, y)
+    def multi_scalar_multiply(self, pairs: List[Tuple[int, Point]]) -> Point:
+        """Pippenger桶方法多标量乘法 sum(k_i * P_i)"""
+        terms = [(k % self.n, P.x, P.y) for k, P in pairs if not P.is_infinity and k % self.n]
+        if not terms:
+            return self.O
+        max_bits = max(k.bit_length() for k, _, _ in terms)
+        # 窗口宽度c使 (max_bits / c) * (N + 2^(c+1)) 最小
+        c = min(range(1, 17), key=lambda c: (max_bits + c - 1) // c * (len(terms) + (2 << c)))
+        mask = (1 << c) - 1
+        X, Y, Z = 1, 1, 0
+        for shift in range((max_bits - 1) // c * c, -1, -c):
+            for _ in range(c):
+                X, Y, Z = self._jacobian_double(X, Y, Z)
+            buckets = [(1, 1, 0)] * (1 << c)
+            for k, x, y in terms:
+                digit = (k >> shift) & mask
+                if digit:
+                    buckets[digit] = self._jacobian_add_affine(*buckets[digit], x, y)
+            # sum(j * B_j) = 依次累加后缀和
+            running = (1, 1, 0)
+            window_sum = (1, 1, 0)
+            for j in range(mask, 0, -1):
+                running = self._jacobian_add(*running, *buckets[j])
+                window_sum = self._jacobian_add(*window_sum, *running)
+            X, Y, Z = self._jacobian_add(X, Y, Z, *window_sum)
+        return self._from_jacobian(X, Y, Z)
+    def _batch_equation_holds(self, prepared: list) -> bool:
+        """检查随机线性组合 sum a_i (s_i*G + t_i*P_i - R_i) = O"""
+        g_coeff = 0
+        key_coeffs = {}
+        pairs = []
+        for s, t, public_key, R in prepared:
+            a = secrets.randbits(128) | 1
+            g_coeff += a * s
+            # 同一公钥的系数合并，热点公钥只参与一次多标量乘法
+            key = (public_key.x, public_key.y)
+            if key in key_coeffs:
+                key_coeffs[key][0] += a * t
+            else:
+                key_coeffs[key] = [a * t, public_key]
+            pairs.append((a, Point(R.x, self.p - R.y)))
+        pairs.extend((coeff, public_key) for coeff, public_key in key_coeffs.values())
+        pairs.append((g_coeff, self.G))
+        return self.multi_scalar_multiply(pairs).is_infinity
+    def verify_batch(self, items: List[Tuple[bytes, tuple, Point]],
+                     user_id: bytes = DEFAULT_USER_ID) -> List[bool]:
+        """批量验证签名，返回每个签名的验证结果
+        带奇偶位的签名 (r, s, v) 通过随机线性组合一次验证，批量失败时二分定位无效签名；
+        只有 (r, s) 的签名无法确定R点，逐个验证
+        """
+        results: List[Optional[bool]] = [None] * len(items)
+        prepared = {}
+        for index, (message, signature, public_key) in enumerate(items):
+            r, s = signature[0], signature[1]
+            if not (1 <= r < self.n and 1 <= s < self.n) or (r + s) % self.n == 0:
+                results[index] = False
+                continue
+            R = None
+            if len(signature) > 2:
+                e = self.message_digest(message, public_key, user_id)
+                R = self.lift_x((r - e) % self.n, signature[2])
+            if R is None:
+                results[index] = self.verify(message, signature, public_key, user_id)
+                continue
+            prepared[index] = (s, (r + s) % self.n, public_key, R)
+        pending = [list(prepared)]
+        while pending:
+            indices = pending.pop()
+            if len(indices) == 1:
+                index = indices[0]
+                results[index] = self.verify(items[index][0], items[index][1], items[index][2], user_id)
+            elif self._batch_equation_holds([prepared[i] for i in indices]):
+                for index in indices:
+                    results[index] = True
+            elif indices:
+                middle = len(indices) // 2
+                pending.append(indices[middle:])
+                pending.append(indices[:middle])
+        return results
+    def is_on_curve(self, P: Point) -> bool:
+        """检查点是否满足 y^2 = x^3 + ax + b (mod p)"""
+        if P.is_infinity:
+            return False
+        if not (0 <= P.x < self.p and 0 <= P.y < self.p):
+            return False
+        return (P.y * P.y - (P.x * P.x + self.a) * P.x - self.b) % self.p == 0
+    def encode_point(self, P: Point, compressed: bool = True) -> bytes:
+        """SEC1点编码：压缩 02/03 || x，非压缩 04 || x || y，无穷远点为 00"""
+        if P.is_infinity:
+            return b"\x00"
+        if compressed:
+            return bytes([2 | (P.y & 1)]) + self._coordinate_bytes(P.x)
+        return b"\x04" + self._coordinate_bytes(P.x) + self._coordinate_bytes(P.y)
+    def decode_point(self, data: bytes) -> Point:
+        """SEC1点解码，验证点在曲线上，格式或点无效时抛出ValueError"""
+        size = (self.p.bit_length() + 7) // 8
+        if not data:
+            raise ValueError("点编码为空")
+        prefix = data[0]
+        if prefix in (2, 3) and len(data) == 1 + size:
+            P = self.lift_x(int.from_bytes(data[1:], 'big'), prefix & 1)
+            if P is None:
+                raise ValueError("压缩点的x坐标不对应曲线点")
+            return P
+        if prefix == 4 and len(data) == 1 + 2 * size:
+            P = Point(int.from_bytes(data[1:1 + size], 'big'), int.from_bytes(data[1 + size:], 'big'))
+            if not self.is_on_curve(P):
+                raise ValueError("点不在椭圆曲线上")
+            return P
+        if data == b"\x00":
+            raise ValueError("无穷远点不是有效公钥")
+        raise ValueError("点编码格式错误")
+    def decode_points(self, encoded: List[bytes], strict: bool = True) -> List[Optional[Point]]:
+        """批量解码公钥目录；strict为False时无效条目返回None而不抛出异常"""
+        p, a, b = self.p, self.a, self.b
+        size = (p.bit_length() + 7) // 8
+        sqrt_exponent = (p + 1) >> 2
+        fast_sqrt = p & 3 == 3
+        points: List[Optional[Point]] = []
+        for index, data in enumerate(encoded):
+            P = None
+            prefix = data[0] if data else None
+            if (prefix == 2 or prefix == 3) and len(data) == 1 + size:
+                x = int.from_bytes(data[1:], 'big')
+                if x < p:
+                    rhs = ((x * x + a) * x + b) % p
+                    if fast_sqrt:
+                        # p ≡ 3 (mod 4)：一次模幂，平方校验同时完成点验证
+                        y = pow(rhs, sqrt_exponent, p)
+                        if y * y % p != rhs:
+                            y = None
+                    else:
+                        y = self.field.sqrt(rhs)
+                    if y is not None:
+                        P = Point(x, y if (y & 1) == (prefix & 1) else (p - y) % p)
+            elif prefix == 4 and len(data) == 1 + 2 * size:
+                x = int.from_bytes(data[1:1 + size], 'big')
+                y = int.from_bytes(data[1 + size:], 'big')
+                if x < p and y < p and (y * y - (x * x + a) * x - b) % p == 0:
+                    P = Point(x, y)
+            if P is None and strict:
+                raise ValueError(f"第{index}个点编码无效")
+            points.append(P)
+        return points
+    def kdf_stream(self, z: bytes) -> Iterator[bytes]:
+        """SM3密钥派生函数的流式输出：依次产生 SM3(Z || ct)，ct从1开始"""
+        state = SM3(z)
+        ct = 1
+        while True:
+            h = state.copy()
+            h.update(ct.to_bytes(4, 'big'))
+            yield h.digest()
+            ct += 1
+    def kdf(self, z: bytes, klen: int) -> bytes:
+        """派生klen字节的密钥数据"""
+        blocks = self.kdf_stream(z)
+        return b"".join(next(blocks) for _ in range((klen + 31) // 32))[:klen]
+    def _xor_with_kdf(self, z: bytes, data: bytes, out: bytearray) -> bool:
+        """按32字节分块将data与KDF输出异或写入out，返回KDF输出是否全为0"""
+        view = memoryview(data)
+        all_zero = True
+        for offset, block in zip(range(0, len(data), 32), self.kdf_stream(z)):
+            chunk = view[offset:offset + 32]
+            mask = int.from_bytes(block[:len(chunk)], 'big')
+            all_zero = all_zero and mask == 0
+            out += (int.from_bytes(chunk, 'big') ^ mask).to_bytes(len(chunk), 'big')
+        return all_zero and len(data) > 0
+    def encrypt(self, message: bytes, public_key: Point) -> bytes:
+        """SM2公钥加密，输出 C1 || C3 || C2"""
+        size = (self.p.bit_length() + 7) // 8
+        while True:
+            # k用secrets生成：MT19937的输出可被预测（见sm2_weak_nonce），k可预测即可重算kP_B并解密
+            k = secrets.randbelow(self.n - 1) + 1
+            C1 = self.base_point_multiply(k)
+            S = self.variable_base_multiply(k, public_key)
+            if S.is_infinity:
+                raise ValueError("公钥无效")
+            x2 = S.x.to_bytes(size, 'big')
+            y2 = S.y.to_bytes(size, 'big')
+            C2 = bytearray()
+            if self._xor_with_kdf(x2 + y2, message, C2):
+                # t全为0时重新选择k
+                continue
+            h = SM3(x2)
+            h.update(message)
+            h.update(y2)
+            return self.encode_point(C1, compressed=False) + h.digest() + bytes(C2)
+    def decrypt(self, ciphertext: bytes, private_key: int) -> bytes:
+        """SM2解密，校验C1在曲线上并校验C3"""
+        size = (self.p.bit_length() + 7) // 8
+        if len(ciphertext) < 1 + 2 * size + 32 or ciphertext[0] != 0x04:
+            raise ValueError("密文格式错误")
+        # 解码时验证C1在曲线上
+        C1 = self.decode_point(ciphertext[:1 + 2 * size])
+        C3 = ciphertext[1 + 2 * size:1 + 2 * size + 32]
+        C2 = ciphertext[1 + 2 * size + 32:]
+        # 私钥与攻击者可控的C1相乘，走秘密标量路径
+        S = self.secret_scalar_multiply(private_key, C1)
+        if S.is_infinity:
+            raise ValueError("C1无效")
+        x2 = S.x.to_bytes(size, 'big')
+        y2 = S.y.to_bytes(size, 'big')
+        message = bytearray()
+        if self._xor_with_kdf(x2 + y2, C2, message):
+            raise ValueError("KDF输出全为0")
+        h = SM3(x2)
+        h.update(message)
+        h.update(y2)
+        if not hmac.compare_digest(h.digest(), C3):
+            raise ValueError("C3校验失败")
+        return bytes(message)
 # 算法优化版本
 class SM2Optimized(SM2):
     """SM2的优化实现版本"""
-    def __init__(self):
-        super().__init__()
-        # 预计算表，用于加速点乘运算
-        self.precomputed_G = self._precompute_points(self.G, 8)
     def _precompute_points(self, P: Point, window_size: int) -> list:
         """预计算点的倍数，用于窗口方法加速"""
         table = [self.O] * (1 << window_size)
@@ -159,15 +912,15 @@ class SM2Optimized(SM2):
         """使用窗口方法的优化点乘算法"""
         if k == 0:
             return self.O
-        # 如果是基点G，使用预计算表
-        if P == self.G and hasattr(self, 'precomputed_G'):
-            return self._multiply_with_precomputed(k, self.precomputed_G, window_size)
+        # 基点G直接使用共享固定基点表
+        if P.x == self.gx and P.y == self.gy:
+            return self.fixed_base_multiply(k)
         # 一般情况下的窗口方法
         precomputed = self._precompute_points(P, window_size)
         return self._multiply_with_precomputed(k, precomputed, window_size)
     def _multiply_with_precomputed(self, k: int, table: list, window_size: int) -> Point:
-        """使用预计算表进行点乘运算"""
-        result = self.O
+        """使用预计算表进行点乘运算，在雅可比坐标下累加，只在最后生成一个Point"""
+        X, Y, Z = 1, 1, 0
         # 从最高位开始处理
         bit_length = k.bit_length()
         i = bit_length
@@ -177,12 +930,13 @@ class SM2Optimized(SM2):
             window_value = (k >> (i - window_bits)) & ((1 << window_bits) - 1)
             # 将result左移window_bits位
             for _ in range(window_bits):
-                result = self.point_double(result)
+                X, Y, Z = self._jacobian_double(X, Y, Z)
             # 加上对应的预计算值
-            if window_value > 0:
-                result = self.point_add(result, table[window_value])
+            if window_value > 0 and not table[window_value].is_infinity:
+                entry = table[window_value]
+                X, Y, Z = self._jacobian_add_affine(X, Y, Z, entry.x, entry.y)
             i -= window_bits
-        return result
+        return self._from_jacobian(X, Y, Z)
     def point_multiply(self, k: int, P: Point) -> Point:
         """重写点乘方法，使用优化算法"""
         return self.point_multiply_windowed(k, P)
@@ -206,6 +960,98 @@ class SM2Montgomery(SM2):
                 R1 = self.point_add(R0, R1)
                 R0 = self.point_double(R0)
         return R0
+    def base_point_multiply(self, k: int) -> Point:
+        """基点标量乘法同样使用蒙哥马利阶梯算法"""
+        return self.point_multiply_montgomery(k, self.G)
     def point_multiply(self, k: int, P: Point) -> Point:
         """重写点乘方法，使用蒙哥马利阶梯算法"""
-        return self.point_multiply_montgomery(k, P)
\ No newline at end of file
+        return self.point_multiply_montgomery(k, P)
+# 宽度w的NAF标量乘法实现
+class SM2WNAF(SM2):
+    """使用wNAF（宽度w非相邻形式）的SM2实现"""
+    @staticmethod
+    def wnaf_width(bit_length: int) -> int:
+        """按标量长度选择窗口宽度：最小化 预计算点数 + 期望加法次数"""
+        return min(range(2, 8), key=lambda w: (1 << (w - 2)) + bit_length / (w + 1))
+    @staticmethod
+    def wnaf(k: int, w: int) -> List[int]:
+        """计算k的宽度w NAF表示（低位在前），非零系数为奇数且|d| < 2^(w-1)"""
+        digits = []
+        full = 1 << w
+        half = 1 << (w - 1)
+        while k:
+            if k & 1:
+                d = k & (full - 1)
+                if d >= half:
+                    d -= full
+                k -= d
+            else:
+                d = 0
+            digits.append(d)
+            k >>= 1
+        return digits
+    def _odd_multiples(self, P: Point, w: int) -> list:
+        """预计算奇数倍点 P, 3P, 5P, ..., (2^(w-1)-1)P 的仿射坐标"""
+        P2 = self.point_double(P)
+        entries = [(P.x, P.y, 1)]
+        if P2.is_infinity:
+            return [(P.x, P.y)] + [None] * ((1 << (w - 2)) - 1)
+        for _ in range((1 << (w - 2)) - 1):
+            entries.append(self._jacobian_add_affine(*entries[-1], P2.x, P2.y))
+        return self._batch_to_affine(entries)
+    def point_multiply_wnaf(self, k: int, P: Point, w: Optional[int] = None) -> Point:
+        """wNAF点乘：利用点取负只需存储一半的预计算点"""
+        if P.is_infinity:
+            return self.O
+        k %= self.n
+        if k == 0:
+            return self.O
+        if w is None:
+            w = self.wnaf_width(k.bit_length())
+        digits = self.wnaf(k, w)
+        table = self._odd_multiples(P, w)
+        p = self.p
+        X, Y, Z = 1, 1, 0
+        for d in reversed(digits):
+            X, Y, Z = self._jacobian_double(X, Y, Z)
+            if d:
+                entry = table[(abs(d) - 1) >> 1]
+                if entry is not None:
+                    x2, y2 = entry
+                    # 负系数加上 -Q = (x, p - y)
+                    X, Y, Z = self._jacobian_add_affine(X, Y, Z, x2, y2 if d > 0 else p - y2)
+        return self._from_jacobian(X, Y, Z)
+    def double_scalar_multiply(self, u: int, v: int, Q: Point, window: Optional[int] = None,
+                               use_cache: bool = False) -> Point:
+        """交错双标量乘法 u*G + v*Q，G取固定基点表窗口，Q使用wNAF；use_cache含义同SM2"""
+        u %= self.n
+        v %= self.n
+        if Q.is_infinity or v == 0:
+            return self.fixed_base_multiply(u)
+        q_fixed = self.precomputed_table(Q) if use_cache else None
+        if q_fixed is not None:
+            X, Y, Z = self._comb_accumulate(1, 1, 0, u, self.fixed_base_table())
+            return self._from_jacobian(*self._comb_accumulate(X, Y, Z, v, q_fixed))
+        w = window or self.wnaf_width(v.bit_length())
+        q_digits = self.wnaf(v, w)
+        q_table = self._odd_multiples(Q, w)
+        g_table = self.fixed_base_table()[0]
+        g_mask = (1 << FIXED_BASE_WINDOW) - 1
+        p = self.p
+        X, Y, Z = 1, 1, 0
+        for i in range(max(u.bit_length(), len(q_digits)) - 1, -1, -1):
+            X, Y, Z = self._jacobian_double(X, Y, Z)
+            if i % FIXED_BASE_WINDOW == 0:
+                digit = (u >> i) & g_mask
+                if digit:
+                    X, Y, Z = self._jacobian_add_affine(X, Y, Z, *g_table[digit])
+            if i < len(q_digits) and q_digits[i]:
+                d = q_digits[i]
+                entry = q_table[(abs(d) - 1) >> 1]
+                if entry is not None:
+                    x2, y2 = entry
+                    X, Y, Z = self._jacobian_add_affine(X, Y, Z, x2, y2 if d > 0 else p - y2)
+        return self._from_jacobian(X, Y, Z)
+    def point_multiply(self, k: int, P: Point) -> Point:
+        """重写点乘方法，使用wNAF算法"""
+        return self.point_multiply_wnaf(k, P)
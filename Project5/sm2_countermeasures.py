@@ -10,7 +10,14 @@ import secrets
 import hmac
 import time
 from sm2_base import SM2, Point
+from sm2_timing import leakage_test, T_THRESHOLD
 from typing import List, Tuple, Dict, Optional
+# 签名故障检测策略：
+# none      不检测
+# curve     检查 k*G 在曲线上（捕获使点离开曲线的故障）
+# verify    曲线检查 + 用缓存公钥做一次快速验证（捕获任何导致签名无效的故障）
+# redundant verify基础上再重复计算一次 k*G 并比对
+FAULT_CHECK_POLICIES = ("none", "curve", "verify", "redundant")
 class SM2SecureImplementation(SM2):
     """SM2安全实现类，包含各种防护措施"""
     def __init__(self):
@@ -20,6 +27,7 @@ class SM2SecureImplementation(SM2):
         self.constant_time_enabled = True
         self.fault_detection_enabled = True
         self.side_channel_protection = True
+        self.fault_check_policy = "verify"
     def secure_random_k(self, message: bytes, private_key: int) -> int:
         """安全的随机数k生成（RFC 6979确定性方案）"""
         # 实现RFC 6979确定性签名
@@ -41,64 +49,124 @@ class SM2SecureImplementation(SM2):
                 return k
             k_val = hmac.new(k_val, v + b'\x00', hashlib.sha256).digest()
             v = hmac.new(k_val, v, hashlib.sha256).digest()
+    def _xycz_idbl(self, x: int, y: int) -> Tuple[int, int, int, int, int]:
+        """XYCZ-IDBL：由仿射点P计算共Z的 (2P, P)，返回 (X2P, Y2P, XP, YP, Z)"""
+        p = self.p
+        yy = y * y % p
+        S = 4 * x * yy % p
+        M = (3 * x * x + self.a) % p
+        yyyy8 = 8 * yy * yy % p
+        X3 = (M * M - 2 * S) % p
+        Y3 = (M * (S - X3) - yyyy8) % p
+        return X3, Y3, S, yyyy8, 2 * y % p
+    def _xycz_add(self, X1: int, Y1: int, X2: int, Y2: int, Z: int) -> Tuple[int, int, int, int, int]:
+        """XYCZ-ADD：共Z点P、Q，返回共Z的 (P+Q, P)，即 (X3, Y3, X1', Y1', Z3)"""
+        p = self.p
+        dx = (X1 - X2) % p
+        C = dx * dx % p
+        W1 = X1 * C % p
+        W2 = X2 * C % p
+        dy = (Y1 - Y2) % p
+        A1 = Y1 * (W1 - W2) % p
+        X3 = (dy * dy - W1 - W2) % p
+        Y3 = (dy * (W1 - X3) - A1) % p
+        return X3, Y3, W1, A1, Z * dx % p
+    def _xycz_addc(self, X1: int, Y1: int, X2: int, Y2: int, Z: int) -> Tuple[int, int, int, int, int]:
+        """XYCZ-ADDC：共Z点P、Q，返回共Z的 (P+Q, P-Q)，即 (X3, Y3, X3', Y3', Z3)"""
+        p = self.p
+        dx = (X1 - X2) % p
+        C = dx * dx % p
+        W1 = X1 * C % p
+        W2 = X2 * C % p
+        dy = (Y1 - Y2) % p
+        sy = (Y1 + Y2) % p
+        A1 = Y1 * (W1 - W2) % p
+        X3 = (dy * dy - W1 - W2) % p
+        Y3 = (dy * (W1 - X3) - A1) % p
+        X3c = (sy * sy - W1 - W2) % p
+        Y3c = (sy * (W1 - X3c) - A1) % p
+        return X3, Y3, X3c, Y3c, Z * dx % p
     def constant_time_point_multiply(self, k: int, P: Point) -> Point:
-        """常时间点乘算法（防时序攻击）"""
+        """常时间点乘算法（防时序攻击）：共Z蒙哥马利阶梯
+        标量补齐为固定的 bit_length(n)+1 位，每轮执行相同的 XYCZ-ADDC + XYCZ-ADD，循环内无求逆
+        """
         if not self.constant_time_enabled:
             return self.point_multiply(k, P)
-        # 蒙哥马利阶梯算法（常时间）
-        if k == 0:
+        if P.is_infinity:
             return self.O
-        R0 = self.O
-        R1 = P
-        # 从最高位开始，确保每次循环执行相同的操作
-        for i in range(k.bit_length() - 1, -1, -1):
-            bit = (k >> i) & 1
-            if bit:
-                R0 = self.point_add(R0, R1)
-                R1 = self.point_double(R1)
-            else:
-                R1 = self.point_add(R0, R1)
-                R0 = self.point_double(R0)
-        return R0
-    def fault_resistant_sign(self, message: bytes, private_key: int) -> Tuple[int, int]:
-        """抗故障注入的签名算法"""
+        # k̂ = k + n 或 k + 2n，使最高位固定在第 bit_length(n) 位，k̂*P = k*P
+        n_bits = self.n.bit_length()
+        k = k % self.n + self.n
+        if k >> n_bits == 0:
+            k += self.n
+        # R[1] = 2P, R[0] = P，始终保持 R[1] - R[0] = P
+        X1, Y1, X0, Y0, Z = self._xycz_idbl(P.x, P.y)
+        R = [[X0, Y0], [X1, Y1]]
+        for i in range(n_bits - 1, -1, -1):
+            b = (k >> i) & 1
+            Rb, Rnb = R[b], R[1 - b]
+            # (R[1-b], R[b]) <- (R[b] + R[1-b], R[b] - R[1-b])
+            Rnb[0], Rnb[1], Rb[0], Rb[1], Z = self._xycz_addc(Rb[0], Rb[1], Rnb[0], Rnb[1], Z)
+            # (R[b], R[1-b]) <- (R[1-b] + R[b], R[1-b])
+            Rb[0], Rb[1], Rnb[0], Rnb[1], Z = self._xycz_add(Rnb[0], Rnb[1], Rb[0], Rb[1], Z)
+        if Z == 0:
+            # 中间出现 R[0] = ±R[1]（如 k*P = O），概率可忽略，退回通用点乘
+            return self.point_multiply(k % self.n, P)
+        # 唯一一次求逆
+        z_inv = self.field.inv(Z)
+        z_inv2 = z_inv * z_inv % self.p
+        return Point(R[0][0] * z_inv2 % self.p, R[0][1] * z_inv2 * z_inv % self.p)
+    def secret_scalar_multiply(self, k: int, P: Point) -> Point:
+        """私钥参与的点乘（公钥计算、解密）一律走常时间阶梯"""
+        return self.constant_time_point_multiply(k, P)
+    def fault_resistant_sign(self, message: bytes, private_key: int, policy: Optional[str] = None) -> Tuple[int, int]:
+        """抗故障注入的签名算法，policy取FAULT_CHECK_POLICIES之一，默认使用fault_check_policy"""
         if not self.fault_detection_enabled:
             return self.sign(message, private_key)
-        # 双重计算验证
+        policy = policy or self.fault_check_policy
+        if policy not in FAULT_CHECK_POLICIES:
+            raise ValueError(f"未知的故障检测策略: {policy}")
+        # 公钥由常时间阶梯计算，按私钥缓存在本实例中（clear_private_key_cache可清空），Z_A按公钥缓存
+        public_key = self.public_key_of(private_key)
+        e = self.message_digest(message, public_key)
+        d_inv = self.mod_inverse(1 + private_key, self.n)
         max_attempts = 3
         for attempt in range(max_attempts):
             try:
-                # 第一次计算
-                e = int.from_bytes(self.sm3_hash(message), 'big')
                 k = self.secure_random_k(message, private_key)
-                point1 = self.constant_time_point_multiply(k, self.G)
-                x1_1 = point1.x
-                r1 = (e + x1_1) % self.n
-                if r1 == 0 or r1 + k == self.n:
-                    continue
-                d_inv1 = self.mod_inverse(1 + private_key, self.n)
-                s1 = (d_inv1 * (k - r1 * private_key)) % self.n
-                if s1 == 0:
+                point = self.constant_time_point_multiply(k, self.G)
+                # 曲线检查只需几次模乘
+                if policy != "none" and (point.is_infinity or not self.validate_point_on_curve(point)):
+                    self.security_logs.append(("fault_detection", f"故障检测：k*G不在曲线上 attempt={attempt}"))
                     continue
-                # 第二次计算验证
-                point2 = self.constant_time_point_multiply(k, self.G)
-                x1_2 = point2.x
-                r2 = (e + x1_2) % self.n
-                d_inv2 = self.mod_inverse(1 + private_key, self.n)
-                s2 = (d_inv2 * (k - r2 * private_key)) % self.n
-                # 比较两次计算结果
-                if r1 == r2 and s1 == s2:
-                    # 验证签名正确性
-                    public_key = self.constant_time_point_multiply(private_key, self.G)
-                    if self.verify(message, (r1, s1), public_key):
-                        return r1, s1
-                    else:
-                        self.security_logs.append(("fault_detection", "签名验证失败"))
-                else:
+                if policy == "redundant" and self.constant_time_point_multiply(k, self.G) != point:
                     self.security_logs.append(("fault_detection", f"故障检测：计算不一致 attempt={attempt}"))
+                    continue
+                r = (e + point.x) % self.n
+                if r == 0 or r + k == self.n:
+                    continue
+                s = (d_inv * (k - r * private_key)) % self.n
+                if s == 0:
+                    continue
+                # 一次交错双标量验证即可覆盖 k*G 与 s 计算中的故障
+                if policy in ("verify", "redundant") and not self.verify(message, (r, s), public_key):
+                    self.security_logs.append(("fault_detection", "签名验证失败"))
+                    continue
+                return r, s
             except Exception as e:
                 self.security_logs.append(("fault_detection", f"异常检测: {str(e)}"))
         raise Exception("故障检测：多次尝试后仍无法生成有效签名")
+    def benchmark_fault_check_policies(self, count: int = 20) -> Dict[str, float]:
+        """各故障检测策略下的签名吞吐量（次/秒）"""
+        private_key, _ = self.generate_keypair()
+        self.fault_resistant_sign(b"warm up", private_key)
+        results = {}
+        for policy in FAULT_CHECK_POLICIES:
+            start = time.perf_counter()
+            for i in range(count):
+                self.fault_resistant_sign(b"benchmark %d" % i, private_key, policy)
+            results[policy] = count / (time.perf_counter() - start)
+        return results
     def side_channel_resistant_verify(self, message: bytes, signature: Tuple[int, int], public_key: Point) -> bool:
         """抗侧信道的验证算法"""
         if not self.side_channel_protection:
@@ -109,16 +177,14 @@ class SM2SecureImplementation(SM2):
         valid_s = self._constant_time_range_check(s, 1, self.n - 1)
         if not (valid_r and valid_s):
             return False
-        # 计算哈希
-        e = int.from_bytes(self.sm3_hash(message), 'big')
+        # 计算哈希 e = SM3(Z_A || M)
+        e = self.message_digest(message, public_key)
         # 常时间计算
         t = (r + s) % self.n
         if t == 0:
             return False
-        # 使用常时间点乘
-        point1 = self.constant_time_point_multiply(s, self.G)
-        point2 = self.constant_time_point_multiply(t, public_key)
-        point = self.point_add(point1, point2)
+        # 验证只涉及公开数据，使用交错双标量乘法
+        point = self.double_scalar_multiply(s, t, public_key, use_cache=True)
         if point.is_infinity:
             return False
         R = (e + point.x) % self.n
@@ -193,6 +259,26 @@ class SM2SecureImplementation(SM2):
         if not self.side_channel_resistant_verify(test_message, test_signature, public_key):
             raise Exception("密钥对验证失败")
         return private_key, public_key
+    def generate_secure_keypairs(self, count: int) -> List[Tuple[int, Point]]:
+        """批量生成安全的密钥对
+        私钥为秘密标量，公钥逐个由常时间阶梯计算（不走变时的批量查表），每个公钥都做曲线验证，
+        首个密钥对做完整的签名/验证自检
+        """
+        private_keys = []
+        while len(private_keys) < count:
+            private_key = int.from_bytes(secrets.token_bytes(32), 'big')
+            if 1 <= private_key < self.n:
+                private_keys.append(private_key)
+        public_keys = [self.secret_scalar_multiply(private_key, self.G) for private_key in private_keys]
+        for public_key in public_keys:
+            if public_key.is_infinity or not self.validate_point_on_curve(public_key):
+                raise ValueError("批量生成的公钥不在椭圆曲线上")
+        if private_keys:
+            test_message = b"Key validation test"
+            test_signature = self.fault_resistant_sign(test_message, private_keys[0])
+            if not self.side_channel_resistant_verify(test_message, test_signature, public_keys[0]):
+                raise Exception("密钥对验证失败")
+        return list(zip(private_keys, public_keys))
     def secure_hash_with_domain_separation(self, message: bytes, domain: str = "SM2-SIGN") -> bytes:
         """带域分离的安全哈希计算"""
         # 添加域分离以防止不同上下文的哈希碰撞
@@ -216,8 +302,11 @@ class SM2SecureImplementation(SM2):
                 old_r, r = r, old_r - quotient * r
                 old_s, s = s, old_s - quotient * s
         return old_s % m if old_r == 1 else None
-    def comprehensive_security_test(self) -> Dict:
-        """综合安全测试"""
+    def comprehensive_security_test(self, leakage_samples: Optional[int] = None) -> Dict:
+        """综合安全测试
+        侧信道一项默认只做400个样本的短时序检验，t统计量与阈值仅作参考，不计入通过与否；
+        给定leakage_samples（如dudect规模的20000）时才按该样本量检验并把是否泄露计入判定
+        """
         print("=== SM2安全实现综合测试 ===")
         test_results = {}
         # 测试1：密钥生成安全性
@@ -263,19 +352,20 @@ class SM2SecureImplementation(SM2):
         }
         # 测试4：侧信道防护
         print("4. 测试侧信道防护...")
-        timing_data = []
-        for _ in range(10):
-            start_time = time.time()
-            _ = self.side_channel_resistant_verify(message, sig1, public_key)
-            end_time = time.time()
-            timing_data.append(end_time - start_time)
-        # 计算时序一致性
-        avg_time = sum(timing_data) / len(timing_data)
-        variance = sum((t - avg_time) ** 2 for t in timing_data) / len(timing_data)
+        # 判定只看确定性的性质：防护开启且常时间点乘结果正确；短时序检验受机器负载影响，结果只作参考
+        k = self.secure_random_k(message, private_key)
+        ladder_correct = self.constant_time_point_multiply(k, public_key) == self.point_multiply(k, public_key)
+        # 固定标量与随机标量交错计时常时间点乘（Welch t检验）
+        leakage = leakage_test(type(self), "constant_time_point_multiply", samples=leakage_samples or 400,
+                               batch=200, fixed_scalar=private_key)
+        timing_verdict = leakage_samples is not None
         test_results["side_channel_protection"] = {
-            "success": variance < avg_time * 0.1,  # 方差应该较小
-            "average_time": avg_time,
-            "variance": variance
+            "success": self.side_channel_protection and ladder_correct and not (timing_verdict and leakage["leaky"]),
+            "average_time": (leakage["fixed_mean_ns"] + leakage["random_mean_ns"]) / 2e9,
+            "max_t": leakage["max_t"],
+            "t_threshold": T_THRESHOLD,
+            "samples": leakage["samples"],
+            "timing_verdict": timing_verdict
         }
         # 测试5：输入验证
         print("5. 测试输入验证...")
@@ -335,7 +425,7 @@ class SM2SecureImplementation(SM2):
 - **防护**: 抵御故障注入攻击
 ### 4. 侧信道防护
 - **状态**: {'✅ 有效' if test_results['side_channel_protection']['success'] else '❌ 需改进'}
-- **时序一致性**: {test_results['side_channel_protection']['variance']:.6f}
+- **时序泄露检测**: 最大|t| = {test_results['side_channel_protection']['max_t']:.2f}（{test_results['side_channel_protection']['samples']}个样本，阈值{test_results['side_channel_protection']['t_threshold']}，{'计入判定' if test_results['side_channel_protection']['timing_verdict'] else '仅供参考'}）
 - **功耗随机化**: ✅ 标量盲化技术
 - **防护**: 抵御功耗分析和时序攻击
 ### 5. 输入验证
@@ -346,7 +436,7 @@ class SM2SecureImplementation(SM2):
 - **防护**: 抵御无效曲线和扭曲攻击
 ## 性能评估
 - **密钥生成时间**: {test_results['secure_keygen']['time']:.4f}秒
-- **平均验证时间**: {test_results['side_channel_protection']['average_time']:.6f}秒
+- **平均点乘时间**: {test_results['side_channel_protection']['average_time']:.6f}秒
 - **安全日志条目**: {test_results['overall']['security_logs']}条
 ## 安全等级评估
 ### 总体安全性: {'🔒 高' if test_results['overall']['all_tests_passed'] else '⚠️ 中等'}
@@ -384,6 +474,9 @@ def demonstrate_secure_implementation():
     overall_status = "✅ 全部通过" if test_results["overall"]["all_tests_passed"] else "⚠️ 部分通过"
     print(f"overall: {overall_status}")
     # 生成安全报告
+    print("\n⏱️ 故障检测策略签名吞吐量:")
+    for policy, rate in secure_sm2.benchmark_fault_check_policies(count=5).items():
+        print(f"  {policy}: {rate:.1f} 签名/秒")
     print("\n📄 生成安全评估报告...")
     report = secure_sm2.generate_security_report(test_results)
     # 保存报告
@@ -0,0 +1,412 @@
+"""
+椭圆曲线离散对数求解
+并行Pollard rho：r-加法随机游走 + 可区分点碰撞检测，按进程分片，
+用于在小规模测试曲线上实际求解离散对数并测量攻击随核数和群规模的扩展性；
+大步小步法：截断x坐标的整数键存入有序array，批量仿射加法生成小步与大步，支持区间搜索
+作者: ESFJ-MoZhu
+日期: 2026-10-19
+"""
+import heapq
+import math
+import os
+import random
+import time
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional, Tuple
+from sm2_base import SM2, Point
+# r-加法游走的分区数（取x的低位作为分区号，须为2的幂）
+RHO_PARTITIONS = 32
+# 大步小步法小步表的默认内存上限（字节），每个表项8字节
+BSGS_MEMORY_BUDGET = 64 << 20
+# 批量仿射加法的宽度：每轮这么多个点共用一次求逆
+BSGS_BATCH = 256
+# 子群阶不超过此值时用大步小步法，否则用Pollard rho
+BSGS_MAX_ORDER = 1 << 36
+def is_probable_prime(n: int, rounds: int = 32) -> bool:
+    """Miller-Rabin素性检测"""
+    if n < 2:
+        return False
+    for q in (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37):
+        if n % q == 0:
+            return n == q
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    rng = random.Random(n)
+    for _ in range(rounds):
+        x = pow(rng.randrange(2, n - 1), d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+def _pollard_brent(n: int, rng: random.Random) -> int:
+    """Pollard-Brent rho找n的一个非平凡因子（n为合数）"""
+    if n % 2 == 0:
+        return 2
+    while True:
+        y, c, m = rng.randrange(1, n), rng.randrange(1, n), 128
+        g = r = q = 1
+        while g == 1:
+            x = y
+            for _ in range(r):
+                y = (y * y + c) % n
+            k = 0
+            while k < r and g == 1:
+                ys = y
+                for _ in range(min(m, r - k)):
+                    y = (y * y + c) % n
+                    q = q * abs(x - y) % n
+                g = math.gcd(q, n)
+                k += m
+            r *= 2
+        if g == n:
+            g = 1
+            while g == 1:
+                ys = (ys * ys + c) % n
+                g = math.gcd(abs(x - ys), n)
+        if g != n:
+            return g
+def factorize(n: int, seed: Optional[int] = None) -> Dict[int, int]:
+    """整数分解，返回 {素因子: 指数}：小素数试除后用Pollard-Brent rho拆分"""
+    factors: Dict[int, int] = {}
+    for q in (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37):
+        while n % q == 0:
+            factors[q] = factors.get(q, 0) + 1
+            n //= q
+    rng = random.Random(seed)
+    stack = [n] if n > 1 else []
+    while stack:
+        m = stack.pop()
+        if is_probable_prime(m):
+            factors[m] = factors.get(m, 0) + 1
+            continue
+        root = math.isqrt(m)
+        if root * root == m:
+            stack += [root, root]
+            continue
+        d = _pollard_brent(m, rng)
+        stack += [d, m // d]
+    return dict(sorted(factors.items()))
+def _affine_sum(p: int, powers: List[Tuple[int, int]], scalar: int,
+                acc: Optional[Tuple[int, int]] = None) -> Optional[Tuple[int, int]]:
+    """acc + scalar*X，powers[i] = 2^i * X 的仿射坐标；中途出现相同x（概率可忽略）时返回None"""
+    for i, (px, py) in enumerate(powers):
+        if not scalar >> i & 1:
+            continue
+        if acc is None:
+            acc = (px, py)
+            continue
+        ax, ay = acc
+        if ax == px:
+            return None
+        lam = (py - ay) * pow(px - ax, -1, p) % p
+        x3 = (lam * lam - ax - px) % p
+        acc = (x3, (lam * (ax - x3) - ay) % p)
+    return acc
+def _rho_walk(p: int, n: int, powers: Tuple[List[Tuple[int, int]], List[Tuple[int, int]]],
+              table: List[Tuple[int, int, int, int]], dp_bits: int, steps: int,
+              seed: int) -> Tuple[List[Tuple[int, int, int, int]], int, float, int]:
+    """工作进程：执行steps步r-加法游走，返回 (可区分点列表 [(x, y, a, b)], 实际步数, 耗时, 进程号)
+    每条游走从独立随机的 a*P + b*Q 出发（由 2^i*P、2^i*Q 的倍点表累加），每步加上分区表中的 c_j*P + d_j*Q，
+    x的第5位起连续dp_bits位为0即为可区分点
+    """
+    rng = random.Random(seed)
+    part_mask = RHO_PARTITIONS - 1
+    dp_mask = ((1 << dp_bits) - 1) << (RHO_PARTITIONS.bit_length() - 1)
+    max_walk = 20 << dp_bits
+    distinguished = []
+    begin = time.perf_counter()
+    done = 0
+    while done < steps:
+        a, b = rng.randrange(1, n), rng.randrange(1, n)
+        start = _affine_sum(p, powers[1], b, _affine_sum(p, powers[0], a))
+        if start is None:
+            continue
+        x, y = start
+        walk = 0
+        while walk < max_walk:
+            if not x & dp_mask:
+                distinguished.append((x, y, a % n, b % n))
+                break
+            mx, my, c, d = table[x & part_mask]
+            if x == mx:
+                # 命中 ±M_j（概率可忽略），放弃这条游走
+                break
+            lam = (my - y) * pow(mx - x, -1, p) % p
+            x3 = (lam * lam - x - mx) % p
+            y = (lam * (x - x3) - y) % p
+            x = x3
+            a += c
+            b += d
+            walk += 1
+        done += max(walk, 1)
+    return distinguished, done, time.perf_counter() - begin, os.getpid()
+def parallel_pollard_rho(curve: SM2, target: Point, base: Optional[Point] = None, workers: int = 1,
+                         dp_bits: Optional[int] = None, task_steps: int = 1 << 16,
+                         max_steps: Optional[int] = None, seed: Optional[int] = None,
+                         order: Optional[int] = None) -> Dict:
+    """并行Pollard rho求解 target = x * base（base默认为G，order为base的阶，默认curve.n，须为素数）
+    返回 {"log", "steps", "elapsed", "steps_per_sec", "workers", "distinguished_points", ...}，
+    max_steps用尽仍未碰撞时 log 为None
+    """
+    base = base or curve.G
+    n, p = order or curve.n, curve.p
+    if max_steps is not None:
+        task_steps = min(task_steps, max_steps)
+    rng = random.Random(seed)
+    if dp_bits is None:
+        # 每条游走期望长度 2^dp_bits，远小于期望总步数 sqrt(πn/2)
+        dp_bits = max(2, n.bit_length() // 4)
+    # 分区表 M_j = c_j*P + d_j*Q
+    table = []
+    while len(table) < RHO_PARTITIONS:
+        c, d = rng.randrange(1, n), rng.randrange(1, n)
+        M = curve.point_add(curve.point_multiply(c, base), curve.point_multiply(d, target))
+        if not M.is_infinity:
+            table.append((M.x, M.y, c, d))
+    # 倍点表 2^i*P、2^i*Q，工作进程据此为每条游走累加出独立的随机起点
+    powers: Tuple[List[Tuple[int, int]], List[Tuple[int, int]]] = ([], [])
+    for generator, column in zip((base, target), powers):
+        point = generator
+        for _ in range(n.bit_length()):
+            if point.is_infinity:
+                break
+            column.append((point.x, point.y))
+            point = curve.point_double(point)
+    seen: Dict[Tuple[int, int], Tuple[int, int]] = {}
+    per_worker: Dict[int, List[float]] = {}
+    result = {"log": None, "steps": 0, "distinguished_points": 0, "dp_bits": dp_bits, "collisions": 0}
+    def absorb(batch) -> Optional[int]:
+        """汇总一批可区分点并检查碰撞，求出对数时返回"""
+        points, steps, elapsed, pid = batch
+        result["steps"] += steps
+        stats = per_worker.setdefault(pid, [0, 0.0])
+        stats[0] += steps
+        stats[1] += elapsed
+        for x, y, a, b in points:
+            result["distinguished_points"] += 1
+            other = seen.get((x, y))
+            if other is None:
+                seen[(x, y)] = (a, b)
+                continue
+            # a1*P + b1*Q = a2*P + b2*Q  =>  log = (a1 - a2) / (b2 - b1) mod n
+            result["collisions"] += 1
+            a2, b2 = other
+            if (b2 - b) % n:
+                return (a - a2) * pow(b2 - b, -1, n) % n
+        return None
+    def args() -> tuple:
+        return p, n, powers, table, dp_bits, task_steps, rng.getrandbits(64)
+    begin = time.perf_counter()
+    if workers <= 1:
+        while result["log"] is None and (max_steps is None or result["steps"] < max_steps):
+            result["log"] = absorb(_rho_walk(*args()))
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            pending = {executor.submit(_rho_walk, *args()) for _ in range(workers)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if result["log"] is None:
+                        result["log"] = absorb(future.result())
+                finished = result["log"] is not None or (max_steps is not None and result["steps"] >= max_steps)
+                if finished:
+                    for future in pending:
+                        future.cancel()
+                    break
+                for _ in done:
+                    pending.add(executor.submit(_rho_walk, *args()))
+    elapsed = time.perf_counter() - begin
+    result["elapsed"] = elapsed
+    result["steps_per_sec"] = result["steps"] / elapsed if elapsed else 0.0
+    result["workers"] = {pid: steps / busy if busy else 0.0 for pid, (steps, busy) in per_worker.items()}
+    # 结果校验
+    if result["log"] is not None and curve.point_multiply(result["log"], base) != target:
+        result["log"] = None
+    return result
+def _batch_add_same(curve: SM2, xs: List[int], ys: List[int], tx: int, ty: int) -> Tuple[List[int], List[int]]:
+    """批量仿射加法：所有点都加上同一个点T，共用一次求逆；分母为0（±T）的个别点走一般点加
+    无穷远点以 (None, None) 表示，不参与批量求逆，O + T = T
+    """
+    p = curve.p
+    invs = curve.field.batch_inv([1 if x is None else tx - x for x in xs])
+    out_x, out_y = [], []
+    for x, y, inv in zip(xs, ys, invs):
+        if x is None:
+            out_x.append(tx)
+            out_y.append(ty)
+            continue
+        if inv is None:
+            R = curve.point_add(Point(x, y), Point(tx, ty))
+            # 结果为无穷远点时用 (None, None) 占位
+            out_x.append(R.x)
+            out_y.append(R.y)
+            continue
+        lam = (ty - y) * inv % p
+        x3 = (lam * lam - x - tx) % p
+        out_x.append(x3)
+        out_y.append((lam * (x - x3) - y) % p)
+    return out_x, out_y
+def baby_step_giant_step(curve: SM2, target: Point, low: int = 0, high: Optional[int] = None,
+                         base: Optional[Point] = None, memory_budget: int = BSGS_MEMORY_BUDGET,
+                         batch: int = BSGS_BATCH, order: Optional[int] = None) -> Dict:
+    """大步小步法在区间 [low, high) 内求解 target = x * base（order为base的阶，默认curve.n；high默认为阶）
+    小步表只存x坐标（同时覆盖±j），键为 (截断x << idx_bits) | j 的64位整数，排序后存入array('Q')二分查找；
+    表大小受memory_budget限制，超出时增加大步数。返回 {"log", "baby_steps", "giant_steps", "table_bytes", ...}
+    """
+    base = base or curve.G
+    n = order or curve.n
+    high = n if high is None else min(high, n)
+    width = high - low
+    if width <= 0:
+        raise ValueError("搜索区间为空")
+    begin = time.perf_counter()
+    # 小步覆盖 ±j (0 <= j <= m)，大步步长 s = 2m+1
+    m = min(math.isqrt(width) // 2 + 1, max(1, memory_budget // 8 - 1))
+    stride = 2 * m + 1
+    idx_bits = m.bit_length()
+    key_shift = 64 - idx_bits
+    x_shift = max(0, curve.p.bit_length() - key_shift)
+    # 小步 j*P (1 <= j <= m)：先顺序算出前batch个，之后每轮整体加上 batch*P
+    first = [base]
+    while len(first) < min(batch, m):
+        first.append(curve.point_add(first[-1], base))
+    xs, ys = [P.x for P in first], [P.y for P in first]
+    step = curve.point_multiply(len(first), base)
+    chunks = []
+    j = 1
+    while j <= m:
+        keys = array('Q', sorted(((x >> x_shift) << idx_bits) | (j + i) for i, x in enumerate(xs[:m - j + 1])
+                                 if x is not None))
+        chunks.append(keys)
+        j += len(xs)
+        if j <= m:
+            xs, ys = _batch_add_same(curve, xs, ys, step.x, step.y)
+    # 各批已排序，多路归并成一张有序表，避免构造完整的Python列表
+    table = array('Q', heapq.merge(*chunks)) if len(chunks) > 1 else chunks[0]
+    del chunks
+    idx_mask = (1 << idx_bits) - 1
+    result = {"log": None, "baby_steps": m, "giant_steps": 0, "table_bytes": table.itemsize * len(table),
+              "rejected_candidates": 0, "interval": (low, high)}
+    def check(candidate: int) -> bool:
+        """截断x可能误匹配，完整验证候选值"""
+        if low <= candidate < high and curve.point_multiply(candidate, base) == target:
+            result["log"] = candidate
+            return True
+        result["rejected_candidates"] += 1
+        return False
+    # 大步：G_i = target - (low + m)*P - i*s*P，命中 ±j*P 即 x = low + i*s + m ± j
+    start = curve.point_add(target, curve.point_multiply((n - low - m) % n, base))
+    giant_count = (width + stride - 1) // stride
+    neg_stride = curve.point_multiply(-stride % n, base)
+    lanes = [start]
+    while len(lanes) < min(batch, giant_count):
+        lanes.append(curve.point_add(lanes[-1], neg_stride))
+    lane_step = curve.point_multiply(-stride * len(lanes) % n, base)
+    gx, gy = [P.x for P in lanes], [P.y for P in lanes]
+    i = 0
+    while i < giant_count and result["log"] is None:
+        for lane, x in enumerate(gx[:giant_count - i]):
+            offset = low + (i + lane) * stride + m
+            if x is None:
+                # G_i = O，即 x = offset
+                if check(offset):
+                    break
+                continue
+            key = (x >> x_shift) << idx_bits
+            pos = bisect_left(table, key)
+            while pos < len(table) and table[pos] >> idx_bits == key >> idx_bits:
+                jj = table[pos] & idx_mask
+                if check(offset + jj) or check(offset - jj):
+                    break
+                pos += 1
+            if result["log"] is not None:
+                break
+        result["giant_steps"] += min(len(gx), giant_count - i)
+        i += len(gx)
+        if i < giant_count and result["log"] is None:
+            gx, gy = _batch_add_same(curve, gx, gy, lane_step.x, lane_step.y)
+    result["elapsed"] = time.perf_counter() - begin
+    return result
+def crt(residues: List[int], moduli: List[int]) -> Tuple[int, int]:
+    """中国剩余定理合并两两互素的同余式，返回 (x, M)"""
+    x, M = 0, 1
+    for r, m in zip(residues, moduli):
+        # x ≡ r (mod m)，x = x + M * t
+        t = (r - x) * pow(M, -1, m) % m
+        x += M * t
+        M *= m
+    return x % M, M
+def point_order(curve: SM2, P: Point, multiple: int, factors: Optional[Dict[int, int]] = None) -> int:
+    """已知 multiple * P = O 时求P的精确阶：对每个素因子尽量约去"""
+    factors = factors or factorize(multiple)
+    order = multiple
+    for q, e in factors.items():
+        for _ in range(e):
+            if not curve.point_multiply(order // q, P).is_infinity:
+                break
+            order //= q
+    return order
+def discrete_log(curve: SM2, target: Point, base: Point, order: int, workers: int = 1) -> Optional[int]:
+    """素数阶子群上的离散对数：阶较小时用大步小步法，否则用并行Pollard rho"""
+    if target.is_infinity:
+        return 0
+    if order <= BSGS_MAX_ORDER:
+        return baby_step_giant_step(curve, target, base=base, order=order)["log"]
+    return parallel_pollard_rho(curve, target, base=base, order=order, workers=workers)["log"]
+def pohlig_hellman(curve: SM2, target: Point, base: Optional[Point] = None, order: Optional[int] = None,
+                   factors: Optional[Dict[int, int]] = None, max_prime: int = 1 << 48, workers: int = 1) -> Dict:
+    """Pohlig-Hellman：在每个素数幂子群 q^e 内逐位求对数，再用CRT合并
+    order须为base的阶（默认curve.n）；大于max_prime的素因子跳过，此时只得到 x mod modulus。
+    返回 {"log"（全部子群求出时）, "residue", "modulus", "subgroups", "skipped", "elapsed"}
+    """
+    begin = time.perf_counter()
+    base = base or curve.G
+    order = order or curve.n
+    factors = factors or factorize(order)
+    residues, moduli, subgroups, skipped = [], [], [], []
+    for q, e in factors.items():
+        if q > max_prime:
+            skipped.append(q)
+            continue
+        start = time.perf_counter()
+        cofactor = order // q ** e
+        Pq = curve.point_multiply(cofactor, base)
+        Qq = curve.point_multiply(cofactor, target)
+        # gamma的阶为q；x = d_0 + d_1*q + ...，第i位由 q^(e-1-i) * (Qq - x*Pq) = d_i * gamma 求出
+        gamma = curve.point_multiply(q ** (e - 1), Pq)
+        x = 0
+        for i in range(e):
+            residual = curve.point_add(Qq, curve.point_multiply((q ** e - x) % q ** e, Pq))
+            digit = discrete_log(curve, curve.point_multiply(q ** (e - 1 - i), residual), gamma, q, workers)
+            if digit is None:
+                raise ValueError(f"目标点不在base生成的子群中（q={q}）")
+            x += digit * q ** i
+        residues.append(x)
+        moduli.append(q ** e)
+        subgroups.append({"prime": q, "exponent": e, "residue": x, "elapsed": time.perf_counter() - start})
+    residue, modulus = crt(residues, moduli)
+    log = residue if modulus == order else None
+    if log is not None and curve.point_multiply(log, base) != target:
+        raise ValueError("Pohlig-Hellman结果校验失败")
+    return {"log": log, "residue": residue, "modulus": modulus, "subgroups": subgroups, "skipped": skipped,
+            "elapsed": time.perf_counter() - begin}
+if __name__ == "__main__":
+    from sm2_toy_curves import ToyCurve
+    print("=== 并行Pollard rho扩展性测试 ===")
+    for bits in (32, 36, 40):
+        curve = ToyCurve.from_bits(bits)
+        secret = random.randrange(1, curve.n)
+        for workers in (1, os.cpu_count() or 1):
+            outcome = parallel_pollard_rho(curve, curve.base_point_multiply(secret), workers=workers)
+            per_worker = ", ".join(f"{rate:.0f}" for rate in outcome["workers"].values())
+            print(f"{bits}位, {workers}进程: 成功={outcome['log'] == secret}, 步数={outcome['steps']}, "
+                  f"耗时={outcome['elapsed']:.2f}s, 总计{outcome['steps_per_sec']:.0f}步/秒, 每进程[{per_worker}]步/秒")
@@ -0,0 +1,199 @@
+"""
+SM2素域运算层
+提供加、减、乘、平方、求逆等运算，并可统计运算次数；实际收益来自求逆（pow(a, -1, p)）与批量求逆。
+SM2素数的Solinas折叠约减solinas_reduce只作为微基准的对照项：CPython下逐字节码的折叠慢于C实现的大整数取模，
+任何运算路径都不使用它
+作者: ESFJ-MoZhu
+日期: 2026-10-19
+"""
+import random
+import time
+from typing import Dict, List, Optional
+# SM2推荐曲线的素数p
+SM2_P = 0xFFFFFFFEFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF00000000FFFFFFFFFFFFFFFF
+_MASK256 = (1 << 256) - 1
+def solinas_reduce(x: int) -> int:
+    """（仅供微基准对照）SM2素数的Solinas折叠约减：利用 2^256 ≡ 2^224 + 2^96 - 2^64 + 1 (mod p) 折叠高位，x须非负"""
+    h = x >> 256
+    while h:
+        # x = h * 2^256 + l ≡ l + h * (2^224 + 2^96 - 2^64 + 1)
+        x = (x & _MASK256) + (h << 224) + (h << 96) - (h << 64) + h
+        h = x >> 256
+    if x >= SM2_P:
+        x -= SM2_P
+    return x
+class SM2Field:
+    """素域GF(p)上的运算"""
+    def __init__(self, p: int = SM2_P):
+        self.p = p
+    def add(self, a: int, b: int) -> int:
+        """模加（输入已约减时只需一次条件减法）"""
+        c = a + b
+        if c >= self.p:
+            c -= self.p
+        return c
+    def sub(self, a: int, b: int) -> int:
+        """模减（输入已约减时只需一次条件加法）"""
+        c = a - b
+        if c < 0:
+            c += self.p
+        return c
+    def neg(self, a: int) -> int:
+        """模负"""
+        return self.p - a if a else 0
+    def mul(self, a: int, b: int) -> int:
+        """模乘"""
+        # CPython的大整数取模由C实现，对512位乘积比逐字节码的Solinas折叠（solinas_reduce）更快
+        return a * b % self.p
+    def sqr(self, a: int) -> int:
+        """模平方"""
+        return a * a % self.p
+    def inv(self, a: int) -> Optional[int]:
+        """模逆，0不可逆时返回None"""
+        try:
+            return pow(a, -1, self.p)
+        except ValueError:
+            return None
+    def batch_inv(self, values: List[int]) -> List[Optional[int]]:
+        """Montgomery批量求逆：n个元素只需一次求逆和约3n次乘法，0的位置返回None"""
+        p = self.p
+        prefix = []
+        acc = 1
+        for v in values:
+            if v % p:
+                acc = acc * v % p
+            prefix.append(acc)
+        inv = self.inv(acc)
+        result: List[Optional[int]] = [None] * len(values)
+        for i in range(len(values) - 1, -1, -1):
+            v = values[i]
+            if v % p == 0:
+                continue
+            result[i] = inv * (prefix[i - 1] if i else 1) % p
+            inv = inv * v % p
+        return result
+    def inv_fermat(self, a: int) -> int:
+        """费马小定理求逆 a^(p-2) mod p"""
+        return pow(a, self.p - 2, self.p)
+    def sqrt(self, a: int) -> Optional[int]:
+        """模平方根，a不是二次剩余时返回None"""
+        p = self.p
+        a %= p
+        if a == 0:
+            return 0
+        if p & 3 == 3:
+            # p ≡ 3 (mod 4)（SM2素数即是）：一次模幂 a^((p+1)/4)
+            y = pow(a, (p + 1) >> 2, p)
+            return y if y * y % p == a else None
+        if pow(a, (p - 1) >> 1, p) != 1:
+            return None
+        # Tonelli-Shanks
+        q, m = p - 1, 0
+        while q & 1 == 0:
+            q >>= 1
+            m += 1
+        z = 2
+        while pow(z, (p - 1) >> 1, p) != p - 1:
+            z += 1
+        c = pow(z, q, p)
+        t = pow(a, q, p)
+        y = pow(a, (q + 1) >> 1, p)
+        while t != 1:
+            i, t2 = 0, t
+            while t2 != 1:
+                t2 = t2 * t2 % p
+                i += 1
+            b = pow(c, 1 << (m - i - 1), p)
+            m = i
+            c = b * b % p
+            t = t * c % p
+            y = y * b % p
+        return y
+class CountingSM2Field(SM2Field):
+    """带运算计数的素域运算层"""
+    def __init__(self, p: int = SM2_P):
+        super().__init__(p)
+        self.reset_counts()
+    def reset_counts(self):
+        """清零运算计数"""
+        self.counts = {"add": 0, "sub": 0, "neg": 0, "mul": 0, "sqr": 0, "inv": 0}
+    def add(self, a: int, b: int) -> int:
+        self.counts["add"] += 1
+        return super().add(a, b)
+    def sub(self, a: int, b: int) -> int:
+        self.counts["sub"] += 1
+        return super().sub(a, b)
+    def neg(self, a: int) -> int:
+        self.counts["neg"] += 1
+        return super().neg(a)
+    def mul(self, a: int, b: int) -> int:
+        self.counts["mul"] += 1
+        return super().mul(a, b)
+    def sqr(self, a: int) -> int:
+        self.counts["sqr"] += 1
+        return super().sqr(a)
+    def inv(self, a: int) -> Optional[int]:
+        self.counts["inv"] += 1
+        return super().inv(a)
+    def batch_inv(self, values: List[int]) -> List[Optional[int]]:
+        # 一次求逆（经由inv计数）加上每个非零元素3次模乘
+        self.counts["mul"] += 3 * sum(1 for v in values if v % self.p)
+        return super().batch_inv(values)
+def _extended_euclid_inverse(a: int, m: int) -> Optional[int]:
+    """原SM2.mod_inverse中的扩展欧几里得求逆，作为基准"""
+    old_r, r = a % m, m
+    old_s, s = 1, 0
+    while r != 0:
+        quotient = old_r // r
+        old_r, r = r, old_r - quotient * r
+        old_s, s = s, old_s - quotient * s
+    return old_s % m if old_r == 1 else None
+def benchmark_field_operations(iterations: int = 20000, seed: Optional[int] = None) -> Dict:
+    """素域运算微基准：对比通用取模、Solinas折叠与运算层的乘法/平方/求逆
+    speedup为运算层相对基线的加速比，小于1时regression为True（乘法/平方的方法调用开销使其慢于内联 % p，
+    因此热点路径的点运算公式直接内联取模）
+    """
+    rng = random.Random(seed)
+    field = SM2Field()
+    p = field.p
+    xs = [rng.randrange(1, p) for _ in range(iterations)]
+    ys = [rng.randrange(1, p) for _ in range(iterations)]
+    inv_iterations = max(1, iterations // 20)
+    def timed(func) -> float:
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
+    results = {
+        "mul": {
+            "generic_mod": timed(lambda: [a * b % p for a, b in zip(xs, ys)]),
+            "solinas": timed(lambda: [solinas_reduce(a * b) for a, b in zip(xs, ys)]),
+            "field": timed(lambda: [field.mul(a, b) for a, b in zip(xs, ys)]),
+        },
+        "sqr": {
+            "generic_mod": timed(lambda: [pow(a, 2, p) for a in xs]),
+            "solinas": timed(lambda: [solinas_reduce(a * a) for a in xs]),
+            "field": timed(lambda: [field.sqr(a) for a in xs]),
+        },
+        "inv": {
+            "extended_euclid": timed(lambda: [_extended_euclid_inverse(a, p) for a in xs[:inv_iterations]]),
+            "fermat": timed(lambda: [field.inv_fermat(a) for a in xs[:inv_iterations]]),
+            "field": timed(lambda: [field.inv(a) for a in xs[:inv_iterations]]),
+        },
+    }
+    # 换算为每次运算的微秒数
+    for op, timings in results.items():
+        count = inv_iterations if op == "inv" else iterations
+        for name in timings:
+            timings[name] = timings[name] / count * 1e6
+    baselines = {"mul": "generic_mod", "sqr": "generic_mod", "inv": "extended_euclid"}
+    for op, timings in results.items():
+        timings["speedup"] = timings[baselines[op]] / timings["field"]
+        timings["regression"] = timings["speedup"] < 1
+    return results
+if __name__ == "__main__":
+    print("=== SM2素域运算微基准 (单位: 微秒/次) ===")
+    bench = benchmark_field_operations()
+    for op, timings in bench.items():
+        detail = ", ".join(f"{name}={value:.3f}" for name, value in timings.items() if name not in ("speedup", "regression"))
+        note = "（慢于基线）" if timings["regression"] else ""
+        print(f"{op}: {detail}, 加速比={timings['speedup']:.2f}x{note}")
@@ -0,0 +1,128 @@
+"""
+从SM2签名批量恢复公钥
+由 r = (e + x1) mod n 得 x1 = (r - e) mod n，提升为候选点R；由 k = s + (r + s)·d 得
+P = (r + s)^(-1)·(R - s·G)，每个候选点只需一次双标量乘法 u·G + v·R；
+批量求逆共用一次模逆，多进程并行时工作进程继承父进程已构建的固定基点表
+作者: ESFJ-MoZhu
+日期: 2026-10-19
+"""
+import os
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+from sm2_base import SM2, Point
+from sm2_field import SM2Field
+# 一条签名：(e, r, s) 或带R点y奇偶位的 (e, r, s, v)
+Signature = Tuple[int, ...]
+# 每个任务处理的签名条数
+RECOVERY_CHUNK = 256
+def _lift_candidates(sm2: SM2, x1: int, parity: Optional[int]) -> List[Point]:
+    """x坐标为 x1 或 x1 + n（小于p时）的曲线点；给出parity时只保留对应奇偶的y"""
+    p = sm2.p
+    fast_sqrt = p & 3 == 3
+    points = []
+    for x in (x1, x1 + sm2.n):
+        if x >= p:
+            continue
+        rhs = ((x * x + sm2.a) * x + sm2.b) % p
+        if fast_sqrt:
+            # p ≡ 3 (mod 4)：一次模幂求平方根，平方校验判断是否为二次剩余
+            y = pow(rhs, (p + 1) >> 2, p)
+            if y * y % p != rhs:
+                continue
+        else:
+            y = sm2.field.sqrt(rhs)
+            if y is None:
+                continue
+        for candidate in ((y,) if y == 0 else (y, p - y)):
+            if parity is None or candidate & 1 == parity:
+                points.append(Point(x, candidate))
+    return points
+def recover_public_key_candidates(sm2: SM2, signatures: Sequence[Signature]) -> List[List[Point]]:
+    """批量恢复每个签名的候选公钥：没有奇偶位时通常两个候选，给出v时唯一"""
+    n = sm2.n
+    # (r + s)^(-1) mod n 批量求逆
+    t_invs = SM2Field(n).batch_inv([(sig[1] + sig[2]) % n for sig in signatures])
+    results = []
+    for sig, t_inv in zip(signatures, t_invs):
+        e, r, s = sig[0], sig[1], sig[2]
+        parity = sig[3] if len(sig) > 3 else None
+        candidates = []
+        if t_inv is not None and 0 < r < n and 0 < s < n:
+            u = -s * t_inv % n
+            for R in _lift_candidates(sm2, (r - e) % n, parity):
+                P = sm2.double_scalar_multiply(u, t_inv, R)
+                if not P.is_infinity:
+                    candidates.append(P)
+        results.append(candidates)
+    return results
+# 工作进程内的SM2实例
+_worker_instances: Dict[type, SM2] = {}
+def _recover_chunk(sm2_class: type, signatures: Sequence[Signature]) -> List[List[Tuple[int, int]]]:
+    """工作进程：恢复一批签名的候选公钥，以坐标元组返回"""
+    sm2 = _worker_instances.get(sm2_class)
+    if sm2 is None:
+        sm2 = _worker_instances[sm2_class] = sm2_class()
+        # 候选点R都是一次性的，不进入公钥预计算表缓存
+        sm2.public_key_cache = None
+    return [[(P.x, P.y) for P in candidates] for candidates in recover_public_key_candidates(sm2, signatures)]
+def recover_public_keys(signatures: Sequence[Signature], workers: int = 1, chunk: int = RECOVERY_CHUNK,
+                        sm2_class: type = SM2) -> List[List[Point]]:
+    """并行批量恢复候选公钥；先在父进程构建固定基点表，fork出的工作进程直接共享"""
+    sm2_class().fixed_base_table()
+    chunks = [signatures[i:i + chunk] for i in range(0, len(signatures), chunk)]
+    if workers <= 1:
+        results = [_recover_chunk(sm2_class, part) for part in chunks]
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(_recover_chunk, [sm2_class] * len(chunks), chunks))
+    return [[Point(x, y) for x, y in candidates] for part in results for candidates in part]
+def index_signers(signatures: Sequence[Signature], workers: int = 1, chunk: int = RECOVERY_CHUNK) -> Dict:
+    """恢复并去重日志中的签名者身份，返回 公钥(压缩编码hex) -> 签名下标列表
+    带v的签名直接确定公钥；否则取在其他签名中也出现过的那个候选，仍无法区分的归入ambiguous
+    """
+    start_time = time.time()
+    sm2 = SM2()
+    candidates = recover_public_keys(signatures, workers, chunk)
+    encoded = [[sm2.encode_point(P).hex() for P in points] for points in candidates]
+    occurrences: Dict[str, int] = defaultdict(int)
+    for keys in encoded:
+        for key in set(keys):
+            occurrences[key] += 1
+    identities: Dict[str, List[int]] = defaultdict(list)
+    ambiguous, unrecoverable = [], []
+    for index, keys in enumerate(encoded):
+        if not keys:
+            unrecoverable.append(index)
+            continue
+        shared = [key for key in keys if occurrences[key] > 1]
+        if len(keys) == 1:
+            identities[keys[0]].append(index)
+        elif len(shared) == 1:
+            identities[shared[0]].append(index)
+        else:
+            ambiguous.append(index)
+    elapsed = time.time() - start_time
+    return {
+        "identities": dict(identities),
+        "ambiguous": ambiguous,
+        "unrecoverable": unrecoverable,
+        "signatures": len(signatures),
+        "elapsed": elapsed,
+        "signatures_per_sec": len(signatures) / elapsed if elapsed else 0.0,
+    }
+if __name__ == "__main__":
+    sm2 = SM2()
+    keys = [sm2.generate_keypair() for _ in range(50)]
+    signatures = []
+    for i in range(2000):
+        d, P = random.choice(keys)
+        message = b"log %d" % i
+        r, s, v = sm2.sign_recoverable(message, d)
+        signatures.append((sm2.message_digest(message, P), r, s) if i % 2 else (sm2.message_digest(message, P), r, s, v))
+    for workers in (1, os.cpu_count() or 1):
+        result = index_signers(signatures, workers=workers)
+        print(f"workers={workers}: {len(signatures)}个签名 -> {len(result['identities'])}个签名者，"
+              f"{len(result['ambiguous'])}个无法区分，{result['signatures_per_sec']:.0f}个/秒")
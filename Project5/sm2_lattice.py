@@ -0,0 +1,324 @@
+"""
+格基约化与SM2隐藏数问题（HNP）求解
+浮点Gram-Schmidt的LLL（精确整数基与Gram矩阵，浮点只用于μ与r），精度不足时退回整数LLL；
+BKZ-lite在LLL基础上对小块做枚举求最短向量；
+用泄露高位（或高位为0的偏移）随机数的SM2签名构造格，恢复私钥
+作者: ESFJ-MoZhu
+日期: 2026-10-19
+"""
+import random
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from sm2_base import SM2, Point
+def _dot(u: Sequence[int], v: Sequence[int]) -> int:
+    """整数向量内积"""
+    return sum(a * b for a, b in zip(u, v))
+class LatticeReductionError(ValueError):
+    """浮点约化因精度不足无法收敛"""
+class _FloatGSO:
+    """L²风格的Gram-Schmidt信息：精确整数Gram矩阵 + 浮点 μ、r"""
+    def __init__(self, basis: List[List[int]]):
+        self.basis = basis
+        d = len(basis)
+        self.gram = [[0] * d for _ in range(d)]
+        for i in range(d):
+            for j in range(i + 1):
+                self.gram[i][j] = self.gram[j][i] = _dot(basis[i], basis[j])
+        self.mu = [[0.0] * d for _ in range(d)]
+        self.r = [[0.0] * d for _ in range(d)]
+        # 与L²算法一样只在处理到第k行时才计算该行，此时前面的行已经LLL约化
+        self.update_row(0)
+    def update_row(self, k: int):
+        """由精确Gram矩阵重算第k行的 r[k][j]、μ[k][j]（Cholesky分解）"""
+        mu, r, g = self.mu, self.r, self.gram[k]
+        for j in range(k + 1):
+            acc = float(g[j])
+            for i in range(j):
+                acc -= mu[j][i] * r[k][i]
+            r[k][j] = acc
+            if j < k:
+                if r[j][j] <= 0:
+                    raise LatticeReductionError("Gram-Schmidt范数非正，浮点精度不足")
+                mu[k][j] = acc / r[j][j]
+    def refresh_gram_row(self, k: int):
+        """基向量k改变后更新Gram矩阵的第k行/列"""
+        b, gram = self.basis, self.gram
+        for j in range(len(b)):
+            gram[k][j] = gram[j][k] = _dot(b[k], b[j])
+    def swap(self, i: int, j: int):
+        """交换基向量i、j（Gram矩阵的行列随之交换）"""
+        b, gram = self.basis, self.gram
+        b[i], b[j] = b[j], b[i]
+        gram[i], gram[j] = gram[j], gram[i]
+        for row in gram:
+            row[i], row[j] = row[j], row[i]
+def _lll_float(basis: List[List[int]], delta: float, max_loops: int) -> List[List[int]]:
+    """浮点GSO的LLL（惰性尺寸约化，η = 0.51）"""
+    b = [list(row) for row in basis]
+    gso = _FloatGSO(b)
+    d = len(b)
+    k = 1
+    loops = 0
+    while k < d:
+        loops += 1
+        if loops > max_loops:
+            raise LatticeReductionError("浮点LLL未收敛")
+        # 尺寸约化：反复约化直到 |μ_kj| <= η，每轮后由精确Gram矩阵重算μ
+        for _ in range(64):
+            gso.update_row(k)
+            changed = False
+            for j in range(k - 1, -1, -1):
+                x = round(gso.mu[k][j])
+                if x:
+                    changed = True
+                    bj = b[j]
+                    b[k] = [u - x * v for u, v in zip(b[k], bj)]
+                    for i in range(j):
+                        gso.mu[k][i] -= x * gso.mu[j][i]
+                    gso.mu[k][j] -= x
+            if not changed:
+                break
+            gso.refresh_gram_row(k)
+        else:
+            raise LatticeReductionError("尺寸约化未收敛")
+        # Lovász条件
+        if gso.r[k][k] >= (delta - gso.mu[k][k - 1] ** 2) * gso.r[k - 1][k - 1]:
+            k += 1
+        else:
+            gso.swap(k - 1, k)
+            gso.update_row(k - 1)
+            k = max(k - 1, 1)
+    return b
+def _lll_integral(basis: List[List[int]], delta: Tuple[int, int] = (99, 100)) -> List[List[int]]:
+    """精确整数LLL（Cohen算法2.6.7，全部运算为整数），作为浮点版本的后备"""
+    b = [list(row) for row in basis]
+    n = len(b)
+    dn, dd = delta
+    d = [0] * (n + 1)
+    lam = [[0] * n for _ in range(n)]
+    d[0] = 1
+    d[1] = _dot(b[0], b[0])
+    for i in range(1, n):
+        for j in range(i + 1):
+            u = _dot(b[i], b[j])
+            for t in range(j):
+                u = (d[t + 1] * u - lam[i][t] * lam[j][t]) // d[t]
+            if j < i:
+                lam[i][j] = u
+            else:
+                d[i + 1] = u
+    def reduce(k: int, l: int):
+        if 2 * abs(lam[k][l]) > d[l + 1]:
+            q = (2 * lam[k][l] + d[l + 1]) // (2 * d[l + 1])
+            b[k] = [x - q * y for x, y in zip(b[k], b[l])]
+            lam[k][l] -= q * d[l + 1]
+            for i in range(l):
+                lam[k][i] -= q * lam[l][i]
+    k = 1
+    while k < n:
+        reduce(k, k - 1)
+        if dd * d[k + 1] * d[k - 1] < dn * d[k] * d[k] - dd * lam[k][k - 1] ** 2:
+            # 交换 b_k 与 b_{k-1}
+            b[k], b[k - 1] = b[k - 1], b[k]
+            for j in range(k - 1):
+                lam[k][j], lam[k - 1][j] = lam[k - 1][j], lam[k][j]
+            lmbda = lam[k][k - 1]
+            B = (d[k - 1] * d[k + 1] + lmbda * lmbda) // d[k]
+            for i in range(k + 1, n):
+                t = lam[i][k]
+                lam[i][k] = (d[k + 1] * lam[i][k - 1] - lmbda * t) // d[k]
+                lam[i][k - 1] = (B * t + lmbda * lam[i][k]) // d[k + 1]
+            d[k] = B
+            k = max(1, k - 1)
+        else:
+            for l in range(k - 2, -1, -1):
+                reduce(k, l)
+            k += 1
+    return b
+def lll_reduce(basis: List[List[int]], delta: float = 0.99) -> List[List[int]]:
+    """LLL约化：先用浮点GSO版本，精度不足时退回精确整数版本"""
+    try:
+        return _lll_float(basis, delta, max_loops=100 * len(basis) ** 3 + 1000)
+    except (LatticeReductionError, OverflowError, ZeroDivisionError):
+        return _lll_integral(basis, (round(delta * 100), 100))
+def _enumerate_block(mu: List[List[float]], r: List[List[float]], k: int, h: int,
+                     radius: float) -> Optional[List[int]]:
+    """Schnorr-Euchner枚举：投影块 [k, h) 内范数平方小于radius的最短非零向量的系数，没有返回None"""
+    size = h - k
+    x = [0] * size
+    best = None
+    bound = radius
+    def search(i: int, partial: float):
+        nonlocal best, bound
+        center = -sum(x[j] * mu[k + j][k + i] for j in range(i + 1, size))
+        rii = r[k + i][k + i]
+        # 按与中心的距离由近到远（之字形）遍历 x_i，超出当前界即可停止
+        first = round(center)
+        candidates = [first]
+        for step in range(1, 1 << 20):
+            lo, hi = first - step, first + step
+            if min((lo - center) ** 2, (hi - center) ** 2) * rii + partial >= bound:
+                break
+            candidates.extend((lo, hi) if center - first < 0 else (hi, lo))
+        for xi in candidates:
+            cost = partial + (xi - center) ** 2 * rii
+            if cost >= bound:
+                continue
+            x[i] = xi
+            if i:
+                search(i - 1, cost)
+            elif any(x):
+                best, bound = list(x), cost
+        x[i] = 0
+    search(size - 1, 0.0)
+    return best
+def bkz_reduce(basis: List[List[int]], block_size: int = 10, delta: float = 0.99,
+               max_tours: int = 8) -> List[List[int]]:
+    """BKZ-lite：LLL约化后逐块枚举投影格的最短向量并插入基中，直到一轮内没有改进
+    只插入某个系数为±1的向量（用它替换该基向量仍生成同一格），避免处理线性相关的生成组
+    """
+    b = lll_reduce(basis, delta)
+    d = len(b)
+    for _ in range(max_tours):
+        improved = False
+        for k in range(d - 1):
+            h = min(k + block_size, d)
+            gso = _FloatGSO(b[:h])
+            for i in range(1, h):
+                gso.update_row(i)
+            x = _enumerate_block(gso.mu, gso.r, k, h, delta * gso.r[k][k])
+            if x is None:
+                continue
+            pivot = next((i for i in range(len(x) - 1, -1, -1) if abs(x[i]) == 1), None)
+            if pivot is None:
+                continue
+            v = [sum(c * b[k + i][col] for i, c in enumerate(x) if c) for col in range(len(b[0]))]
+            del b[k + pivot]
+            b.insert(k, v)
+            b = lll_reduce(b, delta)
+            improved = True
+        if not improved:
+            break
+    return b
+def hnp_lattice(n: int, samples: Sequence[Tuple[int, int, int]],
+                unknown_bits: int) -> Tuple[List[List[int]], Dict]:
+    """由签名样本 (r, s, known) 构造HNP格，已知 k = known + b，0 <= b < 2^unknown_bits
+    SM2签名满足 k = s + (r + s)·d (mod n)，即 b_i = t_i·d + c_i，t_i = r_i + s_i，c_i = s_i - known_i；
+    以第一个样本消去d得 b_i = A_i·b_1 + C_i，再把 b_i 平移到 [-K, K) 后用嵌入技术构造 m+1 维格：
+    n·e_i (i = 2..m)、(1, A_2, ..., A_m, 0)、(0, C'_2, ..., C'_m, K)，短向量 ±(b_1 - K, ..., b_m - K, K)
+    """
+    t = [(r + s) % n for r, s, _ in samples]
+    c = [(s - known) % n for _, s, known in samples]
+    m = len(samples)
+    K = 1 << (unknown_bits - 1)
+    t1_inv = pow(t[0], -1, n)
+    A = [ti * t1_inv % n for ti in t]
+    C = [(c[i] - A[i] * c[0] + (A[i] - 1) * K) % n for i in range(m)]
+    basis = []
+    for i in range(1, m):
+        row = [0] * (m + 1)
+        row[i] = n
+        basis.append(row)
+    basis.append([1] + A[1:] + [0])
+    basis.append([0] + C[1:] + [K])
+    return basis, {"t1_inv": t1_inv, "c1": c[0], "K": K}
+def _verified_candidate(sm2: SM2, reduced: List[List[int]], meta: Dict, public_key: Point) -> Optional[int]:
+    """从约化基中嵌入坐标为 ±K 的行读出私钥候选，返回与公钥相符的那个"""
+    K = meta["K"]
+    for row in reduced:
+        if abs(row[-1]) == K:
+            b1 = (row[0] if row[-1] == K else -row[0]) + K
+            candidate = (b1 - meta["c1"]) * meta["t1_inv"] % sm2.n
+            if candidate and sm2.base_point_multiply(candidate) == public_key:
+                return candidate
+    return None
+def hnp_recover_private_key(sm2: SM2, samples: Sequence[Tuple[int, int, int]], unknown_bits: int,
+                            public_key: Point, block_size: int = 0) -> Dict:
+    """用泄露部分随机数的签名求解HNP恢复私钥，候选私钥用公钥验证
+    samples为 (r, s, known)，k - known ∈ [0, 2^unknown_bits)；高位泄露时known为高位，随机数偏小时known为0。
+    先做LLL，失败且block_size > 0时再做BKZ-lite
+    """
+    start_time = time.time()
+    n = sm2.n
+    # t = r + s ≡ 0 的样本不含私钥信息
+    samples = [sample for sample in samples if (sample[0] + sample[1]) % n]
+    if len(samples) < 2:
+        raise ValueError("HNP至少需要两个有效签名样本")
+    basis, meta = hnp_lattice(n, samples, unknown_bits)
+    result = {
+        "private_key": None,
+        "signatures": len(samples),
+        "unknown_bits": unknown_bits,
+        "dimension": len(basis),
+        "reduction": "lll",
+    }
+    reduced = lll_reduce(basis)
+    result["private_key"] = _verified_candidate(sm2, reduced, meta, public_key)
+    if result["private_key"] is None and block_size > 0:
+        result["reduction"] = f"bkz-{block_size}"
+        reduced = bkz_reduce(reduced, block_size)
+        result["private_key"] = _verified_candidate(sm2, reduced, meta, public_key)
+    result["success"] = result["private_key"] is not None
+    result["elapsed"] = time.time() - start_time
+    return result
+class _ChosenNonces:
+    """按sign的pool接口提供随机数，用于生成泄露高位的测试签名"""
+    def __init__(self, sm2: SM2, draw):
+        self.sm2 = sm2
+        self.draw = draw
+        self.last = None
+    def take(self) -> Tuple[int, Point]:
+        self.last = self.draw()
+        return self.last, self.sm2.base_point_multiply(self.last)
+def leaky_signatures(sm2: SM2, private_key: int, count: int, leaked_bits: int,
+                     biased: bool = False, seed: Optional[int] = None) -> List[Tuple[int, int, int]]:
+    """生成随机数高leaked_bits位泄露（biased为True时高位恒为0）的签名，返回HNP样本 (r, s, known)"""
+    rng = random.Random(seed)
+    unknown_bits = sm2.n.bit_length() - leaked_bits
+    if biased:
+        draw = lambda: rng.randrange(1, 1 << unknown_bits)
+    else:
+        draw = lambda: rng.randrange(1, sm2.n)
+    nonces = _ChosenNonces(sm2, draw)
+    samples = []
+    for i in range(count):
+        r, s = sm2.sign(f"HNP message {i}".encode(), private_key, pool=nonces)
+        known = 0 if biased else nonces.last >> unknown_bits << unknown_bits
+        samples.append((r, s, known))
+    return samples
+def benchmark_hnp(leaked_bits: Sequence[int] = (32, 24, 16), signature_counts: Optional[Dict[int, Sequence[int]]] = None,
+                  trials: int = 2, block_size: int = 0, seed: Optional[int] = None) -> List[Dict]:
+    """按泄露位数 × 签名数量统计HNP恢复成功率与平均耗时
+    signature_counts默认取信息论下限 ⌈256/l⌉ 附近的若干个值
+    """
+    sm2 = SM2()
+    rng = random.Random(seed)
+    rows = []
+    for bits in leaked_bits:
+        counts = (signature_counts or {}).get(bits)
+        if counts is None:
+            minimum = -(-sm2.n.bit_length() // bits)
+            counts = sorted({minimum, minimum + max(2, minimum // 4), minimum + max(4, minimum // 2)})
+        for count in counts:
+            successes = 0
+            elapsed = 0.0
+            for _ in range(trials):
+                private_key = rng.randrange(1, sm2.n)
+                samples = leaky_signatures(sm2, private_key, count, bits, seed=rng.getrandbits(32))
+                result = hnp_recover_private_key(sm2, samples, sm2.n.bit_length() - bits,
+                                                 sm2.public_key_of(private_key), block_size)
+                successes += result["private_key"] == private_key
+                elapsed += result["elapsed"]
+            rows.append({
+                "leaked_bits": bits,
+                "signatures": count,
+                "dimension": count + 1,
+                "success_rate": successes / trials,
+                "avg_time": elapsed / trials,
+            })
+    return rows
+if __name__ == "__main__":
+    print(f"{'泄露位数':>8} {'签名数':>6} {'维数':>4} {'成功率':>6} {'平均耗时(s)':>12}")
+    for row in benchmark_hnp(seed=2026):
+        print(f"{row['leaked_bits']:>8} {row['signatures']:>6} {row['dimension']:>4} "
+              f"{row['success_rate']:>6.0%} {row['avg_time']:>12.3f}")
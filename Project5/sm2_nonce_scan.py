@@ -0,0 +1,226 @@
+"""
+SM2签名语料的随机数重用扫描
+流式读取 (公钥, e, r, s) 记录（JSONL/CSV/二进制），按派生值 x1 = (r - e) mod n 分区落盘，
+再逐分区以 (公钥, x1) 为键建立哈希索引检测重复的k，发现重用时直接恢复私钥；
+内存占用由分区大小决定，读取与检测两阶段均可多进程并行
+作者: ESFJ-MoZhu
+日期: 2026-10-19
+"""
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from sm2_base import SM2
+# 一条签名记录：(公钥编码, e, r, s)
+Record = Tuple[bytes, int, int, int]
+# 落盘记录：压缩公钥(33) || x1(32) || r(32) || s(32)
+SPILL_RECORD_SIZE = 33 + 32 * 3
+# 默认分区数：每个分区的索引需能放入内存
+DEFAULT_PARTITIONS = 64
+def derived_x1(n: int, e: int, r: int) -> int:
+    """由 r = (e + x1) mod n 得到 k*G 的x坐标（模n）；同一个k（或-k）必然得到相同的x1"""
+    return (r - e) % n
+def recover_key_from_reused_nonce(n: int, sig1: Tuple[int, int], sig2: Tuple[int, int],
+                                  negated: bool = False) -> Optional[int]:
+    """两个签名使用同一k时由 k = s + (r + s)·d 消去k：d = (s2 - s1) / (s1 - s2 + r1 - r2)
+    negated为True时按 k2 = -k1 求解：d = -(s1 + s2) / (r1 + s1 + r2 + s2)，分母为0时返回None
+    """
+    (r1, s1), (r2, s2) = sig1, sig2
+    if negated:
+        numerator, denominator = -(s1 + s2), r1 + s1 + r2 + s2
+    else:
+        numerator, denominator = s2 - s1, s1 - s2 + r1 - r2
+    if denominator % n == 0:
+        return None
+    return numerator * pow(denominator, -1, n) % n
+def _normalize_public_key(data: bytes) -> bytes:
+    """统一为压缩编码，未压缩编码只需取y的奇偶位，无需求平方根"""
+    if len(data) == 65 and data[0] == 4:
+        return bytes([2 | (data[-1] & 1)]) + data[1:33]
+    if len(data) == 33 and data[0] in (2, 3):
+        return data
+    raise ValueError("公钥编码格式错误")
+def _parse_int(value) -> int:
+    """JSONL/CSV中的整数可以是十进制整数或十六进制字符串"""
+    return value if isinstance(value, int) else int(value, 16)
+def read_records(path: str) -> Iterator[Record]:
+    """按扩展名流式读取记录：.jsonl、.csv（表头 public_key,e,r,s）或 .bin（write_records写出的二进制格式）"""
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    yield (bytes.fromhex(item["public_key"]), _parse_int(item["e"]),
+                           _parse_int(item["r"]), _parse_int(item["s"]))
+    elif path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                yield bytes.fromhex(row["public_key"]), _parse_int(row["e"]), _parse_int(row["r"]), _parse_int(row["s"])
+    elif path.endswith(".bin"):
+        # 每条记录：公钥长度(1) || 公钥 || e(32) || r(32) || s(32)
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(1)
+                if not header:
+                    break
+                body = f.read(header[0] + 96)
+                if len(body) != header[0] + 96:
+                    raise ValueError("二进制记录不完整")
+                key, rest = body[:header[0]], body[header[0]:]
+                yield (key, int.from_bytes(rest[:32], "big"), int.from_bytes(rest[32:64], "big"),
+                       int.from_bytes(rest[64:], "big"))
+    else:
+        raise ValueError(f"不支持的记录文件格式: {path}")
+def write_records(path: str, records: Iterable[Record]):
+    """按扩展名写出记录（格式同read_records），用于生成测试语料"""
+    if path.endswith(".jsonl"):
+        with open(path, "w", encoding="utf-8") as f:
+            for key, e, r, s in records:
+                f.write(json.dumps({"public_key": key.hex(), "e": f"{e:x}", "r": f"{r:x}", "s": f"{s:x}"}) + "\n")
+    elif path.endswith(".csv"):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["public_key", "e", "r", "s"])
+            for key, e, r, s in records:
+                writer.writerow([key.hex(), f"{e:x}", f"{r:x}", f"{s:x}"])
+    elif path.endswith(".bin"):
+        with open(path, "wb") as f:
+            for key, e, r, s in records:
+                f.write(bytes([len(key)]) + key + e.to_bytes(32, "big") + r.to_bytes(32, "big") + s.to_bytes(32, "big"))
+    else:
+        raise ValueError(f"不支持的记录文件格式: {path}")
+def _partition_file(path: str, spill_dir: str, partitions: int, tag: int, n: int) -> Tuple[int, int]:
+    """阶段一（工作进程）：读取一个输入文件，按 x1 mod partitions 追加写入本进程专属的分区文件
+    返回 (有效记录数, 跳过的无效记录数)
+    """
+    outputs = [open(os.path.join(spill_dir, f"part-{i:04d}-{tag:04d}.bin"), "wb") for i in range(partitions)]
+    count = skipped = 0
+    try:
+        for key, e, r, s in read_records(path):
+            if not (0 < r < n and 0 < s < n):
+                skipped += 1
+                continue
+            try:
+                key = _normalize_public_key(key)
+            except ValueError:
+                skipped += 1
+                continue
+            x1 = derived_x1(n, e, r)
+            outputs[x1 % partitions].write(key + x1.to_bytes(32, "big") + r.to_bytes(32, "big") + s.to_bytes(32, "big"))
+            count += 1
+    finally:
+        for output in outputs:
+            output.close()
+    return count, skipped
+def _scan_partition(paths: Sequence[str]) -> List[Dict]:
+    """阶段二（工作进程）：对一个分区的全部落盘文件建立 (公钥, x1) -> (r, s) 索引，碰撞即尝试恢复私钥"""
+    sm2 = SM2()
+    n = sm2.n
+    index: Dict[bytes, bytes] = {}
+    findings: Dict[bytes, Dict] = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            while True:
+                record = f.read(SPILL_RECORD_SIZE)
+                if not record:
+                    break
+                slot, signature = record[:65], record[65:]
+                previous = index.setdefault(slot, signature)
+                if previous == signature:
+                    continue
+                key = slot[:33]
+                finding = findings.get(key)
+                if finding is not None:
+                    finding["reused_signatures"] += 1
+                    continue
+                sig1 = (int.from_bytes(previous[:32], "big"), int.from_bytes(previous[32:], "big"))
+                sig2 = (int.from_bytes(signature[:32], "big"), int.from_bytes(signature[32:], "big"))
+                # 相同x1可能来自同一个k，也可能来自 -k，用公钥校验
+                for negated in (False, True):
+                    d = recover_key_from_reused_nonce(n, sig1, sig2, negated)
+                    if d and sm2.encode_point(sm2.base_point_multiply(d)) == key:
+                        findings[key] = {
+                            "public_key": key.hex(),
+                            "private_key": d,
+                            "x1": int.from_bytes(slot[33:], "big"),
+                            "signatures": [sig1, sig2],
+                            "negated_nonce": negated,
+                            "reused_signatures": 2,
+                        }
+                        break
+    return list(findings.values())
+def scan_for_nonce_reuse(paths: Sequence[str], partitions: int = DEFAULT_PARTITIONS, workers: int = 1,
+                         spill_dir: Optional[str] = None) -> Dict:
+    """扫描签名语料中重用的随机数并恢复对应私钥
+    阶段一按输入文件并行分区落盘，阶段二按分区并行检测；每个工作进程任一时刻只持有一个分区的索引
+    """
+    start_time = time.time()
+    n = SM2().n
+    with tempfile.TemporaryDirectory(dir=spill_dir) as directory:
+        jobs = [(path, directory, partitions, tag, n) for tag, path in enumerate(paths)]
+        if workers <= 1:
+            counts = [_partition_file(*job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(workers) as executor:
+                counts = list(executor.map(_partition_file, *zip(*jobs)))
+        partitioned = time.time()
+        groups = [[os.path.join(directory, f"part-{i:04d}-{tag:04d}.bin") for tag in range(len(paths))]
+                  for i in range(partitions)]
+        if workers <= 1:
+            results = [_scan_partition(group) for group in groups]
+        else:
+            with ProcessPoolExecutor(workers) as executor:
+                results = list(executor.map(_scan_partition, groups))
+    records = sum(count for count, _ in counts)
+    elapsed = time.time() - start_time
+    findings = [finding for result in results for finding in result]
+    return {
+        "records": records,
+        "skipped": sum(skipped for _, skipped in counts),
+        "compromised_keys": len(findings),
+        "findings": findings,
+        "partitions": partitions,
+        "workers": workers,
+        "partition_time": partitioned - start_time,
+        "elapsed": elapsed,
+        "records_per_sec": records / elapsed if elapsed else 0.0,
+    }
+def generate_corpus(sm2: SM2, keys: int, signatures_per_key: int, reused_keys: int = 1,
+                    seed: Optional[int] = None) -> Tuple[List[Record], Dict[bytes, int]]:
+    """生成测试语料：前reused_keys个密钥的最后一个签名重用了第一个签名的k，返回 (记录, 公钥 -> 私钥)"""
+    rng = random.Random(seed)
+    records: List[Record] = []
+    private_keys: Dict[bytes, int] = {}
+    for index in range(keys):
+        d = rng.randrange(1, sm2.n)
+        public_key = sm2.public_key_of(d)
+        encoded = sm2.encode_point(public_key, compressed=index % 2 == 0)
+        private_keys[sm2.encode_point(public_key)] = d
+        nonces = [rng.randrange(1, sm2.n) for _ in range(signatures_per_key)]
+        if index < reused_keys and signatures_per_key > 1:
+            nonces[-1] = nonces[0]
+        for i, k in enumerate(nonces):
+            e = sm2.message_digest(f"log entry {index}-{i}".encode(), public_key)
+            r = (e + sm2.base_point_multiply(k).x) % sm2.n
+            s = pow(1 + d, -1, sm2.n) * (k - r * d) % sm2.n
+            records.append((encoded, e, r, s))
+    rng.shuffle(records)
+    return records, private_keys
+if __name__ == "__main__":
+    sm2 = SM2()
+    records, private_keys = generate_corpus(sm2, 500, 20, reused_keys=5, seed=2026)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i, extension in enumerate(("jsonl", "csv", "bin")):
+            path = os.path.join(directory, f"signatures-{i}.{extension}")
+            write_records(path, records[i::3])
+            paths.append(path)
+        for workers in (1, os.cpu_count() or 1):
+            result = scan_for_nonce_reuse(paths, workers=workers)
+            recovered = sum(private_keys[bytes.fromhex(f["public_key"])] == f["private_key"] for f in result["findings"])
+            print(f"workers={workers}: {result['records']}条记录，{result['records_per_sec']:.0f}条/秒，"
+                  f"发现{result['compromised_keys']}个私钥（正确{recovered}个）")
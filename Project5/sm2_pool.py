@@ -0,0 +1,140 @@
+"""
+SM2临时密钥对预计算池
+后台线程（可选进程池）批量预计算 (r, R = r*G)，握手与签名时直接取用
+作者: ESFJ-MoZhu
+日期: 2026-10-19
+"""
+import queue
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Tuple, Type
+from sm2_base import SM2, Point
+# 工作进程内按实现类缓存的SM2实例（固定基点表每个进程只构建一次）
+_worker_instances: Dict[type, SM2] = {}
+def _generate_batch(sm2_class: Type[SM2], count: int) -> List[Tuple[int, Point]]:
+    """工作进程：生成一批 (r, r*G)，批量计算共用求逆"""
+    sm2 = _worker_instances.get(sm2_class)
+    if sm2 is None:
+        sm2 = _worker_instances[sm2_class] = sm2_class()
+    scalars = [secrets.randbelow(sm2.n - 1) + 1 for _ in range(count)]
+    return list(zip(scalars, sm2.public_keys_from_private(scalars)))
+class EphemeralKeyPool:
+    """后台预计算的临时密钥对池，每个密钥对只会被取出一次
+    processes > 0 时由进程池生成，避免与取用线程争用GIL
+    """
+    def __init__(self, sm2: SM2, capacity: int = 256, batch_size: int = 32, processes: int = 0):
+        self.sm2 = sm2
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.processes = processes
+        self._queue: "queue.Queue[Tuple[int, Point]]" = queue.Queue(maxsize=capacity)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+    def _random_scalar(self) -> int:
+        """使用密码学安全随机数生成 r ∈ [1, n-1]"""
+        return secrets.randbelow(self.sm2.n - 1) + 1
+    def _batches(self) -> Iterator[List[Tuple[int, Point]]]:
+        """源源不断地产生密钥对批次：本线程计算，或保持每个工作进程一个在途任务"""
+        if self.processes <= 0:
+            while True:
+                scalars = [self._random_scalar() for _ in range(self.batch_size)]
+                yield list(zip(scalars, self.sm2.public_keys_from_private(scalars)))
+        executor = ProcessPoolExecutor(self.processes)
+        try:
+            sm2_class = type(self.sm2)
+            pending = deque(executor.submit(_generate_batch, sm2_class, self.batch_size)
+                            for _ in range(self.processes))
+            while True:
+                batch = pending.popleft().result()
+                pending.append(executor.submit(_generate_batch, sm2_class, self.batch_size))
+                yield batch
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+    def _fill(self):
+        """后台线程：批量生成密钥对（共用求逆），队列满时阻塞等待消耗，消耗后立即补充"""
+        batches = self._batches()
+        try:
+            for batch in batches:
+                if self._stop.is_set():
+                    break
+                self._enqueue(batch)
+        finally:
+            batches.close()
+    def _enqueue(self, batch: List[Tuple[int, Point]]):
+        """逐个放入队列；停止时丢弃未放入的密钥对"""
+        for pair in batch:
+            while not self._stop.is_set():
+                try:
+                    self._queue.put(pair, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            else:
+                return
+            with self._lock:
+                self.generated += 1
+    def start(self) -> "EphemeralKeyPool":
+        """启动后台预计算线程"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._fill, name="sm2-ephemeral-pool", daemon=True)
+            self._thread.start()
+        return self
+    def stop(self):
+        """停止后台线程"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    def __enter__(self) -> "EphemeralKeyPool":
+        return self.start()
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+    def take(self) -> Tuple[int, Point]:
+        """取出一个临时密钥对，池空时在当前线程内联计算"""
+        try:
+            pair = self._queue.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                self.misses += 1
+            r = self._random_scalar()
+            return r, self.sm2.base_point_multiply(r)
+        with self._lock:
+            self.hits += 1
+        return pair
+    def stats(self) -> Dict[str, float]:
+        """池深度与命中率"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {"depth": self._queue.qsize(), "capacity": self.capacity, "generated": self.generated,
+                    "hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+def benchmark_pooled_signing(count: int = 200, capacity: int = 256, processes: int = 0) -> Dict:
+    """对比内联签名与离线/在线签名的每次签名耗时（毫秒），在线阶段开始前先填满池"""
+    sm2 = SM2()
+    private_key, _ = sm2.generate_keypair()
+    messages = [b"message %d" % i for i in range(count)]
+    start = time.perf_counter()
+    for message in messages:
+        sm2.sign(message, private_key)
+    inline = (time.perf_counter() - start) / count * 1000
+    with EphemeralKeyPool(sm2, capacity=capacity, processes=processes) as pool:
+        while pool.stats()["depth"] < min(capacity, count):
+            time.sleep(0.01)
+        start = time.perf_counter()
+        for message in messages:
+            sm2.sign(message, private_key, pool=pool)
+        pooled = (time.perf_counter() - start) / count * 1000
+    return {"inline_ms": inline, "pooled_ms": pooled, "speedup": inline / pooled, "pool": pool.stats()}
+if __name__ == "__main__":
+    print("=== 离线/在线签名基准 (单位: 毫秒/次) ===")
+    for workers in (0, 2):
+        bench = benchmark_pooled_signing(processes=workers)
+        print(f"processes={workers}: 内联={bench['inline_ms']:.3f}, 预计算池={bench['pooled_ms']:.3f}, "
+              f"加速比={bench['speedup']:.2f}x, 命中率={bench['pool']['hit_rate']:.2%}")
@@ -0,0 +1,217 @@
+"""
+SM2标量乘法的功耗轨迹模拟与相关功耗分析（CPA/DPA）
+插桩所选实现的点运算，按其实际执行的运算序列生成汉明重量泄露 + 高斯噪声的轨迹（NumPy向量化），
+轨迹可直接写入内存映射的.npy文件；CPA/DPA按块流式计算，支持大于内存的轨迹集
+作者: ESFJ-MoZhu
+日期: 2026-10-19
+"""
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+import numpy as np
+from sm2_base import SM2, SM2Montgomery, Point
+# 被插桩的点运算及其固定功耗偏置（不同运算的功耗水平不同，这正是SPA可以区分加法与倍点的原因）
+LEAKY_OPERATIONS: Dict[str, float] = {
+    "point_add": 40.0,
+    "point_double": 20.0,
+    "_jacobian_add_affine": 40.0,
+    "_jacobian_add": 48.0,
+    "_jacobian_double": 24.0,
+    "_xycz_add": 36.0,
+    "_xycz_addc": 44.0,
+}
+# DPA选择函数：中间点x坐标的汉明重量是否超过其期望（256位坐标的一半）
+DPA_HW_THRESHOLD = 128
+# 流式CPA/DPA每块处理的轨迹条数
+TRACE_CHUNK = 8192
+class _TraceComplete(Exception):
+    """已记录到所需的运算个数，提前结束本次标量乘法"""
+def _recording_method(name: str, offset: float):
+    """包装点运算：记录输出x（或雅可比X）坐标的汉明重量"""
+    def method(self, *args):
+        result = getattr(super(type(self), self), name)(*args)
+        x = result.x if isinstance(result, Point) else result[0]
+        self._leakage.append(offset + (x or 0).bit_count())
+        self._operations.append(name)
+        if len(self._leakage) >= self._limit:
+            raise _TraceComplete
+        return result
+    return method
+_recording_classes: Dict[type, type] = {}
+def _recording_class(sm2_class: Type[SM2]) -> type:
+    """生成sm2_class的插桩子类，只包装该实现实际具有的点运算"""
+    cls = _recording_classes.get(sm2_class)
+    if cls is None:
+        methods = {name: _recording_method(name, offset)
+                   for name, offset in LEAKY_OPERATIONS.items() if hasattr(sm2_class, name)}
+        cls = _recording_classes[sm2_class] = type(f"Recording{sm2_class.__name__}", (sm2_class,), methods)
+    return cls
+class TraceSet:
+    """一组功耗轨迹：traces为 (轨迹数, 采样点数) 的float32数组或内存映射，
+    inputs为对应的已知输入点 (轨迹数, 64) 的 x||y 大端字节，operations为每个采样点对应的运算名
+    """
+    def __init__(self, traces: np.ndarray, inputs: np.ndarray, operations: Sequence[str]):
+        self.traces = traces
+        self.inputs = inputs
+        self.operations = list(operations)
+    def __len__(self) -> int:
+        return self.traces.shape[0]
+    def points(self) -> List[Point]:
+        """还原已知输入点"""
+        return [Point(int.from_bytes(row[:32].tobytes(), "big"), int.from_bytes(row[32:].tobytes(), "big"))
+                for row in self.inputs]
+    def save(self, prefix: str):
+        """保存为 prefix.traces.npy、prefix.inputs.npy、prefix.ops.npy"""
+        # 直接写入内存映射文件的轨迹无需再保存一次
+        if getattr(self.traces, "filename", None) != os.path.abspath(f"{prefix}.traces.npy"):
+            np.save(f"{prefix}.traces.npy", self.traces)
+        np.save(f"{prefix}.inputs.npy", self.inputs)
+        np.save(f"{prefix}.ops.npy", np.array(self.operations))
+    @classmethod
+    def load(cls, prefix: str, mmap: bool = True) -> "TraceSet":
+        """读取轨迹集，mmap为True时轨迹以只读内存映射方式打开"""
+        traces = np.load(f"{prefix}.traces.npy", mmap_mode="r" if mmap else None)
+        return cls(traces, np.load(f"{prefix}.inputs.npy"), np.load(f"{prefix}.ops.npy").tolist())
+def simulate_traces(sm2_class: Type[SM2], scalar: int, count: int, samples: int = 32,
+                    noise: float = 16.0, method: str = "point_multiply", seed: Optional[int] = None,
+                    path: Optional[str] = None, chunk: int = TRACE_CHUNK) -> TraceSet:
+    """对 count 个随机已知输入点P运行 sm2_class 的 method(scalar, P)，记录前samples次点运算的泄露
+    泄露模型：运算偏置 + 输出坐标汉明重量 + N(0, noise²)；path给出时轨迹直接写入 path.traces.npy 的内存映射
+    """
+    rng = np.random.default_rng(seed)
+    plain = SM2()
+    recorder = _recording_class(sm2_class)()
+    operation = getattr(recorder, method)
+    if path is None:
+        traces = np.empty((count, samples), dtype=np.float32)
+    else:
+        traces = np.lib.format.open_memmap(f"{path}.traces.npy", mode="w+", dtype=np.float32,
+                                           shape=(count, samples))
+    inputs = np.empty((count, 64), dtype=np.uint8)
+    operations: List[str] = []
+    for begin in range(0, count, chunk):
+        size = min(chunk, count - begin)
+        # 已知输入点用未插桩的实例批量生成
+        scalars = [int.from_bytes(rng.bytes(32), "big") % (plain.n - 1) + 1 for _ in range(size)]
+        clean = np.zeros((size, samples), dtype=np.float64)
+        for i, P in enumerate(plain.public_keys_from_private(scalars)):
+            recorder._leakage, recorder._operations, recorder._limit = [], [], samples
+            try:
+                operation(scalar, P)
+            except _TraceComplete:
+                pass
+            leakage = recorder._leakage
+            clean[i, :len(leakage)] = leakage
+            if len(recorder._operations) > len(operations):
+                operations = recorder._operations
+            inputs[begin + i] = np.frombuffer(plain.encode_point(P, compressed=False)[1:], dtype=np.uint8)
+        traces[begin:begin + size] = clean + rng.normal(0.0, noise, clean.shape)
+    if path is not None:
+        traces.flush()
+    trace_set = TraceSet(traces, inputs, operations)
+    if path is not None:
+        trace_set.save(path)
+    return trace_set
+def cpa(traces: np.ndarray, hypotheses: np.ndarray, chunk: int = TRACE_CHUNK) -> np.ndarray:
+    """相关功耗分析：hypotheses为 (轨迹数, 猜测数) 的预测泄露，返回 (猜测数, 采样点数) 的Pearson相关系数
+    按块累加 Σt、Σt²、Σh、Σh²、Σh·t，轨迹可以是内存映射
+    """
+    n, samples = traces.shape
+    guesses = hypotheses.shape[1]
+    sum_t = np.zeros(samples)
+    sum_t2 = np.zeros(samples)
+    sum_ht = np.zeros((guesses, samples))
+    for begin in range(0, n, chunk):
+        block = np.asarray(traces[begin:begin + chunk], dtype=np.float64)
+        h = np.asarray(hypotheses[begin:begin + chunk], dtype=np.float64)
+        sum_t += block.sum(axis=0)
+        sum_t2 += np.einsum("ij,ij->j", block, block)
+        sum_ht += h.T @ block
+    h = np.asarray(hypotheses, dtype=np.float64)
+    sum_h = h.sum(axis=0)
+    sum_h2 = np.einsum("ij,ij->j", h, h)
+    numerator = n * sum_ht - np.outer(sum_h, sum_t)
+    denominator = np.sqrt(np.outer(n * sum_h2 - sum_h ** 2, n * sum_t2 - sum_t ** 2))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(denominator > 0, numerator / denominator, 0.0)
+def dpa(traces: np.ndarray, selection: np.ndarray, chunk: int = TRACE_CHUNK) -> np.ndarray:
+    """差分功耗分析：selection为 (轨迹数, 猜测数) 的布尔选择位，返回 (猜测数, 采样点数) 的均值差 μ1 - μ0"""
+    n, samples = traces.shape
+    selection = np.asarray(selection, dtype=np.float64)
+    sum_all = np.zeros(samples)
+    sum_one = np.zeros((selection.shape[1], samples))
+    for begin in range(0, n, chunk):
+        block = np.asarray(traces[begin:begin + chunk], dtype=np.float64)
+        sum_all += block.sum(axis=0)
+        sum_one += selection[begin:begin + chunk].T @ block
+    ones = selection.sum(axis=0)[:, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        difference = sum_one / ones - (sum_all - sum_one) / (n - ones)
+    return np.nan_to_num(difference)
+def _batch_double(curve: SM2, points: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """批量仿射倍点，共用一次求逆"""
+    p, a = curve.p, curve.a
+    inverses = curve.field.batch_inv([2 * y % p for _, y in points])
+    result = []
+    for (x, y), inv in zip(points, inverses):
+        s = (3 * x * x + a) * inv % p
+        x3 = (s * s - 2 * x) % p
+        result.append((x3, (s * (x - x3) - y) % p))
+    return result
+def _batch_add(curve: SM2, left: List[Tuple[int, int]], right: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """批量仿射加法（两两不同且互不为负），共用一次求逆"""
+    p = curve.p
+    inverses = curve.field.batch_inv([(x2 - x1) % p for (x1, _), (x2, _) in zip(left, right)])
+    result = []
+    for (x1, y1), (x2, y2), inv in zip(left, right, inverses):
+        s = (y2 - y1) * inv % p
+        x3 = (s * s - x1 - x2) % p
+        result.append((x3, (s * (x1 - x3) - y1) % p))
+    return result
+def recover_ladder_bits(trace_set: TraceSet, bits: int, curve: Optional[SM2] = None,
+                        method: str = "cpa") -> Dict:
+    """针对从高位开始的仿射蒙哥马利阶梯（SM2Montgomery）逐位恢复标量最高位之后的bits位
+    已知前缀a时阶梯状态为 (a·P, (a+1)·P)，下一位为b时会计算倍点 2(a+b)·P：
+    CPA以其x坐标汉明重量为预测泄露，DPA按其x坐标汉明重量是否大于128划分轨迹
+    （单个比特只改变约1个单位的泄露，淹没在默认噪声中；按汉明重量划分两组均值相差约13个单位），
+    只与该位对应的两次运算（先加后倍）的采样点求相关（早期的小倍数点可能在之前出现过），峰值更高的猜测胜出
+    """
+    if trace_set.traces.shape[1] < 2 + 2 * bits:
+        raise ValueError(f"恢复{bits}位至少需要{2 + 2 * bits}个采样点")
+    start_time = time.time()
+    curve = curve or SM2()
+    points = [(P.x, P.y) for P in trace_set.points()]
+    # 最高位恒为1：R0 = P, R1 = 2P
+    R0, R1 = points, _batch_double(curve, points)
+    recovered, scores = [], []
+    for i in range(bits):
+        window = trace_set.traces[:, 2 + 2 * i:4 + 2 * i]
+        candidates = [_batch_double(curve, R0), _batch_double(curve, R1)]
+        if method == "cpa":
+            hypotheses = np.array([[x.bit_count() for x, _ in c] for c in candidates], dtype=np.float64).T
+            peaks = np.abs(cpa(window, hypotheses)).max(axis=1)
+        else:
+            selection = np.array([[x.bit_count() > DPA_HW_THRESHOLD for x, _ in c] for c in candidates], dtype=bool).T
+            peaks = np.abs(dpa(window, selection)).max(axis=1)
+        bit = int(peaks[1] > peaks[0])
+        recovered.append(bit)
+        scores.append(peaks.tolist())
+        added = _batch_add(curve, R0, R1)
+        R0, R1 = (added, candidates[1]) if bit else (candidates[0], added)
+    return {"bits": recovered, "scores": scores, "method": method, "traces": len(trace_set),
+            "elapsed": time.time() - start_time}
+def top_bits(scalar: int, bits: int) -> List[int]:
+    """标量最高位之后的bits位（阶梯攻击的恢复目标）"""
+    length = scalar.bit_length()
+    return [(scalar >> (length - 2 - i)) & 1 for i in range(bits)]
+if __name__ == "__main__":
+    secret = SM2().generate_keypair()[0]
+    for count in (1000, 10000):
+        begin = time.time()
+        trace_set = simulate_traces(SM2Montgomery, secret, count, samples=40, seed=count)
+        simulated = time.time() - begin
+        for attack in ("cpa", "dpa"):
+            result = recover_ladder_bits(trace_set, 16, method=attack)
+            correct = sum(a == b for a, b in zip(result["bits"], top_bits(secret, 16)))
+            print(f"{count}条轨迹 {attack.upper()}: 模拟 {simulated:.2f}s，恢复16位中 {correct} 位正确，"
+                  f"分析 {result['elapsed']:.2f}s")
@@ -0,0 +1,175 @@
+"""
+SM2安全测试套件的并行运行器
+自动发现测试函数、漏洞POC、高级攻击和签名伪造四组场景，在进程池中并发运行，
+每个场景单独计时并受超时限制；父进程先构建固定基点表和共享密钥对的预计算表，fork出的工作进程直接共享，
+结果（含场景返回值与输出）整理为可JSON序列化的结构
+作者: ESFJ-MoZhu
+日期: 2026-10-19
+"""
+import contextlib
+import io
+import json
+import os
+import random
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from sm2_base import SM2, Point, PUBLIC_KEY_TABLE_CACHE
+from sm2_vulnerability_poc import SM2VulnerabilityPOC
+from sm2_advanced_attacks import SM2AdvancedAttacks
+from satoshi_signature_forge import SatoshiSignatureForge
+# 场景分组：测试函数、漏洞POC、高级攻击、签名伪造
+SUITES = ("tests", "poc", "advanced", "forge")
+# 默认的单个场景超时（秒）
+DEFAULT_TIMEOUT = 300.0
+# 不纳入tests组的测试函数（运行器自身的测试，避免递归）
+EXCLUDED_TESTS = {"test_parallel_suite_runner"}
+class ScenarioTimeout(BaseException):
+    """场景超时；继承BaseException，避免被场景内部的 except Exception 吞掉"""
+def _on_alarm(signum, frame):
+    raise ScenarioTimeout()
+def discover_scenarios(suites: Sequence[str] = SUITES) -> List[str]:
+    """按分组发现全部场景，返回 "分组.名称" 形式的场景标识"""
+    scenarios = []
+    for suite in suites:
+        if suite == "tests":
+            import test_sm2_implementations
+            names = [name for name, value in vars(test_sm2_implementations).items()
+                     if name.startswith("test_") and callable(value) and name not in EXCLUDED_TESTS]
+        elif suite == "poc":
+            names = [name for name in vars(SM2VulnerabilityPOC) if name.startswith("poc_")]
+        elif suite == "advanced":
+            names = list(SM2AdvancedAttacks().attack_scenarios(1))
+        elif suite == "forge":
+            names = [name for name in vars(SatoshiSignatureForge) if name.startswith("method")]
+        else:
+            raise ValueError(f"未知的场景分组: {suite}，可选: {SUITES}")
+        scenarios.extend(f"{suite}.{name}" for name in names)
+    return scenarios
+def _resolve(scenario: str, keypair: Tuple[int, Point]) -> Callable[[], object]:
+    """把场景标识解析为无参调用；高级攻击与签名伪造使用共享密钥对，不再各自生成"""
+    suite, _, name = scenario.partition(".")
+    if suite == "tests":
+        import test_sm2_implementations
+        return getattr(test_sm2_implementations, name)
+    if suite == "poc":
+        return getattr(SM2VulnerabilityPOC(), name)
+    if suite == "advanced":
+        return SM2AdvancedAttacks().attack_scenarios(keypair[0])[name][1]
+    forge = SatoshiSignatureForge()
+    forge.satoshi_public_key = keypair[1]
+    return getattr(forge, name)
+def _json_safe(value):
+    """把场景返回值转换为可JSON序列化的结构：点 -> {x, y}，字节串 -> hex，numpy类型 -> 列表/标量"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, Point):
+        return None if value.is_infinity else {"x": value.x, "y": value.y}
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    if isinstance(value, dict):
+        return {str(key): _json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_json_safe(item) for item in value]
+    if hasattr(value, "tolist"):
+        return _json_safe(value.tolist())
+    return repr(value)
+def _run_scenario(scenario: str, keypair: Tuple[int, Point], timeout: Optional[float]) -> Dict:
+    """工作进程：运行一个场景，捕获其输出与异常，超时由SIGALRM打断"""
+    # fork出的工作进程继承了同一随机数状态，先重新播种，避免各场景生成相同的密钥
+    random.seed()
+    use_alarm = bool(timeout) and hasattr(signal, "SIGALRM") and threading.current_thread() is threading.main_thread()
+    output = io.StringIO()
+    status, value, error = "passed", None, None
+    start = time.perf_counter()
+    try:
+        if use_alarm:
+            previous = signal.signal(signal.SIGALRM, _on_alarm)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            with contextlib.redirect_stdout(output):
+                value = _resolve(scenario, keypair)()
+        finally:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previous)
+    except ScenarioTimeout:
+        status, error = "timeout", f"超过 {timeout} 秒"
+    except AssertionError as exc:
+        status, error = "failed", repr(exc)
+    except Exception as exc:
+        status, error = "error", repr(exc)
+    suite, _, name = scenario.partition(".")
+    return {
+        "scenario": scenario,
+        "suite": suite,
+        "name": name,
+        "status": status,
+        "elapsed": time.perf_counter() - start,
+        "result": _json_safe(value),
+        "error": error,
+        "output": output.getvalue(),
+    }
+def prepare_context() -> Tuple[int, Point]:
+    """在父进程中预计算共享的曲线上下文：固定基点表与共享密钥对的公钥预计算表，返回该密钥对"""
+    sm2 = SM2()
+    sm2.fixed_base_table()
+    private_key, public_key = sm2.generate_keypair()
+    # 公钥被使用min_uses次后才建表，这里直接预热到建表为止
+    for _ in range(PUBLIC_KEY_TABLE_CACHE.min_uses):
+        sm2.precomputed_table(public_key)
+    return private_key, public_key
+def run_suite(scenarios: Optional[Sequence[str]] = None, workers: Optional[int] = None,
+              timeout: float = DEFAULT_TIMEOUT, timeouts: Optional[Dict[str, float]] = None,
+              history: Optional[Dict] = None) -> Dict:
+    """并发运行场景（默认全部），返回每个场景的状态、耗时和结果
+    timeouts可按场景覆盖默认超时；history为上一次run_suite的结果，据此按耗时从长到短提交，
+    使总耗时接近最慢的单个场景
+    """
+    if scenarios is None:
+        scenarios = discover_scenarios()
+    known = set(discover_scenarios({scenario.partition(".")[0] for scenario in scenarios} & set(SUITES)))
+    unknown = [scenario for scenario in scenarios if scenario not in known]
+    if unknown:
+        raise ValueError(f"未知的场景: {unknown}")
+    workers = workers or os.cpu_count() or 1
+    timeouts = timeouts or {}
+    if history:
+        previous = {item["scenario"]: item["elapsed"] for item in history["scenarios"]}
+        scenarios = sorted(scenarios, key=lambda scenario: -previous.get(scenario, float("inf")))
+    start = time.perf_counter()
+    keypair = prepare_context()
+    jobs = [(scenario, keypair, timeouts.get(scenario, timeout)) for scenario in scenarios]
+    if workers <= 1:
+        results = [_run_scenario(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [executor.submit(_run_scenario, *job) for job in jobs]
+            results = [future.result() for future in as_completed(futures)]
+    order = {scenario: i for i, scenario in enumerate(discover_scenarios())}
+    results.sort(key=lambda item: order.get(item["scenario"], len(order)))
+    wall_time = time.perf_counter() - start
+    counts = {status: sum(item["status"] == status for item in results)
+              for status in ("passed", "failed", "error", "timeout")}
+    return {
+        "scenarios": results,
+        "workers": workers,
+        "wall_time": wall_time,
+        "serial_time": sum(item["elapsed"] for item in results),
+        "slowest": max(results, key=lambda item: item["elapsed"])["scenario"] if results else None,
+        **counts,
+    }
+def write_report(result: Dict, path: str):
+    """把run_suite的结果写为JSON文件"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+if __name__ == "__main__":
+    result = run_suite()
+    for item in result["scenarios"]:
+        print(f"{item['status']:8} {item['elapsed']:8.2f}s  {item['scenario']}" + (f"  {item['error']}" if item["error"] else ""))
+    print(f"{len(result['scenarios'])}个场景，workers={result['workers']}，总耗时 {result['wall_time']:.1f}s，"
+          f"串行合计 {result['serial_time']:.1f}s，最慢场景 {result['slowest']}")
+    write_report(result, "sm2_suite_results.json")
+    print("结果已保存到 sm2_suite_results.json")
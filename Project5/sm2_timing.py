@@ -0,0 +1,154 @@
+"""
+SM2标量乘法的时序泄露检测
+dudect方法：固定标量与随机标量两类输入随机交错，perf_counter_ns逐次计时，
+在线Welch t检验并按多个百分位裁剪长尾，多进程分批采集大量样本，对比各实现
+作者: ESFJ-MoZhu
+日期: 2026-10-19
+"""
+import math
+import os
+import random
+import time
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+from sm2_base import SM2, SM2Optimized, SM2Montgomery
+# 裁剪阈值个数：第i个阈值取首批样本的 1 - 0.5^(10(i+1)/N) 分位数
+CROP_PERCENTILES = 100
+# |t| 超过此值判定存在时序泄露（与dudect相同）
+T_THRESHOLD = 4.5
+# 裁剪后样本数少于总数的这一比例时不参与取最大值，避免小样本的偶然大t值
+MIN_CROP_FRACTION = 0.01
+class WelchTTest:
+    """在线Welch t检验：Welford算法累积两类样本的均值与二阶中心矩"""
+    __slots__ = ("n", "mean", "m2")
+    def __init__(self):
+        self.n = [0, 0]
+        self.mean = [0.0, 0.0]
+        self.m2 = [0.0, 0.0]
+    def push(self, cls: int, x: float):
+        """加入一个属于类别cls（0为固定输入，1为随机输入）的样本"""
+        self.n[cls] += 1
+        delta = x - self.mean[cls]
+        self.mean[cls] += delta / self.n[cls]
+        self.m2[cls] += delta * (x - self.mean[cls])
+    def t(self) -> float:
+        """t = (μ0 - μ1) / sqrt(s0²/n0 + s1²/n1)，任一类不足两个样本时为0"""
+        n0, n1 = self.n
+        if n0 < 2 or n1 < 2:
+            return 0.0
+        denominator = math.sqrt(self.m2[0] / (n0 - 1) / n0 + self.m2[1] / (n1 - 1) / n1)
+        return (self.mean[0] - self.mean[1]) / denominator if denominator else 0.0
+# 工作进程内按实现类缓存的SM2实例
+_worker_instances: Dict[type, SM2] = {}
+def _measure_batch(sm2_class: Type[SM2], method: str, fixed_scalar: Optional[int], count: int,
+                   seed: int) -> Tuple[bytes, array]:
+    """工作进程：随机交错两类输入，逐次计时 method(k, P)，返回 (类别序列, 纳秒耗时)
+    两类的点P都是随机点（计时前批量生成），只有标量k区分固定/随机
+    """
+    sm2 = _worker_instances.get(sm2_class)
+    if sm2 is None:
+        sm2 = _worker_instances[sm2_class] = sm2_class()
+    rng = random.Random(seed)
+    n = sm2.n
+    if fixed_scalar is None:
+        fixed_scalar = (1 << (n.bit_length() - 1)) | 1
+    classes = bytes(rng.getrandbits(1) for _ in range(count))
+    scalars = [fixed_scalar if c == 0 else rng.randrange(1, n) for c in classes]
+    points = sm2.public_keys_from_private([rng.randrange(1, n) for _ in range(count)])
+    operation = getattr(sm2, method)
+    timer = time.perf_counter_ns
+    times = array("Q")
+    for k, P in zip(scalars, points):
+        start = timer()
+        operation(k, P)
+        times.append(timer() - start)
+    return classes, times
+def timing_targets() -> Dict[str, Tuple[Type[SM2], str]]:
+    """参与对比的实现：名称 -> (实现类, 标量乘法方法名)"""
+    from sm2_countermeasures import SM2SecureImplementation
+    return {
+        "SM2": (SM2, "point_multiply"),
+        "SM2Optimized": (SM2Optimized, "point_multiply"),
+        "SM2Montgomery": (SM2Montgomery, "point_multiply"),
+        "SM2SecureImplementation": (SM2SecureImplementation, "constant_time_point_multiply"),
+    }
+def leakage_test(sm2_class: Type[SM2], method: str = "point_multiply", samples: int = 20000,
+                 workers: int = 1, batch: int = 500, fixed_scalar: Optional[int] = None,
+                 seed: Optional[int] = None) -> Dict:
+    """对 sm2_class().method(k, P) 做固定标量 vs 随机标量的时序泄露检测
+    fixed_scalar默认为汉明重量为2的 2^(bits(n)-1) + 1；首批样本决定裁剪阈值，
+    之后每个样本送入未裁剪的检验以及所有阈值高于它的裁剪检验，报告 |t| 最大的检验
+    """
+    rng = random.Random(seed)
+    counts = [batch] * (samples // batch) + ([samples % batch] if samples % batch else [])
+    tests = [WelchTTest() for _ in range(CROP_PERCENTILES + 1)]
+    thresholds: List[int] = []
+    def absorb(classes: bytes, times: array):
+        """把一批样本加入各个检验"""
+        if not thresholds:
+            ordered = sorted(times)
+            for i in range(CROP_PERCENTILES):
+                q = 1 - 0.5 ** (10 * (i + 1) / CROP_PERCENTILES)
+                thresholds.append(ordered[min(int(q * len(ordered)), len(ordered) - 1)])
+        for cls, x in zip(classes, times):
+            tests[0].push(cls, x)
+            # 阈值单调不减，x低于bisect位置及之后的所有阈值
+            for i in range(bisect_right(thresholds, x), CROP_PERCENTILES):
+                tests[i + 1].push(cls, x)
+    begin = time.perf_counter()
+    jobs = [(sm2_class, method, fixed_scalar, count, rng.getrandbits(64)) for count in counts]
+    if workers <= 1:
+        for job in jobs:
+            absorb(*_measure_batch(*job))
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            for future in as_completed([executor.submit(_measure_batch, *job) for job in jobs]):
+                absorb(*future.result())
+    elapsed = time.perf_counter() - begin
+    total = sum(tests[0].n)
+    eligible = [i for i, test in enumerate(tests) if i == 0 or sum(test.n) >= MIN_CROP_FRACTION * total]
+    worst = max(eligible, key=lambda i: abs(tests[i].t()))
+    max_t = abs(tests[worst].t())
+    return {
+        "implementation": sm2_class.__name__,
+        "method": method,
+        "samples": total,
+        "workers": workers,
+        "fixed_mean_ns": tests[0].mean[0],
+        "random_mean_ns": tests[0].mean[1],
+        "t_uncropped": tests[0].t(),
+        "max_t": max_t,
+        # None表示未裁剪的检验最显著，否则为保留的分位数
+        "crop_percentile": None if worst == 0 else 1 - 0.5 ** (10 * worst / CROP_PERCENTILES),
+        "leaky": max_t > T_THRESHOLD,
+        "elapsed": elapsed,
+    }
+def compare_backends(samples: int = 2000, workers: int = 1, names: Optional[Sequence[str]] = None,
+                     seed: Optional[int] = None) -> List[Dict]:
+    """对各实现依次运行时序泄露检测"""
+    targets = timing_targets()
+    rng = random.Random(seed)
+    return [leakage_test(targets[name][0], targets[name][1], samples, workers, seed=rng.getrandbits(64))
+            for name in (names or targets)]
+def format_leakage_report(rows: List[Dict]) -> str:
+    """生成对比报告（Markdown表格）"""
+    lines = [
+        "# SM2标量乘法时序泄露检测报告",
+        f"固定标量 vs 随机标量，Welch t检验，|t| > {T_THRESHOLD} 判定存在泄露",
+        "",
+        "| 实现 | 方法 | 样本数 | 固定均值(μs) | 随机均值(μs) | 未裁剪t | 最大t绝对值 | 裁剪分位 | 结论 |",
+        "|------|------|--------|--------------|--------------|---------|---------|----------|------|",
+    ]
+    for row in rows:
+        crop = "-" if row["crop_percentile"] is None else f"{row['crop_percentile']:.3f}"
+        lines.append(
+            f"| {row['implementation']} | {row['method']} | {row['samples']} | "
+            f"{row['fixed_mean_ns'] / 1000:.1f} | {row['random_mean_ns'] / 1000:.1f} | "
+            f"{row['t_uncropped']:.2f} | {row['max_t']:.2f} | {crop} | "
+            f"{'存在时序泄露' if row['leaky'] else '未发现泄露'} |"
+        )
+    return "\n".join(lines)
+if __name__ == "__main__":
+    print(format_leakage_report(compare_backends(samples=4000, workers=os.cpu_count() or 1)))
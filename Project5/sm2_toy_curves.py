@@ -0,0 +1,114 @@
+"""
+SM2算法的小规模测试曲线
+与SM2同形（a = -3，p ≡ 3 mod 4）的素数阶曲线，阶为32~60位，
+用于在可接受的时间内实际运行离散对数等攻击并测量其扩展性
+作者: ESFJ-MoZhu
+日期: 2026-10-19
+"""
+import math
+import random
+from typing import Dict, Optional, Tuple
+from sm2_base import SM2, Point
+from sm2_field import SM2Field
+from sm2_dlog import is_probable_prime, point_order
+# 按阶的位数索引的测试曲线参数 (p, a, b, n, Gx, Gy)，由 find_prime_order_curve(bits, seed=bits) 离线生成
+TOY_CURVES: Dict[int, Tuple[int, int, int, int, int, int]] = {
+    32: (0xdef74753, 0xdef74750, 0xc812ab07, 0xdef8d3a3, 0x205c5a84, 0x6f6af0be),
+    36: (0xf2f3915cb, 0xf2f3915c8, 0x524702fcc, 0xf2f3d0457, 0x71c6061fd, 0x7ffba25ed),
+    40: (0xb59e9cc917, 0xb59e9cc914, 0x42d087100c, 0xb59e9cd73f, 0x89b62dc9fb, 0x1031255f10),
+    44: (0x93afbb8c793, 0x93afbb8c790, 0x8631a7aad55, 0x93afbec342f, 0x3ebb79e434b, 0x882824b7877),
+    48: (0xb2b30f680597, 0xb2b30f680594, 0x5198d6e0a4ef, 0xb2b30e93c111, 0xa1e205c0cb02, 0x2c7122256cda),
+    52: (0xa4a431cd1889b, 0xa4a431cd18898, 0x342fb2d5fb9b5, 0xa4a43200311b7, 0x32fce61ccaa46, 0x23bcef1f00b2),
+    56: (0x8cb29e2293c91f, 0x8cb29e2293c91c, 0x821507dce48c1a, 0x8cb29e350fa473, 0x17089082433bb8, 0x6c216dce5a2e),
+    60: (0x875a1fcfd426adf, 0x875a1fcfd426adc, 0x81093edb8680b4d, 0x875a1fce37b75ad, 0x701260fa9b9120b, 0x1a357a8ee2bb063),
+}
+class ToyCurve(SM2):
+    """使用自定义参数的SM2实现，固定基点表、公钥缓存等按曲线参数隔离"""
+    def __init__(self, p: int, a: int, b: int, n: int, gx: int, gy: int):
+        super().__init__()
+        self.p, self.a, self.b, self.n = p, a, b, n
+        self.gx, self.gy = gx, gy
+        self.G = Point(gx, gy)
+        self.field = SM2Field(p)
+    @classmethod
+    def from_bits(cls, bits: int) -> "ToyCurve":
+        """按阶的位数取预生成的测试曲线"""
+        if bits not in TOY_CURVES:
+            raise ValueError(f"没有{bits}位的测试曲线，可选: {sorted(TOY_CURVES)}")
+        return cls(*TOY_CURVES[bits])
+    def params(self) -> Tuple[int, int, int, int, int, int]:
+        """曲线参数 (p, a, b, n, Gx, Gy)，可传给工作进程重建曲线"""
+        return self.p, self.a, self.b, self.n, self.gx, self.gy
+def random_point(curve: SM2, rng: random.Random) -> Point:
+    """在曲线上随机取一个有限点"""
+    while True:
+        x = rng.randrange(curve.p)
+        y = curve.field.sqrt((x * x * x + curve.a * x + curve.b) % curve.p)
+        if y:
+            return Point(x, y)
+def order_in_hasse_interval(curve: SM2, P: Point) -> Optional[int]:
+    """在Hasse区间 [p+1-2√p, p+1+2√p] 内用大步小步法找 m 使 m*P = O（Mestre方法），找不到返回None"""
+    p = curve.p
+    low = p + 1 - 2 * math.isqrt(p) - 2
+    width = 4 * math.isqrt(p) + 5
+    step = math.isqrt(width) + 1
+    # 小步：存储 -j*P -> j
+    baby = {}
+    R = curve.O
+    for j in range(step):
+        baby.setdefault(R if R.is_infinity else Point(R.x, (p - R.y) % p), j)
+        R = curve.point_add(R, P)
+    # 大步：(low + i*step)*P 命中 -j*P 即 (low + i*step + j)*P = O
+    giant = curve.point_multiply(step, P)
+    T = curve.point_multiply(low, P)
+    for i in range(step + 1):
+        j = baby.get(T)
+        if j is not None:
+            return low + i * step + j
+        T = curve.point_add(T, giant)
+    return None
+def find_prime_order_curve(bits: int, seed: Optional[int] = None) -> Tuple[int, int, int, int, int, int]:
+    """随机搜索阶为bits位素数、a = -3、p ≡ 3 (mod 4) 的曲线，返回 (p, a, b, n, Gx, Gy)"""
+    rng = random.Random(seed)
+    while True:
+        p = rng.getrandbits(bits) | (1 << (bits - 1)) | 3
+        if not is_probable_prime(p):
+            continue
+        a = p - 3
+        for _ in range(64):
+            b = rng.randrange(1, p)
+            if (4 * pow(a, 3, p) + 27 * b * b) % p == 0:
+                continue
+            curve = ToyCurve(p, a, b, 1, 0, 0)
+            G = random_point(curve, rng)
+            n = order_in_hasse_interval(curve, G)
+            # 素数m > 4√p 时G的阶为m且区间内只有m一个倍数，于是 #E = m
+            if n is not None and n.bit_length() == bits and is_probable_prime(n):
+                return p, a, b, n, G.x, G.y
+def curve_order(curve: SM2, seed: Optional[int] = None, attempts: int = 32) -> int:
+    """计算任意小规模曲线的群阶 #E：取随机点的阶的最小公倍数L，直到Hasse区间内只有一个L的倍数"""
+    rng = random.Random(seed)
+    p = curve.p
+    low = p + 1 - 2 * math.isqrt(p) - 2
+    high = p + 1 + 2 * math.isqrt(p) + 2
+    lcm = 1
+    for _ in range(attempts):
+        P = random_point(curve, rng)
+        multiple = order_in_hasse_interval(curve, P)
+        lcm = math.lcm(lcm, point_order(curve, P, multiple))
+        candidates = list(range((low + lcm - 1) // lcm * lcm, high + 1, lcm))
+        if len(candidates) == 1:
+            return candidates[0]
+    raise ValueError("无法唯一确定群阶")
+def quadratic_twist(curve: ToyCurve, seed: Optional[int] = None) -> Tuple[ToyCurve, int]:
+    """二次扭曲 D*y^2 = x^3 + ax + b 的同构模型 y^2 = x^3 + aD^2 x + bD^3，返回 (扭曲曲线, D)
+    扭曲点 (x, y) 对应模型上的 (D*x, D^2*y)；curve.n须为原曲线的群阶，扭曲群阶为 2p + 2 - n
+    """
+    p = curve.p
+    D = 2
+    while pow(D, (p - 1) >> 1, p) == 1:
+        D += 1
+    twist = ToyCurve(p, curve.a * D * D % p, curve.b * pow(D, 3, p) % p, 2 * p + 2 - curve.n, 0, 0)
+    G = random_point(twist, random.Random(seed))
+    twist.gx, twist.gy, twist.G = G.x, G.y, G
+    return twist, D
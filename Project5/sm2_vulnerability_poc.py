@@ -6,7 +6,10 @@ SM2签名算法误用的POC验证代码
 """
 import hashlib
 import random
-from sm2_base import SM2, Point
+from sm2_base import SM2
+from sm2_nonce_scan import recover_key_from_reused_nonce, derived_x1
+from sm2_key_recovery import recover_public_key_candidates
+from sm2_weak_nonce import brute_force_weak_nonces
 from typing import List, Tuple
 class SM2VulnerabilityPOC(SM2):
     """SM2签名算法漏洞概念验证类"""
@@ -25,8 +28,8 @@ class SM2VulnerabilityPOC(SM2):
         k_fixed = random.randint(1, self.n - 1)
         # 修改签名函数以使用固定的k
         def sign_with_fixed_k(message: bytes, k: int) -> Tuple[int, int]:
-            e = int.from_bytes(self.sm3_hash(message), 'big')
-            point = self.point_multiply(k, self.G)
+            e = self.message_digest(message, public_key)
+            point = self.base_point_multiply(k)
             x1 = point.x
             r = (e + x1) % self.n
             if r == 0 or r + k == self.n:
@@ -41,54 +44,46 @@ class SM2VulnerabilityPOC(SM2):
         r2, s2 = sign_with_fixed_k(message2, k_fixed)
         if r1 is None or r2 is None:
             return {"success": False, "reason": "签名生成失败"}
-        # 攻击：从两个签名中恢复私钥
-        e1 = int.from_bytes(self.sm3_hash(message1), 'big')
-        e2 = int.from_bytes(self.sm3_hash(message2), 'big')
-        # 计算 k = (s1 - s2)^(-1) * (e1 - e2) mod n
-        try:
-            s_diff_inv = self.mod_inverse((s1 - s2) % self.n, self.n)
-            k_recovered = (s_diff_inv * (e1 - e2)) % self.n
-            # 验证恢复的k是否正确
-            if k_recovered == k_fixed:
-                # 使用恢复的k计算私钥
-                # d = (s1 * k - e1 - r1) * (r1)^(-1) mod n
-                r1_inv = self.mod_inverse(r1, self.n)
-                d_recovered = ((s1 * k_recovered - e1 - r1) * r1_inv) % self.n
-                result = {
-                    "success": True,
-                    "original_private_key": private_key,
-                    "recovered_private_key": d_recovered,
-                    "k_original": k_fixed,
-                    "k_recovered": k_recovered,
-                    "attack_successful": d_recovered == private_key
-                }
-            else:
-                result = {"success": False, "reason": "k恢复失败"}
-        except:
-            result = {"success": False, "reason": "模逆计算失败"}
+        # 攻击：两个签名满足 k = s1 + (r1 + s1)·d = s2 + (r2 + s2)·d，消去k解出d
+        # 同一个k得到相同的 x1 = (r - e) mod n，扫描器正是以此为索引发现重用
+        e1 = self.message_digest(message1, public_key)
+        e2 = self.message_digest(message2, public_key)
+        d_recovered = recover_key_from_reused_nonce(self.n, (r1, s1), (r2, s2))
+        if d_recovered is None:
+            result = {"success": False, "reason": "分母为0，无法求解"}
+        else:
+            k_recovered = (s1 + (r1 + s1) * d_recovered) % self.n
+            result = {
+                "success": True,
+                "same_x1": derived_x1(self.n, e1, r1) == derived_x1(self.n, e2, r2),
+                "original_private_key": private_key,
+                "recovered_private_key": d_recovered,
+                "k_original": k_fixed,
+                "k_recovered": k_recovered,
+                "attack_successful": d_recovered == private_key and k_recovered == k_fixed
+            }
         self.attack_results.append(("nonce_reuse", result))
         return result
     def poc_weak_randomness_attack(self) -> dict:
         """POC 2: 弱随机数攻击演示"""
         print("=== POC 2: 弱随机数攻击 ===")
-        # 模拟弱随机数生成器（可预测的k值）
-        weak_seed = 12345
-        random.seed(weak_seed)
+        # 模拟弱随机数生成器：以16位小整数为种子，sign内部的 random.randint 因此可预测
+        weak_seed = random.randrange(1 << 16)
         private_key, public_key = self.generate_keypair()
-        message = b"Weak randomness test"
-        # 使用弱随机数生成k
-        weak_k = random.randint(1, self.n - 1)
-        # 重置随机数种子，模拟攻击者也能生成相同的k
         random.seed(weak_seed)
-        predicted_k = random.randint(1, self.n - 1)
-        # 生成签名
-        r, s = self.sign(message, private_key)
+        signatures = [self.sign(message, private_key) for message in (b"Weak randomness test", b"Second message")]
+        random.seed()
+        # 攻击者只知道两个签名和公钥，枚举全部种子，对每个候选k做模运算检查
+        search = brute_force_weak_nonces(signatures, range(1 << 16), "python_random", public_key=public_key)
         result = {
             "success": True,
-            "weak_k": weak_k,
-            "predicted_k": predicted_k,
-            "k_prediction_successful": weak_k == predicted_k,
-            "vulnerability": "攻击者可以预测随机数k，从而恢复私钥"
+            "weak_seed": weak_seed,
+            "recovered_seed": search["seed"],
+            "recovered_private_key": search["private_key"],
+            "candidates": search["candidates"],
+            "candidates_per_sec": search["candidates_per_sec"],
+            "attack_successful": search["private_key"] == private_key,
+            "vulnerability": "攻击者可以枚举弱种子重现随机数k，从而恢复私钥"
         }
         self.attack_results.append(("weak_randomness", result))
         return result
@@ -145,45 +140,28 @@ class SM2VulnerabilityPOC(SM2):
         print("=== POC 5: 从签名恢复公钥 ===")
         private_key, public_key = self.generate_keypair()
         message = b"Public key recovery test"
-        # 生成签名
-        r, s = self.sign(message, private_key)
-        e = int.from_bytes(self.sm3_hash(message), 'big')
-        # 尝试恢复公钥
-        # 公钥 P = r^(-1) * (s * R - e * G)，其中R是椭圆曲线上x坐标为r的点
-        try:
-            # 找到x坐标为r的点R（可能有两个y坐标）
-            y_squared = (pow(r, 3, self.p) + self.a * r + self.b) % self.p
-            y = pow(y_squared, (self.p + 1) // 4, self.p)  # 简化的平方根计算
-            R1 = Point(r, y)
-            R2 = Point(r, self.p - y)
-            r_inv = self.mod_inverse(r, self.n)
-            # 尝试两个可能的R点
-            for R in [R1, R2]:
-                sR = self.point_multiply(s, R)
-                eG = self.point_multiply(e, self.G)
-                # P = r^(-1) * (s * R - e * G)
-                diff = self.point_add(sR, Point(eG.x, self.p - eG.y))  # sR - eG
-                recovered_public_key = self.point_multiply(r_inv, diff)
-                if recovered_public_key == public_key:
-                    result = {
-                        "success": True,
-                        "original_public_key": (public_key.x, public_key.y),
-                        "recovered_public_key": (recovered_public_key.x, recovered_public_key.y),
-                        "recovery_successful": True,
-                        "vulnerability": "在某些情况下可以从签名中恢复公钥"
-                    }
-                    self.attack_results.append(("public_key_recovery", result))
-                    return result
+        # 生成签名（同时得到R点y坐标的奇偶位v）
+        r, s, v = self.sign_recoverable(message, private_key)
+        # e = SM3(Z_A || M) 依赖公钥，这里假设日志中记录了验证方计算的e
+        e = self.message_digest(message, public_key)
+        # 由 k = s + (r + s)·d 得 P = (r + s)^(-1)·(R - s·G)，R的x坐标为 x1 = (r - e) mod n
+        candidates = recover_public_key_candidates(self, [(e, r, s), (e, r, s, v)])
+        recovered = [self.encode_point(P).hex() for P in candidates[0]]
+        original = self.encode_point(public_key).hex()
+        if original in recovered:
             result = {
-                "success": False,
-                "reason": "公钥恢复失败",
-                "vulnerability": "公钥恢复在某些参数下可能失败"
+                "success": True,
+                "original_public_key": original,
+                "candidate_public_keys": recovered,
+                "recovered_with_parity": [self.encode_point(P).hex() for P in candidates[1]],
+                "recovery_successful": candidates[1] == [public_key],
+                "vulnerability": "日志中记录了e时，可以从签名中恢复公钥（附带奇偶位时唯一）"
             }
-        except Exception as e:
+        else:
             result = {
                 "success": False,
-                "reason": f"计算错误: {str(e)}",
-                "vulnerability": "数学计算复杂性"
+                "reason": "公钥恢复失败",
+                "vulnerability": "公钥恢复在某些参数下可能失败"
             }
         self.attack_results.append(("public_key_recovery", result))
         return result
@@ -212,6 +190,7 @@ class SM2VulnerabilityPOC(SM2):
 ## 1. 随机数k重用攻击
 **风险等级**: 极高
 **描述**: 当使用相同的随机数k对不同消息进行签名时，攻击者可以通过数学计算恢复私钥。
+**数学关系**: k = s + (r + s)·d，两式相减得 d = (s2 - s1) / (s1 - s2 + r1 - r2) mod n；重用的k对应相同的 x1 = (r - e) mod n
 **影响**: 完全破坏密钥安全性
 **防护措施**: 
 - 确保每次签名使用强随机数生成器
@@ -219,6 +198,7 @@ class SM2VulnerabilityPOC(SM2):
 ## 2. 弱随机数攻击
 **风险等级**: 高
 **描述**: 使用可预测的随机数生成器会导致私钥泄露。
+**攻击方法**: 枚举种子空间，两个签名的候选k须满足 (k1 - s1)·(r2 + s2) ≡ (k2 - s2)·(r1 + s1) (mod n)
 **影响**: 攻击者可以预测并重现签名过程
 **防护措施**:
 - 使用密码学安全的随机数生成器
@@ -240,6 +220,7 @@ class SM2VulnerabilityPOC(SM2):
 ## 5. 公钥恢复
 **风险等级**: 低
 **描述**: 在某些情况下可以从签名中恢复公钥。
+**数学关系**: x1 = (r - e) mod n 提升为R，P = (r + s)^(-1)·(R - s·G)，无奇偶位时有两个候选
 **影响**: 隐私泄露，但不直接影响安全性
 **防护措施**:
 - 如需要隐私保护，使用额外的混淆技术
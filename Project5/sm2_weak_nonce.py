@@ -0,0 +1,160 @@
+"""
+弱随机数生成器下的SM2随机数暴力搜索
+按弱生成器模型（小种子空间、截断时间戳种子、以小整数为种子的Python random）枚举候选k，
+用签名方程 k = s + (r + s)·d 导出的模运算检查候选，无需标量乘法：
+同一种子相继生成的两个k须给出同一个 d = (k - s)·(r + s)^(-1)，交叉相乘后每个种子只需两次模乘
+作者: ESFJ-MoZhu
+日期: 2026-10-19
+"""
+import hashlib
+import itertools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from sm2_base import SM2, Point
+# 每个任务搜索的种子个数
+SEED_CHUNK = 1 << 15
+def _python_random(seed: int, count: int, n: int) -> List[int]:
+    """random.seed(seed) 后 SM2.sign 依次调用 random.randint(1, n - 1) 得到的随机数"""
+    rng = random.Random(seed)
+    return [rng.randint(1, n - 1) for _ in range(count)]
+def _sha256_counter(seed: int, count: int, n: int) -> List[int]:
+    """k_i = SHA-256(seed || i) mod (n - 1) + 1，种子空间即为全部熵"""
+    prefix = seed.to_bytes(8, "big")
+    return [int.from_bytes(hashlib.sha256(prefix + i.to_bytes(4, "big")).digest(), "big") % (n - 1) + 1
+            for i in range(count)]
+def _lcg32(seed: int, count: int, n: int) -> List[int]:
+    """32位线性同余生成器（Numerical Recipes参数），每个k由8个相继状态拼接而成"""
+    x = seed & 0xFFFFFFFF
+    nonces = []
+    for _ in range(count):
+        k = 0
+        for _ in range(8):
+            x = (1664525 * x + 1013904223) & 0xFFFFFFFF
+            k = (k << 32) | x
+        nonces.append(k % (n - 1) + 1)
+    return nonces
+# 弱生成器模型：名称 -> (种子, 个数, n) -> 相继生成的随机数
+WEAK_NONCE_MODELS: Dict[str, Callable[[int, int, int], List[int]]] = {
+    "python_random": _python_random,
+    "sha256_counter": _sha256_counter,
+    "lcg32": _lcg32,
+}
+def time_seeds(timestamp: float, window: float, resolution: float = 1.0) -> range:
+    """以截断时间戳为种子的生成器：签名时间前后window秒内、精度为resolution秒的全部种子"""
+    scale = 1 / resolution
+    return range(int((timestamp - window) * scale), int((timestamp + window) * scale) + 1)
+def _search_seeds(model: str, start: int, stop: int, n: int, offset: int,
+                  sig1: Tuple[int, int], sig2: Tuple[int, int]) -> Tuple[Optional[int], int]:
+    """工作进程：在 [start, stop) 中寻找使两个签名给出同一私钥的种子，返回 (种子或None, 检查的种子数)
+    d = (k1 - s1)/t1 = (k2 - s2)/t2  ⇔  (k1 - s1)·t2 ≡ (k2 - s2)·t1 (mod n)，t = r + s
+    """
+    generate = WEAK_NONCE_MODELS[model]
+    (_, s1), (_, s2) = sig1, sig2
+    t1, t2 = sum(sig1) % n, sum(sig2) % n
+    for seed in range(start, stop):
+        nonces = generate(seed, offset + 2, n)
+        if (nonces[offset] - s1) * t2 % n == (nonces[offset + 1] - s2) * t1 % n:
+            return seed, seed - start + 1
+    return None, stop - start
+# 工作进程内的SM2实例（固定基点表每个进程只构建一次）
+_worker_instances: Dict[type, SM2] = {}
+def _search_seeds_with_table(model: str, start: int, stop: int, n: int, offset: int,
+                             signature: Tuple[int, int], digest: int) -> Tuple[Optional[int], int]:
+    """工作进程：只有一个签名时，用固定基点表批量计算候选 k·G（每批共用求逆），检查 (e + x1) mod n == r"""
+    sm2 = _worker_instances.get(SM2)
+    if sm2 is None:
+        sm2 = _worker_instances[SM2] = SM2()
+    generate = WEAK_NONCE_MODELS[model]
+    seeds = range(start, stop)
+    nonces = [generate(seed, offset + 1, n)[offset] for seed in seeds]
+    for seed, point in zip(seeds, sm2.public_keys_from_private(nonces)):
+        if not point.is_infinity and (digest + point.x) % n == signature[0]:
+            return seed, seed - start + 1
+    return None, stop - start
+def brute_force_weak_nonces(signatures: Sequence[Tuple[int, int]], seeds: range, model: str = "python_random",
+                            workers: int = 1, chunk: int = SEED_CHUNK, offset: int = 0,
+                            public_key: Optional[Point] = None, digest: Optional[int] = None) -> Dict:
+    """在种子空间seeds中搜索生成了签名随机数的种子并恢复私钥
+    signatures为同一签名者相继的签名 (r, s)（第一个使用生成器的第offset个输出）：
+    两个及以上签名时候选只做模运算检查；只有一个签名时须给出其消息摘要digest（e），改用固定基点表批量计算 k·G。
+    命中后由 d = (k - s)·(r + s)^(-1) 得到私钥，给出public_key时再用一次点乘确认
+    """
+    if model not in WEAK_NONCE_MODELS:
+        raise ValueError(f"未知的弱生成器模型: {model}，可选: {sorted(WEAK_NONCE_MODELS)}")
+    if not signatures or (len(signatures) == 1 and digest is None):
+        raise ValueError("需要同一生成器相继生成的两个签名，或一个签名及其消息摘要")
+    sm2 = SM2()
+    n = sm2.n
+    sig1 = signatures[0]
+    if len(signatures) >= 2:
+        search, extra = _search_seeds, (signatures[1],)
+    else:
+        search, extra = _search_seeds_with_table, (digest,)
+        # 先在父进程构建固定基点表，fork出的工作进程直接共享
+        sm2.fixed_base_table()
+    jobs = [(model, start, min(start + chunk, seeds.stop), n, offset, sig1) + extra
+            for start in range(seeds.start, seeds.stop, chunk)]
+    begin = time.perf_counter()
+    found, tested = None, 0
+    if workers <= 1:
+        for job in jobs:
+            found, count = search(*job)
+            tested += count
+            if found is not None:
+                break
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            queue = iter(jobs)
+            pending = {executor.submit(search, *job) for job in itertools.islice(queue, 2 * workers)}
+            while pending and found is None:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    seed, count = future.result()
+                    tested += count
+                    if seed is not None and found is None:
+                        found = seed
+                for job in itertools.islice(queue, len(done)):
+                    pending.add(executor.submit(search, *job))
+            for future in pending:
+                future.cancel()
+    elapsed = time.perf_counter() - begin
+    result = {
+        "model": model,
+        "check": "modular" if len(signatures) >= 2 else "fixed_base_table",
+        "seed": found,
+        "private_key": None,
+        "nonces": None,
+        "candidates": tested,
+        "search_space": len(seeds),
+        "workers": workers,
+        "elapsed": elapsed,
+        "candidates_per_sec": tested / elapsed if elapsed else 0.0,
+    }
+    if found is not None:
+        nonces = WEAK_NONCE_MODELS[model](found, offset + len(signatures), n)[offset:]
+        d = (nonces[0] - sig1[1]) * pow(sum(sig1), -1, n) % n
+        # 其余签名与公钥（若给出）都须与恢复的私钥一致
+        consistent = all((k - s) % n == (r + s) * d % n for k, (r, s) in zip(nonces, signatures))
+        if consistent and (public_key is None or sm2.base_point_multiply(d) == public_key):
+            result["private_key"] = d
+            result["nonces"] = nonces
+    return result
+if __name__ == "__main__":
+    sm2 = SM2()
+    private_key, public_key = sm2.generate_keypair()
+    weak_seed = random.randrange(1 << 18)
+    for model in WEAK_NONCE_MODELS:
+        nonces = iter(WEAK_NONCE_MODELS[model](weak_seed, 2, sm2.n))
+        signatures = []
+        for message in (b"first", b"second"):
+            k = next(nonces)
+            e = sm2.message_digest(message, public_key)
+            r = (e + sm2.base_point_multiply(k).x) % sm2.n
+            signatures.append((r, (k - r * private_key) * pow(1 + private_key, -1, sm2.n) % sm2.n))
+        for workers in sorted({1, os.cpu_count() or 1}):
+            result = brute_force_weak_nonces(signatures, range(1 << 18), model, workers, public_key=public_key)
+            print(f"{model} workers={workers}: 种子 {result['seed']}，私钥{'已恢复' if result['private_key'] == private_key else '未恢复'}，"
+                  f"{result['candidates']}个候选，{result['candidates_per_sec']:.0f}个/秒")
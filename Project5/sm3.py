@@ -0,0 +1,97 @@
+"""
+SM3密码杂凑算法的Python实现
+基于国家标准GM/T 0004-2012，支持增量update()与状态复制copy()
+作者: ESFJ-MoZhu
+日期: 2026-10-19
+"""
+import struct
+from typing import List
+# 初始值IV
+_IV = (0x7380166F, 0x4914B2B9, 0x172442D7, 0xDA8A0600,
+       0xA96F30BC, 0x163138AA, 0xE38DEE4D, 0xB0FB0E4E)
+_MASK32 = 0xFFFFFFFF
+def _rotl(x: int, n: int) -> int:
+    """32位循环左移"""
+    n &= 31
+    return ((x << n) | (x >> (32 - n))) & _MASK32
+# 预计算每轮的 T_j <<< (j mod 32)
+_T_ROTATED = [_rotl(0x79CC4519 if j < 16 else 0x7A879D8A, j) for j in range(64)]
+def _compress(v: List[int], block: bytes) -> List[int]:
+    """压缩函数CF：处理一个512位分组"""
+    w = list(struct.unpack(">16I", block))
+    for j in range(16, 68):
+        x = w[j - 16] ^ w[j - 9] ^ _rotl(w[j - 3], 15)
+        # 置换P1
+        x ^= ((x << 15) | (x >> 17)) & _MASK32 ^ ((x << 23) | (x >> 9)) & _MASK32
+        w.append(x ^ _rotl(w[j - 13], 7) ^ w[j - 6])
+    a, b, c, d, e, f, g, h = v
+    for j in range(64):
+        a12 = ((a << 12) | (a >> 20)) & _MASK32
+        ss1 = (a12 + e + _T_ROTATED[j]) & _MASK32
+        ss1 = ((ss1 << 7) | (ss1 >> 25)) & _MASK32
+        ss2 = ss1 ^ a12
+        if j < 16:
+            ff = a ^ b ^ c
+            gg = e ^ f ^ g
+        else:
+            ff = (a & b) | (a & c) | (b & c)
+            gg = (e & f) | (~e & g)
+        tt1 = (ff + d + ss2 + (w[j] ^ w[j + 4])) & _MASK32
+        tt2 = (gg + h + ss1 + w[j]) & _MASK32
+        d = c
+        c = ((b << 9) | (b >> 23)) & _MASK32
+        b = a
+        a = tt1
+        h = g
+        g = ((f << 19) | (f >> 13)) & _MASK32
+        f = e
+        # 置换P0
+        e = tt2 ^ ((tt2 << 9) | (tt2 >> 23)) & _MASK32 ^ ((tt2 << 17) | (tt2 >> 15)) & _MASK32
+    return [x ^ y for x, y in zip(v, (a, b, c, d, e, f, g, h))]
+class SM3:
+    """SM3杂凑对象，接口与hashlib一致"""
+    digest_size = 32
+    block_size = 64
+    name = "sm3"
+    def __init__(self, data: bytes = b""):
+        self._v = list(_IV)
+        self._buffer = b""
+        self._length = 0
+        if data:
+            self.update(data)
+    def update(self, data: bytes):
+        """追加消息数据，只对凑满的分组调用压缩函数"""
+        self._length += len(data)
+        data = self._buffer + bytes(data)
+        full = len(data) - len(data) % 64
+        v = self._v
+        for i in range(0, full, 64):
+            v = _compress(v, data[i:i + 64])
+        self._v = v
+        self._buffer = data[full:]
+    def copy(self) -> "SM3":
+        """复制当前杂凑状态"""
+        clone = SM3.__new__(SM3)
+        clone._v = list(self._v)
+        clone._buffer = self._buffer
+        clone._length = self._length
+        return clone
+    def digest(self) -> bytes:
+        """返回杂凑值，不改变当前状态"""
+        bit_length = self._length * 8
+        padding = b"\x80" + b"\x00" * ((55 - self._length) % 64) + struct.pack(">Q", bit_length)
+        v = self._v
+        tail = self._buffer + padding
+        for i in range(0, len(tail), 64):
+            v = _compress(v, tail[i:i + 64])
+        return struct.pack(">8I", *v)
+    def hexdigest(self) -> str:
+        """返回十六进制杂凑值"""
+        return self.digest().hex()
+def sm3_hash(data: bytes) -> bytes:
+    """计算SM3杂凑值"""
+    return SM3(data).digest()
+if __name__ == "__main__":
+    # GM/T 0004-2012 附录A示例
+    print(SM3(b"abc").hexdigest())
+    print(SM3(b"abcd" * 16).hexdigest())
@@ -3,10 +3,45 @@ SM2实现的测试脚本
 作者: ESFJ-MoZhu
 日期: 2025-07-20
 """
-from sm2_base import SM2, SM2Optimized, SM2Montgomery
+from sm2_base import SM2, SM2Optimized, SM2Montgomery, SM2WNAF, PublicKeyTableCache, Point
+from sm2_field import SM2Field, solinas_reduce
+from sm3 import SM3
+from sm2_toy_curves import ToyCurve, TOY_CURVES, is_probable_prime, random_point
+from sm2_dlog import parallel_pollard_rho, baby_step_giant_step, pohlig_hellman, factorize
+from sm2_advanced_attacks import SM2AdvancedAttacks
+from sm2_timing import WelchTTest, leakage_test, compare_backends, format_leakage_report
+from sm2_power import simulate_traces, cpa, dpa, recover_ladder_bits, top_bits, TraceSet
+from sm2_nonce_scan import scan_for_nonce_reuse, generate_corpus, write_records, read_records
+from sm2_key_recovery import recover_public_key_candidates, recover_public_keys, index_signers
+from sm2_weak_nonce import brute_force_weak_nonces, WEAK_NONCE_MODELS, time_seeds
+from sm2_lattice import lll_reduce, bkz_reduce, hnp_recover_private_key, leaky_signatures
+from sm2_suite import discover_scenarios, run_suite
+from sm2_pool import EphemeralKeyPool
 from sm2_vulnerability_poc import SM2VulnerabilityPOC
+from sm2_countermeasures import SM2SecureImplementation, FAULT_CHECK_POLICIES
+import sm2_countermeasures
 from satoshi_signature_forge import demonstrate_signature_forge
+import contextlib
+import io
+import json
+import os
+import pickle
+import random
+import tempfile
+import types
+import numpy as np
 import time
+def _hex(text: str) -> int:
+    """把标准示例中分组书写的十六进制数转为整数"""
+    return int(text.replace(" ", ""), 16)
+def _example_curve() -> ToyCurve:
+    """GM/T 0003 示例所用的Fp-256曲线"""
+    return ToyCurve(_hex("8542D69E 4C044F18 E8B92435 BF6FF7DE 45728391 5C45517D 722EDB8B 08F1DFC3"),
+                    _hex("787968B4 FA32C3FD 2417842E 73BBFEFF 2F3C848B 6831D7E0 EC65228B 3937E498"),
+                    _hex("63E4C6D3 B23B0C84 9CF84241 484BFE48 F61D59A5 B16BA06E 6E12D1DA 27C5249A"),
+                    _hex("8542D69E 4C044F18 E8B92435 BF6FF7DD 29772063 0485628D 5AE74EE7 C32E79B7"),
+                    _hex("421DEBD6 1B62EAB6 746434EB C3CC315E 32220B3B ADD50BDC 4C4E6C14 7FEDD43D"),
+                    _hex("0680512B CBB42C07 D47349D2 153B70C4 E5D7FDFC BFA36EA1 A85841B9 E46E09A2"))
 def test_basic_sm2():
     """测试基础SM2实现"""
     print("=== 测试基础SM2实现 ===")
@@ -29,7 +64,8 @@ def test_optimized_implementations():
     implementations = [
         ("基础实现", SM2()),
         ("窗口优化", SM2Optimized()),
-        ("蒙哥马利阶梯", SM2Montgomery())
+        ("蒙哥马利阶梯", SM2Montgomery()),
+        ("wNAF", SM2WNAF())
     ]
     message = b"Performance test message"
     for name, impl in implementations:
@@ -50,6 +86,602 @@ def test_optimized_implementations():
         print(f"  签名时间: {sign_time:.4f}s")
         print(f"  验证时间: {verify_time:.4f}s")
         print(f"  验证结果: {'通过' if is_valid else '失败'}")
+def test_field_arithmetic():
+    """测试素域运算层"""
+    print("\n=== 测试素域运算层 ===")
+    field = SM2Field()
+    p = field.p
+    for a, b in [(p - 1, p - 1), (2 ** 255 + 12345, p - 2), (1, 0)]:
+        assert solinas_reduce(a * b) == a * b % p
+        assert field.add(a, b) == (a + b) % p
+        assert field.sub(b, a) == (b - a) % p
+    assert field.mul(field.inv(12345), 12345) == 1
+    assert field.inv(0) is None
+    sm2 = SM2()
+    sm2.set_operation_counting(True)
+    sm2.point_multiply(0b1011, sm2.G)
+    counts = sm2.operation_counts()
+    print(f"11*G 素域运算计数: {counts}")
+    assert counts["inv"] == 6
+    # 开启计数后签名、验证、密钥生成的雅可比坐标路径同样计数，结果与内联公式一致
+    private_key, public_key = sm2.generate_keypair()
+    assert sm2.operation_counts()["mul"] > counts["mul"] and public_key == SM2().fixed_base_multiply(private_key)
+    sm2.field.reset_counts()
+    signature = sm2.sign(b"counted", private_key)
+    assert sm2.verify(b"counted", signature, public_key) and SM2().verify(b"counted", signature, public_key)
+    counts = sm2.operation_counts()
+    assert counts["mul"] > 1000 and counts["sqr"] > 500 and counts["inv"] >= 3
+    Q = SM2().point_multiply(12345, sm2.G)
+    assert sm2.double_scalar_multiply(777, 999, Q) == SM2().double_scalar_multiply(777, 999, Q)
+    sm2.set_operation_counting(False)
+    assert sm2.operation_counts() == {} and "_jacobian_double" not in vars(sm2)
+def test_counting_formulas_match():
+    """测试计数用的 _field_* 公式与内联 % p 的热点公式在随机输入上逐项一致"""
+    print("\n=== 测试计数公式与热点公式一致 ===")
+    rng = random.Random(26)
+    # SM2曲线 a = p - 3，示例曲线 a ≠ p - 3，覆盖倍点公式的两个分支
+    for curve, counted in ((SM2(), SM2()), (_example_curve(), _example_curve())):
+        p = curve.p
+        counted.set_operation_counting(True)
+        P = curve.point_multiply(rng.randrange(1, curve.n), curve.G)
+        Z = rng.randrange(1, p)
+        J = (P.x * Z * Z % p, P.y * Z * Z * Z % p, Z)
+        # 随机域元素、曲线点的雅可比表示，以及无穷远点、相同点、互为负点等特殊输入
+        cases = [tuple(rng.randrange(p) for _ in range(6)) for _ in range(50)]
+        cases += [(*J, P.x, P.y, 1), (*J, P.x, p - P.y, 1), (1, 1, 0, *J), (*J, 1, 1, 0), (*J, *J), (*J, J[0], p - J[1], Z)]
+        for X1, Y1, Z1, X2, Y2, Z2 in cases:
+            assert curve._jacobian_double(X1, Y1, Z1) == counted._jacobian_double(X1, Y1, Z1)
+            assert curve._jacobian_add(X1, Y1, Z1, X2, Y2, Z2) == counted._jacobian_add(X1, Y1, Z1, X2, Y2, Z2)
+            assert curve._jacobian_add_affine(X1, Y1, Z1, X2, Y2) == counted._jacobian_add_affine(X1, Y1, Z1, X2, Y2)
+            assert curve._from_jacobian(X1, Y1, Z1) == counted._from_jacobian(X1, Y1, Z1)
+        points = [case[:3] for case in cases] + [(1, 1, 0)]
+        assert curve._batch_to_affine(points) == counted._batch_to_affine(points)
+        assert counted.operation_counts()["mul"] > 0
+def test_fixed_base_table():
+    """测试共享固定基点表"""
+    print("\n=== 测试共享固定基点表 ===")
+    sm2 = SM2()
+    optimized = SM2Optimized()
+    assert sm2.fixed_base_table() is optimized.fixed_base_table()
+    for k in [1, 2, 0xABCDEF, sm2.n - 1, sm2.n + 5]:
+        assert sm2.fixed_base_multiply(k) == sm2.point_multiply(k % sm2.n, sm2.G)
+    assert sm2.fixed_base_multiply(sm2.n).is_infinity
+def test_double_scalar_multiply():
+    """测试交错双标量乘法"""
+    print("\n=== 测试交错双标量乘法 ===")
+    sm2 = SM2()
+    private_key, public_key = sm2.generate_keypair()
+    for u, v in [(1, 1), (0, 7), (0xDEADBEEF, 0), (sm2.n - 1, 12345)]:
+        expected = sm2.point_add(sm2.point_multiply(u, sm2.G), sm2.point_multiply(v, public_key))
+        assert sm2.double_scalar_multiply(u, v, public_key) == expected
+    # d*G + (n-1)*P = O
+    assert sm2.double_scalar_multiply(private_key, sm2.n - 1, public_key).is_infinity
+    # 两个变基点：u*P + v*Q 与逐个相乘再相加一致
+    other = sm2.point_multiply(0xC0FFEE, public_key)
+    for u, v in [(3, 5), (0, 9), (sm2.n - 2, 0xFEDCBA987654321)]:
+        expected = sm2.point_add(sm2.point_multiply(u, public_key), sm2.point_multiply(v, other))
+        assert sm2.double_base_multiply(u, public_key, v, other) == expected
+    assert sm2.double_base_multiply(0, public_key, 0, other).is_infinity
+def test_wnaf_multiply():
+    """测试wNAF点乘"""
+    print("\n=== 测试wNAF点乘 ===")
+    sm2 = SM2()
+    wnaf = SM2WNAF()
+    _, public_key = sm2.generate_keypair()
+    for k in [1, 3, 0x123456789ABCDEF, sm2.n - 1]:
+        digits = wnaf.wnaf(k, 5)
+        assert sum(d << i for i, d in enumerate(digits)) == k
+        assert all(d == 0 or (d % 2 == 1 and abs(d) < 16) for d in digits)
+        assert wnaf.point_multiply(k, public_key) == sm2.point_multiply(k, public_key)
+    print(f"256位标量窗口宽度: {wnaf.wnaf_width(256)}")
+def test_batch_verify():
+    """测试批量签名验证"""
+    print("\n=== 测试批量签名验证 ===")
+    sm2 = SM2()
+    keys = [sm2.generate_keypair() for _ in range(3)]
+    items = []
+    for i in range(12):
+        private_key, public_key = keys[i % 3]
+        message = f"log entry {i}".encode()
+        items.append((message, sm2.sign_recoverable(message, private_key), public_key))
+    assert all(sm2.verify_batch(items))
+    # 篡改消息、只提供(r, s)的签名逐个验证
+    items[4] = (b"tampered", items[4][1], items[4][2])
+    items[9] = (items[9][0], items[9][1][:2], items[9][2])
+    results = sm2.verify_batch(items)
+    print(f"无效签名位置: {[i for i, ok in enumerate(results) if not ok]}")
+    assert results == [i != 4 for i in range(12)]
+def test_public_key_table_cache():
+    """测试公钥预计算表LRU缓存"""
+    print("\n=== 测试公钥预计算表缓存 ===")
+    sm2 = SM2Optimized()
+    sm2.public_key_cache = PublicKeyTableCache(capacity=2, min_uses=2)
+    keys = [sm2.generate_keypair() for _ in range(3)]
+    message = b"hot key"
+    private_key, public_key = keys[0]
+    signature = sm2.sign(message, private_key)
+    for _ in range(4):
+        assert sm2.verify(message, signature, public_key)
+    stats = sm2.public_key_cache.stats()
+    print(f"缓存统计: {stats}")
+    assert stats["tables"] == 1 and stats["hits"] == 2 and stats["misses"] == 2
+    k = 0x1234567890ABCDEF
+    assert sm2.point_multiply(k, public_key) == SM2().point_multiply(k, public_key)
+    # 一次性公钥只在门卫中计数，不会淘汰已构建的表；非验证路径不查询缓存
+    for _, other_key in keys[1:]:
+        sm2.verify(message, signature, other_key)
+        sm2.variable_base_multiply(k, other_key)
+    sm2.key_exchange(True, private_key, public_key, sm2.generate_ephemeral_key(), keys[1][1], keys[2][1])
+    stats = sm2.public_key_cache.stats()
+    assert stats["tables"] == 1 and stats["doorkeeper"] == 2 and stats["evictions"] == 0
+    # 容量为2，第二次使用后建表，第三张表进入时淘汰最久未使用的表
+    for _, other_key in keys[1:]:
+        sm2.verify(message, signature, other_key)
+    stats = sm2.public_key_cache.stats()
+    assert stats["evictions"] == 1 and stats["entries"] == 2 and stats["tables"] == 3
+    small = PublicKeyTableCache(capacity=1, min_uses=2, doorkeeper_capacity=2)
+    for key in range(5):
+        assert small.get((key,), lambda: ["table"]) is None
+    assert small.stats()["doorkeeper"] == 2 and small.get((4,), lambda: ["table"]) == ["table"]
+    assert small.get((0,), lambda: ["table"]) is None
+def test_bulk_keygen():
+    """测试批量密钥生成（共用求逆）"""
+    print("\n=== 测试批量密钥生成 ===")
+    sm2 = SM2()
+    keypairs = sm2.generate_keypairs(50)
+    assert len(keypairs) == 50
+    for private_key, public_key in keypairs[:5]:
+        assert sm2.fixed_base_multiply(private_key) == public_key
+    edge = sm2.public_keys_from_private([0, 1, sm2.n - 1])
+    assert edge[0].is_infinity and edge[1] == sm2.G
+    assert edge[2] == sm2.point_multiply(sm2.n - 1, sm2.G)
+    assert sm2.field.batch_inv([3, 0, 5]) == [pow(3, -1, sm2.p), None, pow(5, -1, sm2.p)]
+    # 安全实现的批量生成不走批量查表，公钥由常时间阶梯计算
+    secure = SM2SecureImplementation()
+    secure.public_keys_from_private = None
+    for private_key, public_key in secure.generate_secure_keypairs(3):
+        assert sm2.fixed_base_multiply(private_key) == public_key
+def test_sm3_and_za():
+    """测试SM3杂凑与Z_A缓存"""
+    print("\n=== 测试SM3与Z_A ===")
+    # GM/T 0004-2012 附录A示例
+    assert SM3(b"abc").hexdigest() == "66c7f0f462eeedd9d1f2d46bdc10e4e24167c4875cf2f7a2297da02b8f4ba8e0"
+    assert SM3(b"abcd" * 16).hexdigest() == "debe9ff92275b8a138604889c18e5a4d6fdb70e5387e5765293dcba39c0c5732"
+    h = SM3(b"ab")
+    clone = h.copy()
+    h.update(b"c")
+    assert h.digest() == SM3(b"abc").digest() and clone.digest() == SM3(b"ab").digest()
+    sm2 = SM2()
+    private_key, public_key = sm2.generate_keypair()
+    za = sm2.compute_za(public_key)
+    message = b"message digest"
+    assert sm2.message_digest(message, public_key) == int.from_bytes(SM3(za + message).digest(), 'big')
+    signature = sm2.sign(message, private_key, user_id=b"ALICE123@YAHOO.COM")
+    assert sm2.verify(message, signature, public_key, user_id=b"ALICE123@YAHOO.COM")
+    assert not sm2.verify(message, signature, public_key)
+    # GM/T 0003.2 签名示例：固定 Z_A、e = SM3(Z_A || M) 与签名方程（k经由预计算池接口注入）
+    curve = _example_curve()
+    d = _hex("128B2FA8 BD433C6C 068C8D80 3DFF7979 2A519A55 171B1B65 0C23661D 15897263")
+    k = _hex("6CB28D99 385C175C 94F94E93 4817663F C176D925 DD72B727 260DBAAE 1FB2F96F")
+    P = curve.point_multiply(d, curve.G)
+    message, user_id = b"message digest", b"ALICE123@YAHOO.COM"
+    assert curve.compute_za(P, user_id).hex().upper() == "F4A38489E32B45B6F876E3AC2168CA392362DC8F23459C1D1146FC3DBFB7BC9A"
+    assert curve.message_digest(message, P, user_id) == _hex("B524F552 CD82B8B0 28476E00 5C377FB1 9A87E6FC 682D48BB 5D42E3D9 B9EFFE76")
+    fixed_k = types.SimpleNamespace(take=lambda: (k, curve.point_multiply(k, curve.G)))
+    signature = curve.sign(message, d, user_id, pool=fixed_k)
+    assert signature == (_hex("40F1EC59 F793D9F4 9E09DCEF 49130D41 94F79FB1 EED2CAA5 5BACDB49 C4E755D1"),
+                         _hex("6FC6DAC3 2C5D5CF1 0C77DFB2 0F7C2EB6 67A45787 2FB09EC5 6327A67E C7DEEBE7"))
+    assert curve.verify(message, signature, P, user_id)
+def test_encryption():
+    """测试SM2公钥加密"""
+    print("\n=== 测试SM2公钥加密 ===")
+    sm2 = SM2()
+    private_key, public_key = sm2.generate_keypair()
+    for message in [b"", b"envelope key", bytes(range(256)) * 3]:
+        ciphertext = sm2.encrypt(message, public_key)
+        assert len(ciphertext) == 65 + 32 + len(message)
+        assert sm2.decrypt(ciphertext, private_key) == message
+    # 解密走秘密标量路径：结果与通用点乘一致，且C1不进入公钥预计算表缓存
+    sm2.public_key_cache = PublicKeyTableCache(capacity=4, min_uses=1)
+    C1 = sm2.decode_point(ciphertext[:65])
+    assert sm2.decrypt(ciphertext, private_key) == message and sm2.public_key_cache.stats()["entries"] == 0
+    assert sm2.fixed_window_multiply(private_key, C1) == sm2.point_multiply(private_key, C1)
+    assert sm2.fixed_window_multiply(sm2.n, C1).is_infinity and sm2.secret_scalar_multiply(5, sm2.G) == sm2.point_multiply(5, sm2.G)
+    # 临时k不取自random模块：固定random种子后两次加密的C1仍不同
+    c1s = set()
+    for _ in range(2):
+        random.seed(2024)
+        c1s.add(sm2.encrypt(b"same message", public_key)[:65])
+    random.seed()
+    assert len(c1s) == 2
+    key_data = sm2.kdf(b"z", 70)
+    assert key_data[:32] == SM3(b"z\x00\x00\x00\x01").digest() and key_data[64:] == SM3(b"z\x00\x00\x00\x03").digest()[:6]
+    tampered = bytearray(sm2.encrypt(b"payload", public_key))
+    tampered[10] ^= 0x01
+    try:
+        sm2.decrypt(bytes(tampered), private_key)
+        assert False, "C1篡改后应拒绝解密"
+    except ValueError as e:
+        print(f"拒绝篡改密文: {e}")
+def test_key_exchange():
+    """测试SM2密钥交换与临时密钥池"""
+    print("\n=== 测试SM2密钥交换 ===")
+    sm2 = SM2()
+    private_a, public_a = sm2.generate_keypair()
+    private_b, public_b = sm2.generate_keypair()
+    pool = EphemeralKeyPool(sm2, capacity=4, batch_size=4)
+    ephemeral_a = sm2.generate_ephemeral_key(pool)
+    assert pool.stats()["misses"] == 1
+    with pool:
+        while pool.stats()["depth"] == 0:
+            time.sleep(0.01)
+        ephemeral_b = sm2.generate_ephemeral_key(pool)
+    assert pool.stats()["hits"] == 1
+    assert sm2.base_point_multiply(ephemeral_b[0]) == ephemeral_b[1]
+    key_b, s_b, expected_a = sm2.key_exchange(False, private_b, public_b, ephemeral_b, public_a, ephemeral_a[1],
+                                              user_id=b"BILL456@YAHOO.COM", peer_user_id=b"ALICE123@YAHOO.COM")
+    key_a, s_a, expected_b = sm2.key_exchange(True, private_a, public_a, ephemeral_a, public_b, ephemeral_b[1],
+                                              user_id=b"ALICE123@YAHOO.COM", peer_user_id=b"BILL456@YAHOO.COM")
+    assert key_a == key_b and len(key_a) == 16
+    assert s_a == expected_a and s_b == expected_b
+    # 标准示例（Fp-256示例曲线，n为256位，w = 127）：固定 x̄、Z_A/Z_B 与KDF的接线
+    curve = _example_curve()
+    id_a, id_b = b"ALICE123@YAHOO.COM", b"BILL456@YAHOO.COM"
+    d_a = _hex("6FCBA2EF 9AE0AB90 2BC3BDE3 FF915D44 BA4CC78F 88E2F8E7 F8996D3B 8CCEEDEE")
+    d_b = _hex("5E35D7D3 F3C54DBA C72E6181 9E730B01 9A84208C A3A35E4C 2E353DFC CB2A3B53")
+    r_a = _hex("83A2C9C8 B96E5AF7 0BD480B4 72409A9A 327257F1 EBB73F5B 073354B2 48668563")
+    r_b = _hex("33FE2194 0342161C 55619C4A 0C060293 D543C80A F19748CE 176D8347 7DE71C80")
+    P_a, P_b = curve.point_multiply(d_a, curve.G), curve.point_multiply(d_b, curve.G)
+    R_a, R_b = curve.point_multiply(r_a, curve.G), curve.point_multiply(r_b, curve.G)
+    assert P_a.x == _hex("3099093B F3C137D8 FCBBCDF4 A2AE50F3 B0F216C3 122D7942 5FE03A45 DBFE1655")
+    assert R_b.x == _hex("1799B2A2 C7782953 00D9A232 5C686129 B8F2B533 7B3DCF45 14E8BBC1 9D900EE5")
+    assert curve.compute_za(P_a, id_a).hex().upper() == "E4D1D0C3CA4C7F11BC8FF8CB3F4C02A78F108FA098E51A668487240F75E20F31"
+    assert curve.compute_za(P_b, id_b).hex().upper() == "6B4B6D0E276691BD4A11BF72F4FB501AE309FDACB72FA6CC336E6656119ABD67"
+    key_a, s_a, expected_b = curve.key_exchange(True, d_a, P_a, (r_a, R_a), P_b, R_b, 16, id_a, id_b)
+    key_b, s_b, expected_a = curve.key_exchange(False, d_b, P_b, (r_b, R_b), P_a, R_a, 16, id_b, id_a)
+    assert key_a == key_b == bytes.fromhex("55B0AC62A6B927BA23703832C853DED4")
+    assert s_b == expected_b == bytes.fromhex("284C8F198F141B502E81250F1581C7E9EEB4CA6990F9E02DF388B45471F5BC5C")
+    assert s_a == expected_a == bytes.fromhex("23444DAF8ED7534366CB901C84B3BDBB63504F4065C1116C91A4C00697E6CF7A")
+def test_point_encoding():
+    """测试SEC1点编码与批量解码"""
+    print("\n=== 测试点编码 ===")
+    sm2 = SM2()
+    keys = [public_key for _, public_key in sm2.generate_keypairs(8)]
+    compressed = [sm2.encode_point(P) for P in keys]
+    uncompressed = [sm2.encode_point(P, compressed=False) for P in keys]
+    assert all(len(c) == 33 and c[0] in (2, 3) for c in compressed)
+    assert all(len(u) == 65 and u[0] == 4 for u in uncompressed)
+    assert [sm2.decode_point(c) for c in compressed] == keys
+    assert sm2.decode_points(compressed + uncompressed) == keys + keys
+    off_curve = b"\x04" + uncompressed[0][1:33] + (keys[0].y ^ 1).to_bytes(32, 'big')
+    invalid = [b"", b"\x00", b"\x05" + compressed[0][1:], compressed[0][:-1], off_curve]
+    for data in invalid:
+        try:
+            sm2.decode_point(data)
+            assert False, "无效编码未被拒绝"
+        except ValueError:
+            pass
+    assert sm2.decode_points(invalid + compressed[:1], strict=False) == [None] * len(invalid) + keys[:1]
+def test_point_type():
+    """测试不可变、可哈希的点类型"""
+    print("\n=== 测试点类型 ===")
+    sm2 = SM2Optimized()
+    assert Point(None, None) is sm2.O and sm2.O.is_infinity and not sm2.G.is_infinity
+    assert pickle.loads(pickle.dumps(sm2.O)) is sm2.O
+    P = sm2.base_point_multiply(12345)
+    seen = {P: "P", sm2.G: "G"}
+    assert seen[Point(P.x, P.y)] == "P" and seen[sm2.G] == "G"
+    try:
+        P.x = 0
+        assert False, "点坐标不应可修改"
+    except AttributeError:
+        pass
+    table = sm2._precompute_points(P, 4)
+    for k in (1, 16, 0xABCDEF, sm2.n - 1):
+        assert sm2._multiply_with_precomputed(k, table, 4) == SM2.point_multiply(sm2, k, P)
+def test_pooled_signing():
+    """测试离线/在线签名：k只使用一次，池空时内联回退"""
+    print("\n=== 测试离线/在线签名 ===")
+    sm2 = SM2()
+    private_key, public_key = sm2.generate_keypair()
+    pool = EphemeralKeyPool(sm2, capacity=8, batch_size=4)
+    signature = sm2.sign(b"cold", private_key, pool=pool)
+    assert sm2.verify(b"cold", signature, public_key) and pool.stats()["misses"] >= 1
+    for processes in (0, 1):
+        pool = EphemeralKeyPool(sm2, capacity=8, batch_size=4, processes=processes)
+        with pool:
+            while pool.stats()["depth"] < 8:
+                time.sleep(0.01)
+            signatures = [sm2.sign(b"msg %d" % i, private_key, pool=pool) for i in range(8)]
+        assert all(sm2.verify(b"msg %d" % i, sig, public_key) for i, sig in enumerate(signatures))
+        # 同一私钥下 k 互不相同则 x1 = r - e 互不相同
+        x1s = {(r - sm2.message_digest(b"msg %d" % i, public_key)) % sm2.n for i, (r, _) in enumerate(signatures)}
+        assert len(x1s) == len(signatures)
+        assert pool.stats()["hits"] == 8 and pool.stats()["hit_rate"] == 1.0
+def test_fault_checked_signing():
+    """测试可配置策略的抗故障签名"""
+    print("\n=== 测试抗故障签名 ===")
+    sm2 = SM2SecureImplementation()
+    private_key, public_key = sm2.generate_keypair()
+    for policy in FAULT_CHECK_POLICIES:
+        signature = sm2.fault_resistant_sign(b"policy", private_key, policy)
+        assert sm2.verify(b"policy", signature, public_key)
+    # 注入一次故障：k*G 结果被替换为曲线上的另一点
+    ladder = sm2.constant_time_point_multiply
+    faults = [sm2.base_point_multiply(7)]
+    sm2.constant_time_point_multiply = lambda k, P: faults.pop() if faults else ladder(k, P)
+    signature = sm2.fault_resistant_sign(b"fault", private_key, "verify")
+    assert sm2.verify(b"fault", signature, public_key)
+    assert sm2.security_logs[-1] == ("fault_detection", "签名验证失败")
+    try:
+        sm2.fault_resistant_sign(b"fault", private_key, "unknown")
+        assert False, "未知策略未被拒绝"
+    except ValueError:
+        pass
+    # 公钥由常时间阶梯计算，只缓存在本实例中，且可清空
+    sm2.clear_private_key_cache()
+    faults = [sm2.base_point_multiply(9)]
+    assert sm2.public_key_of(private_key) == sm2.base_point_multiply(9)
+    assert SM2SecureImplementation().public_key_of(private_key) == public_key
+    sm2.clear_private_key_cache()
+    del sm2.constant_time_point_multiply
+    assert sm2.public_key_of(private_key) == public_key
+    assert sm2.decrypt(sm2.encrypt(b"ladder", public_key), private_key) == b"ladder"
+def test_security_report_timing():
+    """测试综合安全测试中的时序检验只在显式请求时计入侧信道判定"""
+    print("\n=== 测试综合安全测试的时序检验 ===")
+    secure = SM2SecureImplementation()
+    measure = sm2_countermeasures.leakage_test
+    calls = []
+    def leaky(*args, **kwargs):
+        # 模拟负载较高的机器上短检验的误报
+        calls.append(kwargs["samples"])
+        return {"leaky": True, "max_t": 9.0, "samples": kwargs["samples"], "fixed_mean_ns": 1e6, "random_mean_ns": 1e6}
+    sm2_countermeasures.leakage_test = leaky
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            informational = secure.comprehensive_security_test()["side_channel_protection"]
+            requested = secure.comprehensive_security_test(leakage_samples=20000)["side_channel_protection"]
+    finally:
+        sm2_countermeasures.leakage_test = measure
+    assert calls == [400, 20000]
+    assert informational["success"] and not informational["timing_verdict"] and informational["max_t"] == 9.0
+    assert not requested["success"] and requested["timing_verdict"]
+def test_coz_ladder():
+    """测试共Z蒙哥马利阶梯（含补齐标量的边界情况）"""
+    print("\n=== 测试共Z阶梯 ===")
+    sm2 = SM2SecureImplementation()
+    Q = sm2.base_point_multiply(0x1234567)
+    scalars = [0, 1, 2, 3, sm2.n - 1, sm2.n, sm2.n + 5, (sm2.n - 1) // 2, (sm2.n + 1) // 2, (1 << 256) - 1]
+    scalars += [random.randrange(sm2.n) for _ in range(4)]
+    for k in scalars:
+        for P in (sm2.G, Q):
+            assert sm2.constant_time_point_multiply(k, P) == SM2.point_multiply(sm2, k % sm2.n, P)
+def test_pollard_rho():
+    """测试测试曲线与可区分点Pollard rho"""
+    print("\n=== 测试Pollard rho ===")
+    for bits in TOY_CURVES:
+        curve = ToyCurve.from_bits(bits)
+        assert curve.is_on_curve(curve.G) and is_probable_prime(curve.n) and curve.n.bit_length() == bits
+        assert curve.base_point_multiply(curve.n).is_infinity
+    curve = ToyCurve.from_bits(32)
+    secret = 0x1234567
+    result = parallel_pollard_rho(curve, curve.base_point_multiply(secret), seed=2026)
+    assert result["log"] == secret and result["steps_per_sec"] > 0 and len(result["workers"]) == 1
+    # 每条游走从独立的随机起点出发，第一次碰撞即为有效碰撞
+    assert result["collisions"] == 1
+    assert parallel_pollard_rho(curve, curve.base_point_multiply(secret), max_steps=100, seed=1)["log"] is None
+def test_baby_step_giant_step():
+    """测试紧凑表大步小步法与区间搜索"""
+    print("\n=== 测试大步小步法 ===")
+    curve = ToyCurve.from_bits(32)
+    for secret in (0, 1, 0x1234567, curve.n - 1):
+        target = curve.base_point_multiply(secret) if secret else curve.O
+        assert baby_step_giant_step(curve, target)["log"] == secret
+    # 泄露高位：只在 2^24 宽的区间内搜索；内存上限很小时增加大步数
+    sm2 = SM2()
+    secret = 0xABCDE12345
+    result = baby_step_giant_step(sm2, sm2.base_point_multiply(secret), 0xABCD << 24, 0xABCE << 24, memory_budget=1 << 12)
+    assert result["log"] == secret and result["table_bytes"] <= 1 << 12
+    assert baby_step_giant_step(sm2, sm2.base_point_multiply(secret), 0, 1 << 20)["log"] is None
+    # order只给出阶的倍数时，小步会经过无穷远点，批量加法须携带无穷远点继续
+    curve44 = ToyCurve.from_bits(44)
+    weak = ToyCurve(curve44.p, curve44.a, 12345, 1, 0, 0)
+    weak.n = 10148931227885  # 5 * 80989 * 25062493
+    base = weak.point_multiply(weak.n // 5, random_point(weak, random.Random(1)))
+    result = baby_step_giant_step(weak, weak.point_multiply(3, base), 0, 1000, base=base, batch=4, order=weak.n)
+    assert result["log"] % 5 == 3
+def test_pohlig_hellman():
+    """测试分解、Pohlig-Hellman与无效曲线/扭曲/小子群攻击演示"""
+    print("\n=== 测试Pohlig-Hellman ===")
+    assert factorize(2 ** 4 * 1000003 ** 2 * (2 ** 31 - 1)) == {2: 4, 1000003: 2, 2 ** 31 - 1: 1}
+    curve = ToyCurve.from_bits(44)
+    weak = ToyCurve(curve.p, curve.a, 12345, 1, 0, 0)
+    weak.n = 10148931227885  # 5 * 80989 * 25062493
+    base = random_point(weak, random.Random(1))
+    order = weak.n
+    while weak.point_multiply(order // 5, base).is_infinity:
+        order //= 5
+    for secret in (0, 1, 0x123456789, order - 1):
+        result = pohlig_hellman(weak, weak.point_multiply(secret, base) if secret else weak.O, base=base, order=order)
+        assert result["log"] == secret
+    partial = pohlig_hellman(weak, weak.point_multiply(0x123456789, base), base=base, order=order, max_prime=1 << 20)
+    assert partial["log"] is None and partial["skipped"] == [25062493]
+    assert partial["residue"] == 0x123456789 % partial["modulus"]
+    attacks = SM2AdvancedAttacks()
+    assert attacks.invalid_curve_attack(seed=1)["attack_successful"]
+    assert attacks.twist_attack_simulation(seed=1)["attack_successful"]
+    assert attacks.small_subgroup_attack(seed=1)["attack_successful"]
+def test_hnp_lattice_attack():
+    """测试LLL/BKZ-lite与HNP私钥恢复"""
+    print("\n=== 测试格攻击 ===")
+    # 经典例子：LLL约化后第一个向量为 (0, 1, 0)
+    assert lll_reduce([[1, 1, 1], [-1, 0, 2], [3, 5, 6]])[0] in ([0, 1, 0], [0, -1, 0])
+    rng = random.Random(3)
+    q = (1 << 120) + 1
+    basis = [[int(i == j) for j in range(19)] + [rng.randrange(q)] for i in range(19)] + [[0] * 19 + [q]]
+    norm = lambda v: sum(x * x for x in v)
+    assert norm(bkz_reduce(basis, 8)[0]) <= norm(lll_reduce(basis)[0])
+    sm2 = SM2()
+    private_key = rng.randrange(1, sm2.n)
+    public_key = sm2.public_key_of(private_key)
+    for biased in (False, True):
+        samples = leaky_signatures(sm2, private_key, 11, 32, biased=biased, seed=7)
+        result = hnp_recover_private_key(sm2, samples, 224, public_key)
+        assert result["private_key"] == private_key and result["dimension"] == 12
+    assert not hnp_recover_private_key(sm2, samples[:4], 224, public_key, block_size=4)["success"]
+    assert SM2AdvancedAttacks().lattice_attack_simulation(seed=1)["attack_successful"]
+def test_timing_leakage_harness():
+    """测试在线Welch t检验与固定/随机标量时序泄露检测"""
+    print("\n=== 测试时序泄露检测 ===")
+    test = WelchTTest()
+    fixed, rand = [10, 12, 11, 13, 9], [20, 22, 19, 25]
+    for x in fixed:
+        test.push(0, x)
+    for x in rand:
+        test.push(1, x)
+    mean = lambda v: sum(v) / len(v)
+    var = lambda v: sum((x - mean(v)) ** 2 for x in v) / (len(v) - 1)
+    expected = (mean(fixed) - mean(rand)) / (var(fixed) / 5 + var(rand) / 4) ** 0.5
+    assert abs(test.t() - expected) < 1e-9
+    # 固定标量汉明重量为2，窗口法点乘的加法次数明显少于随机标量
+    leaky = leakage_test(SM2Optimized, samples=300, batch=150, seed=1)
+    assert leaky["leaky"] and leaky["samples"] == 300 and leaky["fixed_mean_ns"] < leaky["random_mean_ns"]
+    rows = compare_backends(samples=30, workers=2, names=["SM2SecureImplementation"], seed=1)
+    assert rows[0]["samples"] == 30 and rows[0]["workers"] == 2
+    assert "SM2SecureImplementation" in format_leakage_report(rows)
+def test_power_analysis():
+    """测试轨迹模拟、内存映射存储与CPA/DPA恢复阶梯标量位"""
+    print("\n=== 测试功耗分析 ===")
+    rng = np.random.default_rng(1)
+    traces = rng.normal(size=(500, 3))
+    hypotheses = rng.normal(size=(500, 2))
+    expected = [[np.corrcoef(hypotheses[:, g], traces[:, t])[0, 1] for t in range(3)] for g in range(2)]
+    assert np.allclose(cpa(traces, hypotheses, chunk=64), expected)
+    selection = hypotheses > 0
+    assert np.allclose(dpa(traces, selection, chunk=64)[0],
+                       traces[selection[:, 0]].mean(axis=0) - traces[~selection[:, 0]].mean(axis=0))
+    secret = 0xA5C3 << 240 | 12345
+    with tempfile.TemporaryDirectory() as directory:
+        prefix = os.path.join(directory, "ladder")
+        simulate_traces(SM2Montgomery, secret, 400, samples=18, noise=8.0, seed=1, path=prefix)
+        trace_set = TraceSet.load(prefix)
+        assert isinstance(trace_set.traces, np.memmap) and trace_set.traces.shape == (400, 18)
+        assert trace_set.operations[:4] == ["point_add", "point_double", "point_add", "point_double"]
+        assert recover_ladder_bits(trace_set, 8)["bits"] == top_bits(secret, 8) == [0, 1, 0, 0, 1, 0, 1, 1]
+        del trace_set
+    # 默认噪声下DPA（按汉明重量划分）与CPA都能恢复
+    trace_set = simulate_traces(SM2Montgomery, secret, 400, samples=18, noise=16.0, seed=2)
+    for method in ("cpa", "dpa"):
+        assert recover_ladder_bits(trace_set, 8, method=method)["bits"] == top_bits(secret, 8)
+def test_nonce_reuse_scanner():
+    """测试随机数重用扫描：三种输入格式、分区落盘、多进程与私钥恢复"""
+    print("\n=== 测试随机数重用扫描 ===")
+    sm2 = SM2()
+    records, private_keys = generate_corpus(sm2, 40, 5, reused_keys=3, seed=1)
+    # 再加入一对使用 k 与 -k 的签名
+    d = 0x1234567890ABCDEF
+    public_key = sm2.public_key_of(d)
+    for i, k in enumerate((0xC0FFEE, sm2.n - 0xC0FFEE)):
+        e = sm2.message_digest(b"negated %d" % i, public_key)
+        r = (e + sm2.base_point_multiply(k).x) % sm2.n
+        records.append((sm2.encode_point(public_key, compressed=False), e, r, pow(1 + d, -1, sm2.n) * (k - r * d) % sm2.n))
+    private_keys[sm2.encode_point(public_key)] = d
+    records.append((b"\x05bad", 1, 1, 1))
+    with tempfile.TemporaryDirectory() as directory:
+        paths = [os.path.join(directory, f"corpus.{extension}") for extension in ("jsonl", "csv", "bin")]
+        for i, path in enumerate(paths):
+            write_records(path, records[i::3])
+        assert sum(1 for path in paths for _ in read_records(path)) == len(records)
+        for workers in (1, 2):
+            result = scan_for_nonce_reuse(paths, partitions=4, workers=workers)
+            assert result["records"] == len(records) - 1 and result["skipped"] == 1
+            assert result["compromised_keys"] == 4
+            assert all(private_keys[bytes.fromhex(f["public_key"])] == f["private_key"] for f in result["findings"])
+            assert sum(f["negated_nonce"] for f in result["findings"]) == 1
+    assert SM2VulnerabilityPOC().poc_nonce_reuse_attack()["attack_successful"]
+def test_public_key_recovery():
+    """测试由签名批量恢复公钥与签名者去重"""
+    print("\n=== 测试公钥恢复 ===")
+    sm2 = SM2()
+    keys = [sm2.generate_keypair() for _ in range(3)]
+    signatures, owners = [], []
+    for i in range(12):
+        d, P = keys[i % 3]
+        message = b"recover %d" % i
+        r, s, v = sm2.sign_recoverable(message, d)
+        e = sm2.message_digest(message, P)
+        signatures.append((e, r, s, v) if i < 3 else (e, r, s))
+        owners.append(sm2.encode_point(P).hex())
+    for i, candidates in enumerate(recover_public_key_candidates(sm2, signatures)):
+        assert keys[i % 3][1] in candidates and (len(candidates) == 1) == (i < 3)
+    assert recover_public_keys(signatures, workers=2, chunk=5) == recover_public_key_candidates(sm2, signatures)
+    assert recover_public_key_candidates(sm2, [(1, 5, sm2.n - 5), (1, 0, 1)]) == [[], []]
+    index = index_signers(signatures + [(1, 0, 1)])
+    assert index["identities"] == {owners[i]: [i, i + 3, i + 6, i + 9] for i in range(3)}
+    assert index["ambiguous"] == [] and index["unrecoverable"] == [12]
+    assert SM2VulnerabilityPOC().poc_public_key_recovery()["recovery_successful"]
+def test_weak_nonce_brute_force():
+    """测试弱随机数生成器的种子暴力搜索"""
+    print("\n=== 测试弱随机数暴力搜索 ===")
+    sm2 = SM2()
+    d, P = sm2.generate_keypair()
+    for model, generate in WEAK_NONCE_MODELS.items():
+        signatures = []
+        for k in generate(1500, 3, sm2.n):
+            r = (sm2.message_digest(b"weak", P) + sm2.base_point_multiply(k).x) % sm2.n
+            signatures.append((r, (k - r * d) * pow(1 + d, -1, sm2.n) % sm2.n))
+        result = brute_force_weak_nonces(signatures[1:], range(1000, 3000), model, workers=2, chunk=300, offset=1,
+                                         public_key=P)
+        assert result["seed"] == 1500 and result["private_key"] == d and result["check"] == "modular"
+    # 种子位于前 2*workers 个任务之后，检验补充任务时不丢块
+    signatures = []
+    for k in WEAK_NONCE_MODELS["lcg32"](4101, 2, sm2.n):
+        r = (sm2.message_digest(b"weak", P) + sm2.base_point_multiply(k).x) % sm2.n
+        signatures.append((r, (k - r * d) * pow(1 + d, -1, sm2.n) % sm2.n))
+    result = brute_force_weak_nonces(signatures, range(1 << 14), "lcg32", workers=2, chunk=1024)
+    assert result["seed"] == 4101 and result["private_key"] == d
+    random.seed(321)
+    r, s = sm2.sign(b"single", d)
+    random.seed()
+    result = brute_force_weak_nonces([(r, s)], range(512), digest=sm2.message_digest(b"single", P), chunk=128)
+    assert result["seed"] == 321 and result["private_key"] == d and result["check"] == "fixed_base_table"
+    assert brute_force_weak_nonces(signatures[:2], range(10), "lcg32")["private_key"] is None
+    assert len(time_seeds(1000.5, 2, 0.5)) == 9
+    for bad in ({"signatures": [(r, s)]}, {"signatures": signatures, "model": "mt19937"}):
+        try:
+            brute_force_weak_nonces(seeds=range(10), **bad)
+            assert False, "应拒绝无效参数"
+        except ValueError:
+            pass
+    assert SM2VulnerabilityPOC().poc_weak_randomness_attack()["attack_successful"]
+def test_parallel_suite_runner():
+    """测试并行套件运行器：场景发现、超时、异常与JSON结果"""
+    print("\n=== 测试并行套件运行器 ===")
+    scenarios = discover_scenarios()
+    assert {"tests.test_basic_sm2", "poc.poc_nonce_reuse_attack", "advanced.lattice_attack",
+            "forge.method1_existential_forgery"} <= set(scenarios)
+    assert "tests.test_parallel_suite_runner" not in scenarios
+    chosen = ["poc.poc_signature_malleability", "forge.method1_existential_forgery", "advanced.fault_injection",
+              "tests.test_basic_sm2", "forge.method5_side_channel_simulation"]
+    result = run_suite(chosen, workers=2, timeouts={"forge.method5_side_channel_simulation": 0.5})
+    items = {item["scenario"]: item for item in result["scenarios"]}
+    assert {scenario: item["status"] for scenario, item in items.items()} == \
+        dict.fromkeys(chosen[:4], "passed") | {chosen[4]: "timeout"}
+    assert result["passed"] == 4 and result["timeout"] == 1 and items[chosen[4]]["elapsed"] < 30
+    malleability = items["poc.poc_signature_malleability"]
+    assert malleability["result"]["original_valid"] is True and "签名可塑性" in malleability["output"]
+    assert isinstance(malleability["result"]["original_signature"], list)
+    assert json.loads(json.dumps(result)) == result
+    # 按上次耗时从长到短重新提交，结果顺序仍按发现顺序
+    assert [item["scenario"] for item in run_suite(chosen[:2], workers=1, history=result)["scenarios"]] == \
+        sorted(chosen[:2], key=scenarios.index)
+    for bad in (["poc.missing"], ["unknown.scenario"]):
+        try:
+            run_suite(bad, workers=1)
+            assert False, "应拒绝未知场景"
+        except ValueError:
+            pass
 def main():
     """主测试函数"""
     print("🧪 SM2项目测试套件")